@@ -0,0 +1,144 @@
+"""HIGH-class flow setup latency during a LOW-class packet-in storm.
+
+The per-packet costs of classification and of the rest of the handler are
+measured on EnhancedTrafficController. A single-threaded event loop is then
+simulated in virtual time, like Ryu's: packet-ins from 8 switches wait in
+the app's event queue and are either handled in arrival order (FIFO) or
+classified and passed through AdmissionQueue. In the second case, workers
+run when the event queue is empty. HIGH (DNS) and MEDIUM (MQTT) rates stay
+fixed while LOW telemetry grows up to tenfold.
+
+Usage: python benchmarks/admission_bench.py [--seconds 10] [--base-load 0.1]
+"""
+import argparse
+import collections
+import random
+import time
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath, packet_in_event
+from proactive_bench import build
+
+import admission
+import enhanced_traffic_controller
+
+SWITCHES = 8
+# class name, (ip_proto, dst_port) of its packets
+TRAFFIC = (('HIGH', (17, 53)), ('MEDIUM', (6, 1883)), ('LOW', (17, 9000)))
+
+
+def measure_costs():
+    app = enhanced_traffic_controller.EnhancedTrafficController()
+    app.ADMISSION = False
+    dp = FakeDatapath(1)
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    events = []
+    for i in range(3000):
+        proto, port = TRAFFIC[i % 3][1]
+        data, fields = build(i % 40, (i + 7) % 40, proto, port)
+        events.append(packet_in_event(dp, data, fields['in_port']))
+    start = time.perf_counter()
+    for ev in events:
+        app.classify_headers(app.parse_packet(ev.msg.data))
+    classify = (time.perf_counter() - start) / len(events)
+    start = time.perf_counter()
+    for ev in events:
+        app.packet_in_handler(ev)
+    total = (time.perf_counter() - start) / len(events)
+    return classify, max(total - classify, 0.0), app.rules.table
+
+
+def arrivals(rates, seconds, seed):
+    rnd = random.Random(seed)
+    out = []
+    for name, rate in rates.items():
+        t = 0.0
+        while True:
+            t += rnd.expovariate(rate)
+            if t >= seconds:
+                break
+            out.append((t, name, rnd.randrange(SWITCHES)))
+    out.sort()
+    return out
+
+
+def simulate(trace, classify_cost, handle_cost, levels, use_admission):
+    now = [0.0]
+    queue = admission.AdmissionQueue(levels, clock=lambda: now[0])
+    events = collections.deque()
+    latencies = collections.defaultdict(list)
+    i = 0
+    t = 0.0
+    while i < len(trace) or events or len(queue):
+        # Everything that arrived while the loop was busy joins the event queue.
+        while i < len(trace) and trace[i][0] <= t:
+            events.append(trace[i])
+            i += 1
+        if not events and not len(queue):
+            t = trace[i][0]
+            continue
+        now[0] = t
+        if events:
+            arrived, name, dpid = events.popleft()
+            t += classify_cost
+            if not use_admission:
+                t += handle_cost
+                latencies[name].append(t - arrived)
+                continue
+            idle = not events and not len(queue)
+            if not queue.admit(dpid, name, not idle):
+                continue
+            elif idle:
+                t += handle_cost
+                latencies[name].append(t - arrived)
+            else:
+                queue.push(name, (arrived, name))
+        else:
+            arrived, name = queue.pop()
+            t += handle_cost
+            latencies[name].append(t - arrived)
+    if use_admission:
+        # Inline and queued packet-ins both count as admitted.
+        assert sum(queue.admitted.values()) + sum(queue.shed.values()) == len(trace)
+    return latencies, queue.shed
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--base-load', type=float, default=0.1,
+                        help='LOW rate at 1x as a fraction of the handler capacity')
+    args = parser.parse_args()
+
+    classify_cost, handle_cost, table = measure_costs()
+    capacity = 1.0 / (classify_cost + handle_cost)
+    levels = sorted(table.class_names, key=table.priority_value, reverse=True)
+    print(f"measured: classify {classify_cost * 1e6:.1f} us, handle {handle_cost * 1e6:.1f} us, "
+          f"capacity {capacity:.0f} packet-in/s")
+    print(f"{'LOW x':>5} {'LOW/s':>7} {'FIFO HIGH p50/p99 ms':>22} "
+          f"{'admission HIGH p50/p99 ms':>27} {'LOW shed':>9}")
+    high_p99 = []
+    for factor in (1, 2, 5, 10):
+        rates = {'HIGH': 0.01 * capacity, 'MEDIUM': 0.05 * capacity,
+                 'LOW': args.base_load * capacity * factor}
+        trace = arrivals(rates, args.seconds, seed=factor)
+        fifo, _ = simulate(trace, classify_cost, handle_cost, levels, False)
+        adm, shed = simulate(trace, classify_cost, handle_cost, levels, True)
+        low_total = sum(1 for a in trace if a[1] == 'LOW')
+        high_p99.append(percentile(adm['HIGH'], 99))
+        print(f"{factor:>5} {rates['LOW']:>7.0f} "
+              f"{percentile(fifo['HIGH'], 50) * 1e3:>10.2f} /{percentile(fifo['HIGH'], 99) * 1e3:>9.2f} "
+              f"{percentile(adm['HIGH'], 50) * 1e3:>12.2f} /{percentile(adm['HIGH'], 99) * 1e3:>12.2f} "
+              f"{100.0 * shed['LOW'] / max(low_total, 1):>8.1f}%")
+    print(f"admission HIGH p99 at 10x LOW is {high_p99[-1] / high_p99[0]:.1f}x the 1x value")
+
+
+if __name__ == '__main__':
+    main()
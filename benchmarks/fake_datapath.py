@@ -0,0 +1,147 @@
+"""In-process stand-ins for Ryu datapaths used by the offline benchmarks.
+
+FakeDatapath behaves like ryu.controller.controller.Datapath from the app's
+point of view (send_msg/send/set_xid) but splits every written buffer back
+into OpenFlow messages instead of touching a socket. SwitchModel applies the
+captured FlowMods to a tiny multi-table pipeline so a replayed packet can be
+checked for whether it would have produced a packet-in.
+"""
+import os
+import socket
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+from ryu.controller import ofp_event  # noqa: E402
+from ryu.ofproto import ofproto_parser, ofproto_v1_3, ofproto_v1_3_parser  # noqa: E402
+
+
+class FakeDatapath(object):
+    def __init__(self, dpid):
+        self.id = dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+        self.writes = 0     # number of send() calls, i.e. socket writes
+        self.sent = []      # messages in the order they were written
+        self.listeners = []
+        self._unsent = {}   # xid -> message object awaiting its write
+
+    def set_xid(self, msg):
+        self.xid += 1
+        self.xid &= self.ofproto.MAX_XID
+        msg.set_xid(self.xid)
+        self._unsent[self.xid] = msg
+        return self.xid
+
+    def send_msg(self, msg, close_socket=False):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        return self.send(msg.buf, close_socket=close_socket)
+
+    def send(self, buf, close_socket=False):
+        self.writes += 1
+        buf = bytes(buf)
+        offset = 0
+        while offset < len(buf):
+            version, msg_type, msg_len, xid = ofproto_parser.header(buf[offset:])
+            # Ryu only has parsers for some controller-to-switch messages, so
+            # prefer the object that was serialized into this buffer.
+            msg = self._unsent.pop(xid, None)
+            if msg is None:
+                msg = ofproto_parser.msg(self, version, msg_type, msg_len, xid,
+                                         buf[offset:offset + msg_len])
+            self.sent.append(msg)
+            for listener in self.listeners:
+                listener(msg)
+            offset += msg_len
+        return True
+
+    def sent_of(self, cls):
+        return [m for m in self.sent if isinstance(m, cls)]
+
+
+def packet_in_event(datapath, data, in_port, table_id=0):
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+    msg = parser.OFPPacketIn(datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                             total_len=len(data), reason=ofproto.OFPR_NO_MATCH,
+                             table_id=table_id, cookie=0,
+                             match=parser.OFPMatch(in_port=in_port), data=data)
+    return ofp_event.EventOFPPacketIn(msg)
+
+
+def meter_features_event(datapath, max_meter=64, band_types=None):
+    """The switch's answer to the meter features request sent on connect."""
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+    if band_types is None:
+        band_types = 1 << ofproto.OFPMBT_DROP
+    body = [parser.OFPMeterFeaturesStats(max_meter=max_meter, band_types=band_types,
+                                         capabilities=ofproto.OFPMF_KBPS | ofproto.OFPMF_BURST,
+                                         max_bands=1, max_color=0)]
+    msg = parser.OFPMeterFeaturesStatsReply(datapath, body=body, flags=0)
+    return ofp_event.EventOFPMeterFeaturesStatsReply(msg)
+
+
+def _ip(addr):
+    return struct.unpack('!I', socket.inet_aton(addr))[0]
+
+
+def field_matches(value, expected):
+    if value is None:
+        return False
+    if isinstance(expected, tuple):
+        addr, mask = expected
+        return _ip(value) & _ip(mask) == _ip(addr) & _ip(mask)
+    return value == expected
+
+
+class SwitchModel(object):
+    """Minimal OpenFlow 1.3 pipeline fed from a FakeDatapath's FlowMods."""
+
+    def __init__(self, datapath):
+        self.tables = {}
+        self.packet_ins = 0
+        datapath.listeners.append(self.on_message)
+
+    def on_message(self, msg):
+        if not isinstance(msg, ofproto_v1_3_parser.OFPFlowMod):
+            return
+        table = self.tables.setdefault(msg.table_id, [])
+        fields = dict(msg.match.items())
+        if msg.command == ofproto_v1_3.OFPFC_DELETE:
+            table[:] = [e for e in table if not all(e[1].get(k) == v for k, v in fields.items())]
+            return
+        table[:] = [e for e in table if not (e[0] == msg.priority and e[1] == fields)]
+        table.append((msg.priority, fields, msg.instructions))
+        table.sort(key=lambda e: -e[0])
+
+    def lookup(self, table_id, pkt):
+        for priority, fields, instructions in self.tables.get(table_id, ()):
+            if all(field_matches(pkt.get(k), v) for k, v in fields.items()):
+                return instructions
+        return None
+
+    def process(self, pkt):
+        """Return (table_id, True) if the packet would go to the controller."""
+        table_id = 0
+        while True:
+            instructions = self.lookup(table_id, pkt)
+            if instructions is None:
+                self.packet_ins += 1
+                return table_id, True
+            next_table = None
+            for inst in instructions:
+                if isinstance(inst, ofproto_v1_3_parser.OFPInstructionGotoTable):
+                    next_table = inst.table_id
+                for action in getattr(inst, 'actions', ()):
+                    if (isinstance(action, ofproto_v1_3_parser.OFPActionOutput) and
+                            action.port == ofproto_v1_3.OFPP_CONTROLLER):
+                        self.packet_ins += 1
+                        return table_id, True
+            if next_table is None:
+                return table_id, False
+            table_id = next_table
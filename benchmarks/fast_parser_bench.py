@@ -0,0 +1,94 @@
+"""Compare packet-in header decoding: full Ryu Packet vs. fast_parser.
+
+Usage: python benchmarks/fast_parser_bench.py [--packets N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+from ryu.lib.packet import packet, ethernet, vlan, arp, ipv4, tcp, udp, icmp  # noqa: E402
+
+import fast_parser  # noqa: E402
+
+
+def build_packet(kind, rnd):
+    src = '00:00:00:00:00:%02x' % rnd.randint(1, 250)
+    dst = '00:00:00:00:01:%02x' % rnd.randint(1, 250)
+    pkt = packet.Packet()
+    if kind == 'arp':
+        pkt.add_protocol(ethernet.ethernet(dst, src, 0x0806))
+        pkt.add_protocol(arp.arp_ip(1, src, '10.0.0.1', dst, '10.0.0.2'))
+        pkt.serialize()
+        return pkt.data
+    if kind == 'vlan_tcp':
+        pkt.add_protocol(ethernet.ethernet(dst, src, 0x8100))
+        pkt.add_protocol(vlan.vlan(vid=10, ethertype=0x0800))
+    else:
+        pkt.add_protocol(ethernet.ethernet(dst, src, 0x0800))
+    proto = {'icmp': 1, 'udp_dns': 17, 'udp': 17}.get(kind, 6)
+    pkt.add_protocol(ipv4.ipv4(src='10.0.0.1', dst='10.0.0.2', proto=proto))
+    if proto == 1:
+        pkt.add_protocol(icmp.icmp())
+    elif proto == 17:
+        port = 53 if kind == 'udp_dns' else rnd.choice([5683, 1883, 9999])
+        pkt.add_protocol(udp.udp(src_port=40000, dst_port=port))
+    else:
+        port = rnd.choice([80, 443, 22, 502, 8883])
+        pkt.add_protocol(tcp.tcp(src_port=40000, dst_port=port))
+    pkt.add_protocol(b'\x00' * 32)
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def ryu_path(data):
+    # Mirrors the original packet_in_handler: one Packet plus get_protocol calls.
+    pkt = packet.Packet(data)
+    eth = pkt.get_protocol(ethernet.ethernet)
+    ip_pkt = pkt.get_protocol(ipv4.ipv4)
+    port = None
+    if ip_pkt and ip_pkt.proto == 6:
+        port = pkt.get_protocol(tcp.tcp).dst_port
+    elif ip_pkt and ip_pkt.proto == 17:
+        port = pkt.get_protocol(udp.udp).dst_port
+    return eth.src, eth.dst, port
+
+
+def fast_path(data):
+    headers = fast_parser.parse_headers(data)
+    if headers is None:
+        headers = fast_parser.headers_from_packet(packet.Packet(data))
+    return headers.eth_src, headers.eth_dst, headers.dst_port
+
+
+def run(fn, packets):
+    start = time.perf_counter()
+    for data in packets:
+        fn(data)
+    return len(packets) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--packets', type=int, default=20000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    kinds = ['tcp', 'tcp', 'tcp', 'udp', 'udp_dns', 'icmp', 'arp', 'vlan_tcp']
+    packets = [build_packet(rnd.choice(kinds), rnd) for _ in range(args.packets)]
+
+    for data in packets[:500]:
+        assert ryu_path(data) == fast_path(data)
+
+    ryu_pps = run(ryu_path, packets)
+    fast_pps = run(fast_path, packets)
+    print(f"Ryu Packet parser : {ryu_pps:12.0f} packets/sec")
+    print(f"fast_parser       : {fast_pps:12.0f} packets/sec")
+    print(f"Speedup           : {fast_pps / ryu_pps:12.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Parsing a large `ovs-ofctl dump-flows` file: per-field regexes vs. flow_dump.
+
+A synthetic dump is written with 1M QoS flows in the format OVS prints for
+the controller's rules. Five ways to get a table from it are timed:
+  - the dashboard's old parser, five re.search calls per line into dicts;
+  - the same with one re.search per field for the fields flow_dump gives;
+  - a vectorized pandas str.extract with one pattern per column;
+  - flow_dump.parse into columns, plus the conversion to a DataFrame;
+  - FlowDumpReader.update after 1000 lines are appended to the parsed file.
+The new columns are checked against the old parser's rows.
+
+Usage: python benchmarks/flow_dump_bench.py [--flows 1000000]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topology'))
+import flow_dump  # noqa: E402
+
+HEADER = 'OFPST_FLOW reply (OF1.3) (xid=0x2):\n'
+LINE = (' cookie=0x%x, duration=%d.%03ds, table=0, n_packets=%d, n_bytes=%d, '
+        'idle_timeout=30, idle_age=%d, priority=%d,in_port="s1-eth%d",'
+        'dl_src=02:00:00:%02x:%02x:%02x,dl_dst=02:00:01:%02x:%02x:%02x '
+        'actions=meter:%d,set_queue:%d,output:"s1-eth%d"\n')
+CLASSES = ((300, 1), (200, 2), (100, 3))  # (priority, queue) of HIGH, MEDIUM, LOW
+
+
+def flow_lines(start, count):
+    for i in range(start, start + count):
+        priority, queue = CLASSES[i % 3]
+        yield LINE % (0x1000000 | queue, i % 600, i % 1000, i % 5000, (i % 5000) * 98,
+                      i % 30, priority, i % 4 + 1,
+                      i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff,
+                      i >> 16 & 0xff, i >> 8 & 0xff, (i + 1) & 0xff,
+                      queue, queue, (i + 1) % 4 + 1)
+    yield ' cookie=0x0, duration=600.000s, table=0, n_packets=%d, n_bytes=%d, priority=0 ' \
+          'actions=CONTROLLER:65535\n' % (start, start * 60)
+
+
+def regex_parse(flow_table_str):
+    entries = []
+    for line in flow_table_str.strip().splitlines():
+        queue_match = re.search(r"set_queue:(\d+)", line)
+        priority_match = re.search(r"priority=(\d+)", line)
+        src_match = re.search(r"dl_src=([\w:]+)", line)
+        dst_match = re.search(r"dl_dst=([\w:]+)", line)
+        in_port_match = re.search(r'in_port="?([\w-]+)"?', line)
+        if queue_match and priority_match and src_match and dst_match and in_port_match:
+            entries.append({
+                "Priority": priority_match.group(1),
+                "In Port": in_port_match.group(1),
+                "Source": src_match.group(1),
+                "Destination": dst_match.group(1),
+                "QoS Queue": queue_match.group(1)
+            })
+    return entries
+
+
+def regex_parse_all(flow_table_str):
+    entries = []
+    for line in flow_table_str.strip().splitlines():
+        entry = {}
+        for name, pattern in SEARCH.items():
+            found = re.search(pattern, line)
+            entry[name] = found.group(1) if found else None
+        entries.append(entry)
+    return entries
+
+
+EXTRACT = {
+    'cookie': r'cookie=0x([0-9a-f]+)', 'n_packets': r'n_packets=(\d+)',
+    'n_bytes': r'n_bytes=(\d+)', 'idle_age': r'idle_age=(\d+)',
+    'priority': r'priority=(\d+)', 'in_port': r'in_port="?([\w-]+)',
+    'dl_src': r'dl_src=([\w:]+)', 'dl_dst': r'dl_dst=([\w:]+)',
+    'queue': r'set_queue:(\d+)', 'actions': r' actions=(.*)',
+}
+SEARCH = dict(EXTRACT, duration=r'duration=([\d.]+)s', table=r'table=(\d+)',
+              idle_timeout=r'idle_timeout=(\d+)', hard_timeout=r'hard_timeout=(\d+)',
+              hard_age=r'hard_age=(\d+)', match=r'priority=\d+,(\S*)')
+
+
+def pandas_parse(text):
+    lines = pd.Series(text.splitlines())
+    lines = lines[lines.str.contains(' actions=', regex=False)]
+    return pd.DataFrame({name: lines.str.extract(pattern, expand=False)
+                         for name, pattern in EXTRACT.items()})
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(HEADER)
+            f.writelines(flow_lines(0, args.flows))
+        with open(path) as f:
+            text = f.read()
+        print(f"{args.flows + 1} flow lines, {len(text) / 2 ** 20:.0f} MiB")
+
+        # Columns first: a million live dicts would slow every later GC pass.
+        table, new = timed(flow_dump.parse, text)
+        _, frame = timed(table.to_frame)
+        _, vectorized = timed(pandas_parse, text)
+        _, every_field = timed(regex_parse_all, text)
+        rows, old = timed(regex_parse, text)
+        print(f"  5x re.search into dicts:  {old:6.2f} s")
+        print(f"  {len(SEARCH)}x re.search into dicts: {every_field:6.2f} s")
+        print(f"  pandas str.extract:       {vectorized:6.2f} s, {len(EXTRACT)} fields")
+        print(f"  flow_dump.parse:          {new:6.2f} s, all {len(flow_dump.COLUMNS)} fields "
+              f"({every_field / new:.1f}x the per-field searches); to_frame {frame:.2f} s")
+
+        qos = [i for i, q in enumerate(table.column('queue')) if q >= 0]
+        assert len(qos) == len(rows) == args.flows
+        for i in (0, 1, len(rows) // 2, len(rows) - 1):
+            row, j = rows[i], qos[i]
+            assert row['Priority'] == str(table.column('priority')[j])
+            assert row['In Port'] == table.column('in_port')[j]
+            assert row['Source'] == table.column('dl_src')[j]
+            assert row['Destination'] == table.column('dl_dst')[j]
+            assert row['QoS Queue'] == str(table.column('queue')[j])
+        assert table.column('priority')[-1] == 0 and table.column('in_port')[-1] == ''
+        del rows, table
+
+        reader = flow_dump.FlowDumpReader(path)
+        _, first = timed(reader.update)
+        with open(path, 'a') as f:
+            f.writelines(flow_lines(args.flows, 1000))
+        added, append = timed(reader.update)
+        assert added == 1001 and len(reader.table) == args.flows + 1002
+        _, idle = timed(reader.update)
+        print(f"  FlowDumpReader: first read {first:.2f} s, 1000 appended lines "
+              f"{append * 1e3:.1f} ms, unchanged file {idle * 1e3:.2f} ms")
+        with open(path, 'w') as f:
+            f.write(HEADER)
+            f.writelines(flow_lines(0, 10))
+        assert reader.update() == 11 and len(reader.table) == 11
+        print("  rewritten shorter file: parsed again from the start")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Memory of flow_priorities: original dict of 4-tuples vs. BoundedStore.
+
+Part 1 inserts N distinct flows into both representations. Part 2 simulates
+24 hours of IoT device churn in virtual time: flows arrive at a fixed rate,
+live for a random time and are removed by FlowRemoved, except for a small
+share whose notification is lost and must be caught by the TTL.
+
+Usage: python benchmarks/flow_store_bench.py [--flows N] [--rate FLOWS_PER_SEC] [--hours H]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+import flow_store  # noqa: E402
+
+
+def mac(i):
+    return '02:00:%02x:%02x:%02x:%02x' % (i >> 24 & 0xff, i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)
+
+
+def measure(fill):
+    tracemalloc.start()
+    obj = fill()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def fill_tuples(n):
+    table = {}
+    for i in range(n):
+        table[(i % 64 + 1, mac(i), mac(i + n), i % 48 + 1)] = 20
+    return table
+
+
+def fill_store(n):
+    store = flow_store.BoundedStore(n, 3600)
+    for i in range(n):
+        store[flow_store.flow_key(i % 64 + 1, mac(i), mac(i + n), i % 48 + 1)] = 20
+    return store
+
+
+def churn(rate, hours, lost_share, cap, ttl, seed=11):
+    rnd = random.Random(seed)
+    now = [0.0]
+    store = flow_store.BoundedStore(cap, ttl, clock=lambda: now[0])
+    unbounded = {}
+    removals = []  # (time, key)
+    peak = 0
+    flow_id = 0
+    step = 1.0
+    end = hours * 3600
+    while now[0] < end:
+        for _ in range(rnd.randint(0, int(2 * rate * step))):
+            flow_id += 1
+            key = flow_store.flow_key(flow_id % 64 + 1, mac(flow_id), mac(flow_id * 7), 1)
+            store[key] = 20
+            unbounded[key] = 20
+            # Idle timeout of 30 s on top of an exponential active lifetime.
+            heapq.heappush(removals, (now[0] + 30 + rnd.expovariate(1 / 120.0), key))
+        while removals and removals[0][0] <= now[0]:
+            _, key = heapq.heappop(removals)
+            if rnd.random() >= lost_share:
+                store.pop(key)
+        if int(now[0]) % 10 == 0:
+            store.expire()
+        peak = max(peak, len(store))
+        now[0] += step
+    return len(store), peak, len(unbounded), store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', type=int, default=1000000)
+    parser.add_argument('--rate', type=float, default=20.0)
+    parser.add_argument('--hours', type=float, default=24.0)
+    args = parser.parse_args()
+
+    _, tuple_bytes = measure(lambda: fill_tuples(args.flows))
+    _, store_bytes = measure(lambda: fill_store(args.flows))
+    print(f"{args.flows} distinct flows")
+    print(f"  dict of 4-tuples : {tuple_bytes / 2**20:8.1f} MiB")
+    print(f"  BoundedStore     : {store_bytes / 2**20:8.1f} MiB")
+
+    size, peak, unbounded, store = churn(args.rate, args.hours, lost_share=0.01,
+                                         cap=200000, ttl=3600)
+    print(f"{args.hours:g}h churn at {args.rate:g} new flows/sec, 1% FlowRemoved lost")
+    print(f"  unbounded dict entries : {unbounded}")
+    print(f"  BoundedStore entries   : {size} (peak {peak}, {store.expirations} expired by TTL)")
+
+
+if __name__ == '__main__':
+    main()
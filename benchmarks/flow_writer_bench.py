@@ -0,0 +1,84 @@
+"""Flow-install latency and messages per write for several FlowWriter windows.
+
+The fake switch processes writes one at a time, paying a fixed cost per
+write plus a cost per message, and answers each barrier once everything
+before it has been processed.
+
+Usage: python benchmarks/flow_writer_bench.py [--flows N] [--rate FLOWS_PER_SEC]
+"""
+import argparse
+import random
+import time
+
+from fake_datapath import FakeDatapath
+
+from ryu.lib import hub
+
+import flow_writer
+
+WRITE_COST = 0.0002  # seconds per socket write on the switch side
+MESSAGE_COST = 0.00002  # seconds per message
+
+
+class SlowSwitch(object):
+    def __init__(self, datapath, writer):
+        self.writer = writer
+        self.busy_until = 0.0
+        self.batch = 0
+        datapath.listeners.append(self.on_message)
+        self._send = datapath.send
+        datapath.send = self.send
+
+    def send(self, buf, close_socket=False):
+        self.batch = 0
+        self._send(buf, close_socket)
+        now = hub_time()
+        self.busy_until = max(self.busy_until, now) + WRITE_COST + MESSAGE_COST * self.batch
+        return True
+
+    def on_message(self, msg):
+        self.batch += 1
+        if isinstance(msg, msg.datapath.ofproto_parser.OFPBarrierRequest):
+            hub.spawn(self._reply_later, msg.xid)
+
+    def _reply_later(self, xid):
+        hub.sleep(0)  # let send() account for this write first
+        hub.sleep(max(0.0, self.busy_until - hub_time()))
+        self.writer.on_barrier_reply(xid)
+
+
+def hub_time():
+    return time.monotonic()
+
+
+def run(window, flows, rate, seed=5):
+    dp = FakeDatapath(1)
+    writer = flow_writer.FlowWriter(dp, window=window, max_batch=64)
+    SlowSwitch(dp, writer)
+    parser = dp.ofproto_parser
+    rnd = random.Random(seed)
+    for i in range(flows):
+        match = parser.OFPMatch(in_port=1, eth_dst='00:00:00:00:%02x:%02x' % (i >> 8, i & 0xff))
+        writer.send(parser.OFPFlowMod(datapath=dp, priority=10, match=match, instructions=[]))
+        hub.sleep(rnd.expovariate(rate))
+    writer.flush()
+    while writer.inflight:
+        hub.sleep(0.01)
+    return writer.latency_percentiles(), writer.messages_per_write()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=5000.0)
+    args = parser.parse_args()
+
+    print(f"{'window ms':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'msgs/write':>11}")
+    for window in (0.0, 0.001, 0.005, 0.02):
+        latency, per_write = run(window, args.flows, args.rate)
+        print(f"{window * 1e3:>9.1f} {latency[50] * 1e3:>8.2f} {latency[90] * 1e3:>8.2f} "
+              f"{latency[99] * 1e3:>8.2f} {per_write:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
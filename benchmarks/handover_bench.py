@@ -0,0 +1,248 @@
+"""Hand switches between two controller channels under a packet-in stream.
+
+A simulated switch is connected to two controllers over channels with
+different one-way delays and emits numbered packet-ins at a fixed rate while
+it is migrated. It implements OpenFlow 1.3 roles (a MASTER request demotes
+the other master, stale generation ids are rejected), barriers and
+FlowRemoved for SEND_FLOW_REM flows. Every packet-in a controller decides to
+handle is recorded, so lost and duplicated packet-ins can be counted:
+
+  cutover   the old controller stops at the decision, the new one is made MASTER
+  no fence  the new controller goes EQUAL then MASTER and handles all it gets
+  fenced    MigrationExecutor's barrier and marker handshake
+  split     the same with one executor per controller, as in two ryu-manager
+            processes, exchanging handover messages over a SYNC_DELAY link
+
+Usage: python benchmarks/handover_bench.py [--migrations N] [--rate PPS]
+"""
+import argparse
+import heapq
+import itertools
+
+from fake_datapath import FakeDatapath
+from ryu.ofproto import ofproto_v1_3 as ofp
+from ryu.ofproto import ofproto_v1_3_parser as parser
+
+import migration_executor
+
+SYNC_DELAY = 0.001  # one-way state_sync delay between the two controller processes
+
+
+class Sim(object):
+    def __init__(self):
+        self.now = 0.0
+        self.events = []
+        self.seq = itertools.count()
+
+    def at(self, delay, fn, *args):
+        heapq.heappush(self.events, (self.now + delay, next(self.seq), fn, args))
+
+    def run_until(self, end):
+        while self.events and self.events[0][0] <= end:
+            self.now, _, fn, args = heapq.heappop(self.events)
+            fn(*args)
+        self.now = end
+
+
+class Controller(object):
+    """One controller instance: a channel to the switch plus its handlers."""
+
+    def __init__(self, sim, switch, name, delay):
+        self.sim = sim
+        self.name = name
+        self.delay = delay
+        self.datapath = FakeDatapath(switch.dpid)
+        self.datapath.listeners.append(lambda msg: sim.at(delay, switch.receive, self, msg))
+        self.handled = []
+        self.gate = None  # callable(datapath) -> handle this packet-in?
+        self.executor = None
+
+    def deliver(self, msg):
+        self.sim.at(self.delay, self._dispatch, msg)
+
+    def _dispatch(self, msg):
+        ex = self.executor
+        if isinstance(msg, parser.OFPPacketIn):
+            if self.gate is None or self.gate(self.datapath):
+                self.handled.append(msg.data)
+        elif ex is None:
+            return
+        elif isinstance(msg, parser.OFPRoleReply):
+            ex.on_role_reply(self.datapath, msg)
+        elif isinstance(msg, parser.OFPBarrierReply):
+            ex.on_barrier_reply(self.datapath, msg)
+        elif isinstance(msg, parser.OFPFlowRemoved):
+            ex.on_flow_removed(self.datapath, msg)
+        elif isinstance(msg, parser.OFPErrorMsg):
+            ex.on_error(self.datapath, msg)
+
+
+class RoleSwitch(object):
+    def __init__(self, sim, dpid=1):
+        self.sim = sim
+        self.dpid = dpid
+        self.roles = {}          # controller -> role
+        self.generation = None   # last generation_id seen in MASTER/SLAVE requests
+        self.flows = {}          # cookie -> flags
+        self.emitted = 0
+
+    def send(self, controller, msg):
+        if self.roles.get(controller) != ofp.OFPCR_ROLE_SLAVE or not isinstance(
+                msg, (parser.OFPPacketIn, parser.OFPFlowRemoved)):
+            controller.deliver(msg)
+
+    def broadcast(self, msg_factory):
+        for controller in self.roles:
+            self.send(controller, msg_factory(controller))
+
+    def packet_in(self):
+        self.emitted += 1
+        data = self.emitted
+        self.broadcast(lambda c: parser.OFPPacketIn(c.datapath, buffer_id=ofp.OFP_NO_BUFFER,
+                                                    total_len=0, reason=ofp.OFPR_NO_MATCH,
+                                                    table_id=0, cookie=0,
+                                                    match=parser.OFPMatch(in_port=1), data=data))
+
+    def receive(self, controller, msg):
+        dp = controller.datapath
+        if isinstance(msg, parser.OFPRoleRequest):
+            if msg.role in (ofp.OFPCR_ROLE_MASTER, ofp.OFPCR_ROLE_SLAVE):
+                if self.generation is not None and \
+                        (msg.generation_id - self.generation) % (1 << 64) >= 1 << 63:
+                    err = parser.OFPErrorMsg(dp, type_=ofp.OFPET_ROLE_REQUEST_FAILED,
+                                             code=ofp.OFPRRFC_STALE)
+                    err.xid = msg.xid
+                    self.send(controller, err)
+                    return
+                self.generation = msg.generation_id
+            if msg.role == ofp.OFPCR_ROLE_MASTER:
+                for other, role in self.roles.items():
+                    if role == ofp.OFPCR_ROLE_MASTER:
+                        self.roles[other] = ofp.OFPCR_ROLE_SLAVE
+            if msg.role != ofp.OFPCR_ROLE_NOCHANGE:
+                self.roles[controller] = msg.role
+            reply = parser.OFPRoleReply(dp, role=self.roles[controller],
+                                        generation_id=self.generation or 0)
+            reply.xid = msg.xid
+            self.send(controller, reply)
+        elif isinstance(msg, parser.OFPBarrierRequest):
+            reply = parser.OFPBarrierReply(dp)
+            reply.xid = msg.xid
+            self.send(controller, reply)
+        elif isinstance(msg, parser.OFPFlowMod):
+            if msg.command == ofp.OFPFC_ADD:
+                self.flows[msg.cookie] = msg.flags
+            elif msg.command in (ofp.OFPFC_DELETE, ofp.OFPFC_DELETE_STRICT):
+                flags = self.flows.pop(msg.cookie, 0)
+                if flags & ofp.OFPFF_SEND_FLOW_REM:
+                    self.broadcast(lambda c: parser.OFPFlowRemoved(
+                        c.datapath, cookie=msg.cookie, priority=msg.priority,
+                        reason=ofp.OFPRR_DELETE, table_id=0, duration_sec=0, duration_nsec=0,
+                        idle_timeout=0, hard_timeout=0, packet_count=0, byte_count=0,
+                        match=msg.match))
+
+
+def role_request(controller, role, generation):
+    dp = controller.datapath
+    dp.send_msg(parser.OFPRoleRequest(dp, role, generation))
+
+
+def run(mode, migrations, rate, gap):
+    sim = Sim()
+    switch = RoleSwitch(sim)
+    a = Controller(sim, switch, 'a', 0.0005)
+    b = Controller(sim, switch, 'b', 0.002)
+    switch.roles = {a: ofp.OFPCR_ROLE_MASTER, b: ofp.OFPCR_ROLE_SLAVE}
+    switch.generation = 0
+    executor = migration_executor.MigrationExecutor(clock=lambda: sim.now)
+    owner = {'current': a, 'generation': 0}
+    stop = []
+
+    def emit():
+        if not stop:
+            switch.packet_in()
+            sim.at(1.0 / rate, emit)
+    sim.at(0, emit)
+
+    node = {a: 1, b: 2}
+    if mode == 'fenced':
+        for c in (a, b):
+            c.executor = executor
+            c.gate = executor.should_handle
+    elif mode == 'split':
+        def send(peer, *message):
+            sim.at(SYNC_DELAY, lambda: peer.executor.on_message(*message,
+                                                                datapath=peer.datapath))
+        for c, peer in ((a, b), (b, a)):
+            c.executor = migration_executor.MigrationExecutor(
+                clock=lambda: sim.now, node_id=node[c],
+                send=lambda *message, peer=peer: send(peer, *message))
+            c.gate = c.executor.should_handle
+    else:
+        active = {a}
+        a.gate = b.gate = lambda dp: (a if dp is a.datapath else b) in active
+
+    latencies = []
+    for i in range(migrations):
+        sim.run_until(sim.now + gap)
+        old = owner['current']
+        new = b if old is a else a
+        started = sim.now
+        if mode == 'fenced':
+            executor.start(old.datapath, new.datapath, started=started)
+            while executor.busy(switch.dpid):
+                sim.run_until(sim.now + 0.0001)
+        elif mode == 'split':
+            # Decided by the current owner, the side that waits for MSG_FENCE.
+            old.executor.start(old.datapath, None, node[old], node[new], started=started)
+            while old.executor.busy(switch.dpid) or new.executor.busy(switch.dpid):
+                sim.run_until(sim.now + 0.0001)
+        else:
+            owner['generation'] += 1
+            if mode == 'cutover':
+                active.discard(old)
+            else:
+                role_request(new, ofp.OFPCR_ROLE_EQUAL, 0)
+                active.add(new)
+                sim.run_until(sim.now + 2 * new.delay)
+            role_request(new, ofp.OFPCR_ROLE_MASTER, owner['generation'])
+            sim.run_until(sim.now + 2 * new.delay)
+            active.discard(old)
+            active.add(new)
+            latencies.append(sim.now - started)
+        owner['current'] = new
+    sim.run_until(sim.now + gap)
+    stop.append(True)
+    sim.run_until(sim.now + gap)  # drain packet-ins still in flight
+    if mode == 'fenced':
+        latencies = list(executor.latencies)
+    elif mode == 'split':
+        latencies = list(a.executor.latencies) + list(b.executor.latencies)
+
+    handled = a.handled + b.handled
+    unique = set(handled)
+    return switch.emitted, switch.emitted - len(unique), len(handled) - len(unique), sorted(latencies)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--migrations', type=int, default=200)
+    arg_parser.add_argument('--rate', type=int, default=5000, help='packet-ins per second')
+    arg_parser.add_argument('--gap', type=float, default=0.05, help='seconds between migrations')
+    args = arg_parser.parse_args()
+
+    print(f"{args.migrations} migrations, {args.rate} packet-in/s, channel delays 0.5 ms / 2 ms")
+    print(f"{'mode':>9} {'packet-ins':>11} {'lost':>6} {'duplicate':>10} {'p50 ms':>7} {'p99 ms':>7}")
+    for mode in ('cutover', 'no fence', 'fenced', 'split'):
+        emitted, lost, dup, lat = run(mode, args.migrations, args.rate, args.gap)
+        p50 = lat[len(lat) // 2] * 1e3
+        p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1e3
+        print(f"{mode:>9} {emitted:>11} {lost:>6} {dup:>10} {p50:>7.2f} {p99:>7.2f}")
+        if mode in ('fenced', 'split'):
+            assert lost == 0 and dup == 0, (mode, lost, dup)
+            assert len(lat) == args.migrations, (mode, len(lat))
+    print("OK: fenced handovers handled every packet-in exactly once")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Accuracy and memory of the Space-Saving elephant detector on Zipf traffic.
+
+1M flows get Zipf-distributed byte deltas and are streamed in random order,
+once each like the entries of one flow stats dump. For several counter
+budgets the bench reports the update cost, the memory held by the summary
+next to an exact dict, the recall and precision of the flows reported above
+a share of the bytes, and the count error on the true top 100. It then runs
+the controller against a fake datapath: one MEDIUM elephant among many mice
+has to be demoted to the LOW queue and promoted once it cools down.
+
+Usage: python benchmarks/heavy_hitter_bench.py [--flows 1000000] [--skew 1.1]
+"""
+import argparse
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+
+from fake_datapath import FakeDatapath, meter_features_event
+
+import enhanced_traffic_controller
+import heavy_hitters
+import qos_rules
+
+
+def zipf_trace(flows, skew, total_bytes, seed=5):
+    weights = 1.0 / np.arange(1, flows + 1) ** skew
+    sizes = np.maximum(1, (weights / weights.sum() * total_bytes)).astype(np.int64)
+    keys = np.random.default_rng(seed).permutation(flows)
+    # keys[i] is the flow of rank i; streaming in key order shuffles the ranks.
+    order = np.argsort(keys)
+    return keys[order].tolist(), sizes[order].tolist(), dict(zip(keys.tolist(), sizes.tolist()))
+
+
+def measure(k, keys, sizes, exact, shares):
+    summary = heavy_hitters.SpaceSaving(k)
+    add = summary.add
+    start = time.perf_counter()
+    for key, size in zip(keys, sizes):
+        add(key, size)
+    elapsed = time.perf_counter() - start
+    # Memory is measured on a second run; tracemalloc would skew the timing.
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    copy = heavy_hitters.SpaceSaving(k)
+    for key, size in zip(keys, sizes):
+        copy.add(key, size)
+    memory = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    total = summary.total
+    accuracy = []
+    for share in shares:
+        truth = set(key for key, size in exact.items() if size >= share * total)
+        found = set(entry[0] for entry in summary.heavy(share * total))
+        recall = len(truth & found) / len(truth) if truth else 1.0
+        precision = len(truth & found) / len(found) if found else 1.0
+        accuracy.append((len(truth), recall, precision))
+    top = sorted(exact.items(), key=lambda item: -item[1])[:100]
+    errors = []
+    for key, size in top:
+        counter = summary.counters.get(key)
+        errors.append(abs(counter[0] - size) / size if counter else 1.0)
+    return elapsed / len(keys), memory, accuracy, sum(errors) / len(errors)
+
+
+def exact_memory(keys, sizes):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    exact = {}
+    for key, size in zip(keys, sizes):
+        exact[key] = exact.get(key, 0) + size
+    memory = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return memory
+
+
+def controller_check():
+    app = enhanced_traffic_controller.EnhancedTrafficController()
+    dp = FakeDatapath(1)
+    ofproto = dp.ofproto
+    app.meter_features_reply_handler(meter_features_event(dp))
+    parser = dp.ofproto_parser
+    table = app.rules.table
+    medium, low = table.queue('MEDIUM'), table.queue('LOW')
+
+    def stat(i, byte_count):
+        match = parser.OFPMatch(in_port=1, eth_dst='02:00:00:00:01:%02x' % (i >> 8),
+                                eth_src='02:00:00:00:00:%02x' % (i & 0xff))
+        inst = app.meter_instructions(dp, 'MEDIUM') + [parser.OFPInstructionActions(
+            ofproto.OFPIT_APPLY_ACTIONS,
+            [parser.OFPActionSetQueue(medium), parser.OFPActionOutput(2)])]
+        return parser.OFPFlowStats(table_id=0, duration_sec=1, duration_nsec=0,
+                                   priority=table.priority_value('MEDIUM'), idle_timeout=30,
+                                   hard_timeout=0, flags=0, cookie=table.cookie('MEDIUM'),
+                                   packet_count=byte_count // 1000, byte_count=byte_count,
+                                   match=match, instructions=inst)
+
+    def round_(elephant_rate, totals):
+        totals[0] += elephant_rate
+        for i in range(1, len(totals)):
+            totals[i] += 1000000
+        app.request_stats(dp)
+        heavy, demoted = app.flow_dumps[dp.id]
+        body = [stat(i, totals[i]) for i in range(len(totals))]
+        mark = len(dp.sent)
+        # Two multipart replies, like a large dump, and the demoted flows'
+        # dump, answered empty as the stats above keep the MEDIUM cookie.
+        half = len(body) // 2
+        for xid, part, flags in ((heavy, body[:half], ofproto.OFPMPF_REPLY_MORE),
+                                 (heavy, body[half:], 0), (demoted, [], 0)):
+            reply = parser.OFPFlowStatsReply(dp, body=part, flags=flags)
+            reply.xid = xid
+            app.flow_stats_reply_handler(SimpleNamespace(msg=reply))
+        app.writer_for(dp).flush()
+        return [m for m in dp.sent[mark:] if isinstance(m, parser.OFPFlowMod)]
+
+    totals = [0] * 500
+    assert not round_(1000000, totals)
+    mods = round_(500000000, totals)
+    assert len(mods) == 1, mods
+    mod = mods[0]
+    actions = mod.instructions[-1].actions
+    assert mod.command == ofproto.OFPFC_ADD
+    assert actions[0].queue_id == low and mod.cookie & qos_rules.COOKIE_DEMOTED
+    assert mod.cookie & qos_rules.COOKIE_CLASS_MASK == table.class_cookie('LOW')[0]
+    assert mod.instructions[0].meter_id == table.meter_id('LOW')
+    print(f"elephant at 50% of MEDIUM bytes: replaced in class LOW, queue {low}, "
+          f"meter {mod.instructions[0].meter_id}")
+    assert not round_(500000000, totals)
+    mods = round_(1000000, totals)
+    assert len(mods) == 1 and mods[0].instructions[-1].actions[0].queue_id == medium
+    assert mods[0].cookie == table.cookie('MEDIUM')
+    print(f"cooled down to the mice's rate: replaced back in class MEDIUM, queue {medium}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', type=int, default=1000000)
+    parser.add_argument('--skew', type=float, default=1.1)
+    args = parser.parse_args()
+
+    shares = (0.01, 0.001)
+    keys, sizes, exact = zipf_trace(args.flows, args.skew, 10 ** 11)
+    print(f"{args.flows} flows, Zipf skew {args.skew}, exact dict "
+          f"{exact_memory(keys, sizes) / 2 ** 20:.1f} MiB")
+    header = ' '.join(f"{'>=%g: n rec prec' % s:>22}" for s in shares)
+    print(f"{'counters':>8} {'us/update':>10} {'memory KiB':>11} {header} {'top100 err':>11}")
+    for k in (100, 1000, 10000):
+        cost, memory, accuracy, top_error = measure(k, keys, sizes, exact, shares)
+        cols = ' '.join(f"{n:>8} {recall:>6.2f} {precision:>6.2f}"
+                        for n, recall, precision in accuracy)
+        print(f"{k:>8} {cost * 1e6:>10.2f} {memory / 1024:>11.0f} {cols} {top_error:>10.1%}")
+    controller_check()
+
+
+if __name__ == '__main__':
+    main()
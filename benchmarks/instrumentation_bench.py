@@ -0,0 +1,109 @@
+"""Per-packet cost of the packet-in path with stage timers vs. INFO logging.
+
+The same reactive workload is replayed into EnhancedTrafficController with
+its logger at INFO, writing formatted records to /dev/null. The "INFO per
+packet" variant adds back the two log lines the handler used to emit for
+every packet-in. The other variant is the app as it is: it only keeps the
+stage histograms and emits sampled debug records. It also checks the
+histogram percentiles against exact ones and prints the stage breakdown.
+
+Usage: python benchmarks/instrumentation_bench.py [--packets 20000]
+"""
+import argparse
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from fake_datapath import FakeDatapath, packet_in_event
+from proactive_bench import workload
+
+import enhanced_traffic_controller
+import instrumentation
+
+
+class LegacyLogging(enhanced_traffic_controller.EnhancedTrafficController):
+    def packet_in_handler(self, ev):
+        dpid = ev.msg.datapath.id
+        self.logger.info(f"Packet_in received from DPID {dpid}")
+        super(LegacyLogging, self).packet_in_handler(ev)
+
+    def handle_packet_in(self, msg, headers, priority):
+        self.logger.info(f"DPID {msg.datapath.id} Packet from {headers.eth_src} to "
+                         f"{headers.eth_dst} Priority={priority} "
+                         f"Queue={self.priority_to_queue(priority)}")
+        super(LegacyLogging, self).handle_packet_in(msg, headers, priority)
+
+
+def replay(cls, events_of):
+    app = cls()
+    app.ADMISSION = False  # time every packet-in, none shed
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+    app.logger.handlers[:] = [handler]
+    app.logger.propagate = False
+    app.logger.setLevel(logging.INFO)
+    dp = FakeDatapath(1)
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    events = events_of(dp)
+    start = time.perf_counter()
+    for ev in events:
+        app.packet_in_handler(ev)
+    return (time.perf_counter() - start) / len(events), app
+
+
+def check_histogram(samples=200000):
+    values = np.random.default_rng(1).lognormal(np.log(50e-6), 1.0, samples)
+    histogram = instrumentation.Histogram()
+    for v in values.tolist():
+        histogram.record(v)
+    worst = 0.0
+    for p in (50, 90, 99, 99.9):
+        exact = np.percentile(values, p)
+        worst = max(worst, abs(histogram.percentile(p) - exact) / exact)
+    return len(histogram.counts), worst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--packets', type=int, default=20000)
+    args = parser.parse_args()
+
+    trace = workload(200, args.packets // 10, 10)
+
+    def events_of(dp):
+        return [packet_in_event(dp, data, fields['in_port']) for data, fields in trace]
+
+    for cls in (LegacyLogging, enhanced_traffic_controller.EnhancedTrafficController):
+        replay(cls, events_of)  # warm-up
+    legacy, _ = replay(LegacyLogging, events_of)
+    current, app = replay(enhanced_traffic_controller.EnhancedTrafficController, events_of)
+    print(f"{len(trace)} packet-ins, logger at INFO to /dev/null")
+    print(f"  INFO per packet:       {legacy * 1e6:6.1f} us/packet-in")
+    print(f"  timers + sampled logs: {current * 1e6:6.1f} us/packet-in "
+          f"({(1 - current / legacy) * 100:.0f}% less)")
+
+    stats = instrumentation.Instrumentation(('a',))
+    clock = stats.clock
+    rounds = 200000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        t = clock()
+        stats.record('a', clock() - t)
+    per_timer = (time.perf_counter() - start) / rounds
+    print(f"  one stage timer: {per_timer * 1e6:.2f} us, "
+          f"{len(app.STAGES)} stages at most {len(app.STAGES) * per_timer * 1e6:.1f} us/packet-in")
+
+    buckets, error = check_histogram()
+    print(f"histogram: {buckets} buckets, worst percentile error {error:.1%} "
+          f"(p50/p90/p99/p99.9 of 200k lognormal samples)")
+    print(f"{'stage':>10} {'count':>7} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for name, (n, p50, p99, worst) in app.stats.summary().items():
+        print(f"{name:>10} {n:>7} {p50 * 1e6:>8.1f} {p99 * 1e6:>8.1f} {worst * 1e6:>8.1f}")
+    print(f"packet-ins by class: {app.stats.class_totals()}")
+
+
+if __name__ == '__main__':
+    main()
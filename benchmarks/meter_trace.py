@@ -0,0 +1,94 @@
+"""Replay a per-class demand trace and print the MeterMods it produces.
+
+One FakeDatapath is connected to EnhancedTrafficController. Every round
+the app polls aggregate stats, and the replies carry byte counters that grow
+at the demand the trace gives for that round. The MeterMods written after
+each round are decoded, so the meter rates can be checked against the
+demand: LOW should get the whole link while HIGH and MEDIUM are idle, and
+shrink towards its floor only when they pick up.
+
+Usage: python benchmarks/meter_trace.py [--period 10]
+"""
+import argparse
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath, meter_features_event, packet_in_event
+from proactive_bench import build
+
+import enhanced_traffic_controller
+
+# Rounds of (HIGH, MEDIUM, LOW) demand in Mbit/s.
+TRACE = ([(0, 0, 80)] * 3 + [(40, 0, 80)] * 3 + [(40, 30, 80)] * 3 +
+         [(5, 30, 80)] * 3 + [(0, 0, 80)] * 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--period', type=float, default=10, help='seconds between stats rounds')
+    args = parser.parse_args()
+
+    now = [0.0]
+    app = enhanced_traffic_controller.EnhancedTrafficController()
+    app.meters.clock = lambda: now[0]
+    dp = FakeDatapath(1)
+    ofp_parser = dp.ofproto_parser
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    app.meter_features_reply_handler(meter_features_event(dp))
+    app.writer_for(dp).flush()
+    table = app.rules.table
+    names = dict((table.meter_id(n), n) for n in table.class_names)
+
+    def meter_mods(mark):
+        return [m for m in dp.sent[mark:] if isinstance(m, ofp_parser.OFPMeterMod)]
+
+    installed = {}
+    for mod in meter_mods(0):
+        assert mod.command == dp.ofproto.OFPMC_ADD
+        installed[names[mod.meter_id]] = mod.bands[0].rate
+    print(f"connect: {len(installed)} meters added at {installed}")
+
+    # A reactive flow must point at its class meter.
+    for src, dst in ((1, 0), (0, 1)):
+        data, fields = build(src, dst, 17, 53)
+        app.packet_in_handler(packet_in_event(dp, data, fields['in_port']))
+    flow = [m for m in dp.sent_of(ofp_parser.OFPFlowMod) if m.priority][-1]
+    meter = flow.instructions[0]
+    assert isinstance(meter, ofp_parser.OFPInstructionMeter)
+    assert names[meter.meter_id] == 'HIGH', meter.meter_id
+    print(f"DNS flow uses meter {meter.meter_id} (HIGH)")
+
+    totals = dict((n, 0) for n in table.class_names)
+    print(f"{'round':>5} {'HIGH':>5} {'MED':>5} {'LOW':>5} Mbit/s  "
+          f"{'HIGH':>7} {'MEDIUM':>7} {'LOW':>7} meter Mbit/s  MeterMods")
+    low_rates = []
+    for i, demand in enumerate(TRACE):
+        now[0] += args.period
+        for name, mbps in zip(('HIGH', 'MEDIUM', 'LOW'), demand):
+            totals[name] += int(mbps * 1e6 / 8 * args.period)
+        app.request_stats(dp)
+        mark = len(dp.sent)
+        for xid, name in list(app.class_stats_pending[dp.id].items()):
+            reply = ofp_parser.OFPAggregateStatsReply(dp, body=ofp_parser.OFPAggregateStats(
+                packet_count=totals[name] // 1000, byte_count=totals[name], flow_count=1), flags=0)
+            reply.xid = xid
+            app.aggregate_stats_reply_handler(SimpleNamespace(msg=reply))
+        app.writer_for(dp).flush()
+        mods = meter_mods(mark)
+        for mod in mods:
+            assert mod.command == dp.ofproto.OFPMC_MODIFY
+            installed[names[mod.meter_id]] = mod.bands[0].rate
+        low_rates.append(installed['LOW'])
+        print(f"{i + 1:>5} {demand[0]:>5} {demand[1]:>5} {demand[2]:>5}         "
+              f"{installed['HIGH'] / 1e3:>7.1f} {installed['MEDIUM'] / 1e3:>7.1f} "
+              f"{installed['LOW'] / 1e3:>7.1f}               {len(mods)}")
+
+    capacity = app.LINK_CAPACITY / 1e3
+    assert installed['HIGH'] == capacity
+    assert low_rates[2] == capacity and low_rates[-1] == capacity, low_rates
+    assert min(low_rates) >= app.METER_FLOORS['LOW'] / 1e3
+    assert low_rates[8] < low_rates[5] < low_rates[2], low_rates
+    print("OK: LOW is only throttled while HIGH/MEDIUM demand is up")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Memory and query cost of the controller's time-series store.
+
+The store is fed one sample per second for each series of a 50-switch
+network. Memory is reported as simulated uptime grows. Then a full
+download, a downsampled one and a one-second incremental poll are compared
+by size and time. Last, EnhancedTrafficController is given a WSGI
+application and driven with a stats round on a fake datapath, and
+/metrics is fetched through it the way the dashboard does.
+
+Usage: python benchmarks/metrics_bench.py [--switches 50] [--hours 4]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath
+
+from ryu.app.wsgi import WSGIApplication
+from webob import Request
+
+import enhanced_traffic_controller
+import metrics_store
+
+METRICS = ('load', 'pps', 'packet_in_rate', 'install_p99_ms')
+
+
+def fill(store, switches, start, seconds, now):
+    for second in range(start, start + seconds):
+        now[0] = second
+        for dpid in range(1, switches + 1):
+            for metric in METRICS:
+                store.record(metric, dpid, (second * dpid) % 1000)
+
+
+def timed_query(store, **kwargs):
+    start = time.perf_counter()
+    body = json.dumps(store.query(**kwargs))
+    return len(body), (time.perf_counter() - start) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--switches', type=int, default=50)
+    parser.add_argument('--hours', type=int, default=4)
+    args = parser.parse_args()
+
+    now = [0.0]
+    tracemalloc.start()
+    store = metrics_store.MetricsStore(3600, clock=lambda: now[0])
+    series = args.switches * len(METRICS)
+    print(f"{series} series, 1 sample/s, 3600 samples per series")
+    print(f"{'uptime h':>8} {'samples':>10} {'store MiB':>10} {'traced MiB':>11}")
+    done = 0
+    for hour in range(1, args.hours + 1):
+        fill(store, args.switches, done, 3600, now)
+        done += 3600
+        print(f"{hour:>8} {store.seq:>10} {store.nbytes() / 2 ** 20:>10.2f} "
+              f"{tracemalloc.get_traced_memory()[0] / 2 ** 20:>11.2f}")
+    tracemalloc.stop()
+
+    cursor = store.seq
+    fill(store, args.switches, done, 1, now)
+    print(f"{'query':>26} {'JSON KiB':>9} {'ms':>7}")
+    for name, kwargs in (('full history', {}), ('history, step=10', {'step': 10}),
+                         ('incremental, 1 s', {'since': cursor})):
+        size, ms = timed_query(store, **kwargs)
+        print(f"{name:>26} {size / 1024:>9.1f} {ms:>7.1f}")
+
+    wsgi = WSGIApplication()
+    app = enhanced_traffic_controller.EnhancedTrafficController(wsgi=wsgi)
+    dp = FakeDatapath(1)
+    parser_ = dp.ofproto_parser
+    app.request_stats(dp)
+    for xid, name in list(app.class_stats_pending[dp.id].items()):
+        reply = parser_.OFPAggregateStatsReply(dp, body=parser_.OFPAggregateStats(
+            packet_count=100, byte_count=10000, flow_count=1), flags=0)
+        reply.xid = xid
+        app.aggregate_stats_reply_handler(SimpleNamespace(msg=reply))
+    first = Request.blank('/metrics?since=0').get_response(wsgi)
+    assert first.status_int == 200, first.status
+    data = json.loads(first.body)
+    assert data['series']['load']['1']['v'] == [600.0], data
+    assert sorted(data['series']['queue_packets']) == ['1/1', '1/2', '1/3'], data
+    again = json.loads(Request.blank('/metrics?since=%d' % data['cursor']).get_response(wsgi).body)
+    assert again['series'] == {} and again['cursor'] == data['cursor']
+    bad = Request.blank('/metrics?since=x').get_response(wsgi)
+    assert bad.status_int == 400
+    print(f"/metrics through WSGI: {sorted(data['series'])}, cursor {data['cursor']}, "
+          f"empty delta when polled again")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Simulate controller rebalancing: legacy one-move-per-round vs. the planner.
+
+Thousands of switches are spread over N controllers with lognormal loads that
+random-walk each 10 s round. At round 5 the switches of controller 0 get a
+4x load spike. Both algorithms see the same trace; the report shows how many
+rounds it takes until no controller exceeds 1.5x the mean, the number of
+moves, and moves made after convergence (flapping).
+
+Usage: python benchmarks/migration_sim.py [--switches N] [--controllers N] [--rounds N]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+import migration_planner  # noqa: E402
+
+COOLDOWN_ROUNDS = 6  # 60 s at the 10 s monitor period
+HYSTERESIS = 0.1
+
+
+def make_trace(switches, rounds, seed):
+    rnd = random.Random(seed)
+    loads = [rnd.lognormvariate(3, 1) for _ in range(switches)]
+    trace = []
+    for r in range(rounds):
+        loads = [l * rnd.uniform(0.95, 1.05) for l in loads]
+        trace.append(list(loads))
+    return trace
+
+
+def controller_loads(loads, assignment, controllers):
+    totals = dict((c, 0.0) for c in controllers)
+    for sw, ctrl in assignment.items():
+        totals[ctrl] += loads[sw]
+    return totals
+
+
+def legacy_round(loads, assignment, priority, controllers, state):
+    totals = controller_loads(loads, assignment, controllers)
+    threshold = 1.5 * sum(totals.values()) / len(totals)
+    moves = 0
+    for ctrl, load in list(totals.items()):
+        if load <= threshold:
+            continue
+        others = sorted((l, c) for c, l in totals.items() if c != ctrl)
+        target = others[0][1]
+        for sw, owner in assignment.items():
+            if owner == ctrl and priority[sw] == 'LOW':
+                assignment[sw] = target
+                moves += 1
+                break
+    return moves
+
+
+def planner_round(loads, assignment, priority, controllers, state):
+    totals = controller_loads(loads, assignment, controllers)
+    threshold = 1.5 * sum(totals.values()) / len(totals)
+    peak = max(totals.values())
+    if peak > threshold:
+        state['rebalancing'] = True
+    elif peak < threshold * (1 - HYSTERESIS):
+        state['rebalancing'] = False
+    if not state['rebalancing']:
+        return 0
+    now = state['round']
+    last = state['last_moved']
+    movable = set(sw for sw in assignment
+                  if priority[sw] == 'LOW' and now - last.get(sw, -COOLDOWN_ROUNDS) >= COOLDOWN_ROUNDS)
+    switch_loads = dict(enumerate(loads))
+    moves = migration_planner.plan_migrations(switch_loads, assignment,
+                                              dict((c, 1.0) for c in controllers), movable,
+                                              max_moves=16, target=threshold * (1 - HYSTERESIS))
+    for sw, _, dst in moves:
+        assignment[sw] = dst
+        last[sw] = now
+    return len(moves)
+
+
+def simulate(algorithm, trace, controllers, seed):
+    rnd = random.Random(seed)
+    switches = len(trace[0])
+    assignment = dict((sw, sw % controllers) for sw in range(switches))
+    priority = dict((sw, rnd.choices(['LOW', 'MEDIUM', 'HIGH'], [7, 2, 1])[0])
+                    for sw in range(switches))
+    state = {'rebalancing': False, 'last_moved': {}, 'round': 0}
+    hot = set(sw for sw in range(switches) if sw % controllers == 0)
+    total_moves = 0
+    moves_by_round = []
+    converged_at = None
+    for r, loads in enumerate(trace):
+        if r >= 5:
+            loads = [l * 4 if sw in hot else l for sw, l in enumerate(loads)]
+        state['round'] = r
+        moves = algorithm(loads, assignment, priority, range(controllers), state)
+        total_moves += moves
+        moves_by_round.append(moves)
+        totals = controller_loads(loads, assignment, range(controllers))
+        ok = max(totals.values()) <= 1.5 * sum(totals.values()) / controllers
+        if r >= 5:
+            if ok and converged_at is None:
+                converged_at = r
+            elif not ok:
+                converged_at = None
+    peak_ratio = max(totals.values()) / (sum(totals.values()) / controllers)
+    after = sum(moves_by_round[converged_at + 1:]) if converged_at is not None else None
+    return converged_at, total_moves, after, peak_ratio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--switches', type=int, default=2000)
+    parser.add_argument('--controllers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    trace = make_trace(args.switches, args.rounds, args.seed)
+    print(f"{args.switches} switches, {args.controllers} controllers, {args.rounds} rounds of 10 s")
+    print(f"{'algorithm':>9} {'converged':>10} {'moves':>6} {'moves after':>12} {'peak/mean':>10}")
+    for name, algorithm in (('legacy', legacy_round), ('planner', planner_round)):
+        converged_at, moves, after, ratio = simulate(algorithm, trace, args.controllers, args.seed)
+        when = f"{(converged_at - 5) * 10}s" if converged_at is not None else 'never'
+        after = '-' if after is None else after
+        print(f"{name:>9} {when:>10} {moves:>6} {after!s:>12} {ratio:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
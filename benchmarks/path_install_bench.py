@@ -0,0 +1,193 @@
+"""Packet-ins and first-packet latency of a new flow across several switches.
+
+Every switch is a FakeDatapath with a SwitchModel pipeline, all connected
+to one EnhancedTrafficController whose Topology is filled with the links
+(as --observe-links would do). First, every host broadcasts once so that
+each switch and the host table know where it is. Then the first packet of
+each flow is walked hop by hop: on a table miss it goes to the app as a
+packet-in and leaves through the PacketOut's port, and if that port is FLOOD
+it goes out of every other port. Latency adds LINK per hop, plus RTT and the
+measured handler time per packet-in. Per-switch MAC learning
+(PATH_INSTALL off) is compared with whole-path installation. Two topologies
+are used: the demo's linear s1-s2-s3 and a generated tree.
+
+Usage: python benchmarks/path_install_bench.py [--depth 3] [--fanout 3] [--rtt 1.0]
+"""
+import argparse
+import itertools
+import time
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath, SwitchModel, packet_in_event
+from proactive_bench import build, host_mac, host_ip
+
+from ryu.lib.packet import packet, ethernet, arp
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+import enhanced_traffic_controller
+
+LINK = 0.05e-3
+
+
+def linear(switches, hosts_per_switch):
+    links = [(i, i + 1) for i in range(1, switches)]
+    edges = list(range(1, switches + 1))
+    return links, edges, hosts_per_switch
+
+
+def tree(depth, fanout, hosts_per_switch):
+    links = []
+    level = [1]
+    next_id = 2
+    for _ in range(depth - 1):
+        children = []
+        for parent in level:
+            for _ in range(fanout):
+                links.append((parent, next_id))
+                children.append(next_id)
+                next_id += 1
+        level = children
+    return links, level, hosts_per_switch
+
+
+class Network(object):
+    def __init__(self, links, edges, hosts_per_switch, path_install):
+        self.app = enhanced_traffic_controller.EnhancedTrafficController()
+        self.app.PATH_INSTALL = path_install
+        self.dps = {}
+        self.models = {}
+        self.ports = {}      # (dpid, port) -> ('switch', dpid, port) or ('host', index)
+        self.hosts = {}      # host index -> (dpid, port)
+        next_port = {}
+
+        def port_of(dpid):
+            if dpid not in self.dps:
+                dp = self.dps[dpid] = FakeDatapath(dpid)
+                self.models[dpid] = SwitchModel(dp)
+                self.app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+                self.app.writer_for(dp).flush()
+                self.app.datapaths[dpid] = dp
+            next_port[dpid] = next_port.get(dpid, 0) + 1
+            return next_port[dpid]
+
+        for a, b in links:
+            pa, pb = port_of(a), port_of(b)
+            self.ports[(a, pa)] = ('switch', b, pb)
+            self.ports[(b, pb)] = ('switch', a, pa)
+            self.app.topology.add_link(a, pa, b, pb)
+        for dpid in edges:
+            for _ in range(hosts_per_switch):
+                h = len(self.hosts)
+                port = port_of(dpid)
+                self.hosts[h] = (dpid, port)
+                self.ports[(dpid, port)] = ('host', h)
+        self.packet_ins = 0
+
+    def switch_ports(self, dpid):
+        return [port for (sw, port) in self.ports if sw == dpid]
+
+    def forward(self, dpid, in_port, data, fields, t, dst, seen):
+        """Return the time the packet reaches host `dst`, or None."""
+        fields = dict(fields, in_port=in_port)
+        model = self.models[dpid]
+        table_id, to_controller = model.process(fields)
+        if to_controller:
+            dp = self.dps[dpid]
+            mark = len(dp.sent)
+            start = time.perf_counter()
+            self.app.packet_in_handler(packet_in_event(dp, data, in_port, table_id))
+            elapsed = time.perf_counter() - start
+            self.packet_ins += 1
+            t += self.rtt + elapsed
+            outs = [m for m in dp.sent[mark:] if isinstance(m, dp.ofproto_parser.OFPPacketOut)]
+            actions = outs[-1].actions if outs else []
+        else:
+            actions = [a for inst in model.lookup(table_id, fields)
+                       for a in getattr(inst, 'actions', ())]
+        out_ports = []
+        for action in actions:
+            if isinstance(action, ofproto_v1_3_parser.OFPActionOutput):
+                if action.port == ofproto_v1_3.OFPP_FLOOD:
+                    out_ports.extend(p for p in self.switch_ports(dpid) if p != in_port)
+                else:
+                    out_ports.append(action.port)
+        arrival = None
+        for port in out_ports:
+            peer = self.ports[(dpid, port)]
+            if peer[0] == 'host':
+                if peer[1] == dst:
+                    arrival = t + LINK if arrival is None else min(arrival, t + LINK)
+                continue
+            if (peer[1], peer[2]) in seen:
+                continue
+            seen.add((peer[1], peer[2]))
+            got = self.forward(peer[1], peer[2], data, fields, t + LINK, dst, seen)
+            if got is not None:
+                arrival = got if arrival is None else min(arrival, got)
+        return arrival
+
+    def send(self, src, dst, data, fields):
+        dpid, port = self.hosts[src]
+        return self.forward(dpid, port, data, fields, LINK, dst, {(dpid, port)})
+
+
+def announce(h):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet('ff:ff:ff:ff:ff:ff', host_mac(h), 0x0806))
+    pkt.add_protocol(arp.arp_ip(arp.ARP_REQUEST, host_mac(h), host_ip(h),
+                                '00:00:00:00:00:00', host_ip(h)))
+    pkt.serialize()
+    fields = {'eth_src': host_mac(h), 'eth_dst': 'ff:ff:ff:ff:ff:ff', 'eth_type': 0x0806}
+    return bytes(pkt.data), fields
+
+
+def run(spec, path_install, rtt):
+    net = Network(*spec, path_install=path_install)
+    net.rtt = rtt
+    for h in net.hosts:
+        data, fields = announce(h)
+        net.send(h, None, data, fields)
+    pairs = [(a, b) for a, b in itertools.permutations(net.hosts, 2)
+             if net.hosts[a][0] != net.hosts[b][0]]
+    net.packet_ins = 0
+    latencies = []
+    repeats = 0
+    for a, b in pairs:
+        data, fields = build(a, b, 6, 5001)
+        arrival = net.send(a, b, data, fields)
+        assert arrival is not None, (a, b)
+        latencies.append(arrival)
+    first_packet_ins = net.packet_ins
+    for a, b in pairs:
+        before = net.packet_ins
+        data, fields = build(a, b, 6, 5001)
+        net.send(a, b, data, fields)
+        repeats += net.packet_ins - before
+    latencies.sort()
+    return (len(pairs), first_packet_ins / len(pairs), latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)], repeats)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--hosts-per-switch', type=int, default=2)
+    parser.add_argument('--rtt', type=float, default=1.0, help='controller round trip in ms')
+    args = parser.parse_args()
+
+    topologies = (('linear s1-s2-s3', linear(3, 1)),
+                  (f"tree depth {args.depth} fanout {args.fanout}",
+                   tree(args.depth, args.fanout, args.hosts_per_switch)))
+    for name, spec in topologies:
+        print(f"{name}: {len(set(sum(spec[0], ())))} switches")
+        print(f"  {'mode':>14} {'flows':>6} {'packet-in/flow':>15} {'p50 ms':>8} "
+              f"{'p99 ms':>8} {'2nd pkt packet-ins':>19}")
+        for mode, path_install in (('per-switch', False), ('path install', True)):
+            flows, per_flow, p50, p99, repeats = run(spec, path_install, args.rtt / 1e3)
+            print(f"  {mode:>14} {flows:>6} {per_flow:>15.2f} {p50 * 1e3:>8.2f} "
+                  f"{p99 * 1e3:>8.2f} {repeats:>19}")
+
+
+if __name__ == '__main__':
+    main()
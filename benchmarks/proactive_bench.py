@@ -0,0 +1,82 @@
+"""Count packet-ins for reactive vs. proactive mode on the same replayed workload.
+
+Usage: python benchmarks/proactive_bench.py [--hosts N] [--flows N] [--packets N]
+"""
+import argparse
+import random
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath, SwitchModel, packet_in_event
+
+from ryu.lib.packet import packet, ethernet, ipv4, tcp, udp
+
+import enhanced_traffic_controller
+
+
+def host_mac(i):
+    return '00:00:00:00:%02x:%02x' % (i >> 8, i & 0xff)
+
+
+def host_ip(i):
+    return '10.0.%d.%d' % (i >> 8, i & 0xff)
+
+
+def build(src, dst, proto, dst_port):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(host_mac(dst), host_mac(src), 0x0800))
+    pkt.add_protocol(ipv4.ipv4(src=host_ip(src), dst=host_ip(dst), proto=proto))
+    if proto == 6:
+        pkt.add_protocol(tcp.tcp(src_port=40000, dst_port=dst_port))
+    else:
+        pkt.add_protocol(udp.udp(src_port=40000, dst_port=dst_port))
+    pkt.serialize()
+    fields = {'in_port': src + 1, 'eth_src': host_mac(src), 'eth_dst': host_mac(dst),
+              'eth_type': 0x0800, 'ip_proto': proto, 'ipv4_src': host_ip(src),
+              'ipv4_dst': host_ip(dst), 'ip_dscp': 0,
+              'tcp_dst' if proto == 6 else 'udp_dst': dst_port}
+    return bytes(pkt.data), fields
+
+
+def workload(hosts, flows, packets, seed=3):
+    rnd = random.Random(seed)
+    trace = []
+    for _ in range(flows):
+        a, b = rnd.sample(range(hosts), 2)
+        proto, port = rnd.choice([(6, 80), (6, 443), (6, 1883), (17, 53), (17, 5683), (6, 22)])
+        for i in range(packets):
+            # Alternate request/response so both directions are exercised.
+            trace.append(build(a, b, proto, port) if i % 2 == 0 else build(b, a, proto, 40000))
+    return trace
+
+
+def replay(proactive, trace):
+    app = enhanced_traffic_controller.EnhancedTrafficController()
+    app.PROACTIVE = proactive
+    dp = FakeDatapath(1)
+    model = SwitchModel(dp)
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    app.writer_for(dp).flush()
+    for data, fields in trace:
+        table_id, to_controller = model.process(fields)
+        if to_controller:
+            app.packet_in_handler(packet_in_event(dp, data, fields['in_port'], table_id))
+    flow_mods = len(dp.sent_of(dp.ofproto_parser.OFPFlowMod))
+    return model.packet_ins, flow_mods
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hosts', type=int, default=50)
+    parser.add_argument('--flows', type=int, default=500)
+    parser.add_argument('--packets', type=int, default=10)
+    args = parser.parse_args()
+
+    trace = workload(args.hosts, args.flows, args.packets)
+    print(f"{len(trace)} packets, {args.flows} flows between {args.hosts} hosts")
+    for name, proactive in (('reactive', False), ('proactive', True)):
+        packet_ins, flow_mods = replay(proactive, trace)
+        print(f"{name:>10}: {packet_ins:6d} packet-ins, {flow_mods:6d} FlowMods")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Show that RuleTable lookup cost stays flat as the rule count grows.
+
+Usage: python benchmarks/qos_rules_bench.py [--lookups N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+import qos_rules  # noqa: E402
+from fast_parser import Headers  # noqa: E402
+
+CLASSES = {
+    'HIGH': {'priority': 30, 'queue': 1, 'weight': 3},
+    'MEDIUM': {'priority': 20, 'queue': 2, 'weight': 2},
+    'LOW': {'priority': 10, 'queue': 3, 'weight': 1},
+}
+
+
+def generate_rules(count, rnd):
+    names = list(CLASSES)
+    rules = []
+    for i in range(count):
+        kind = i % 4
+        name = rnd.choice(names)
+        proto = rnd.choice(['tcp', 'udp'])
+        if kind == 0:
+            rules.append({'proto': proto, 'dst_port': rnd.randrange(1, 65535), 'class': name})
+        elif kind == 1:
+            lo = rnd.randrange(1024, 60000)
+            rules.append({'proto': proto, 'dst_port': '%d-%d' % (lo, lo + rnd.randrange(1, 200)),
+                          'class': name})
+        elif kind == 2:
+            rules.append({'dst': '10.%d.%d.0/24' % (rnd.randrange(256), rnd.randrange(256)),
+                          'class': name})
+        else:
+            rules.append({'src': '172.16.%d.0/24' % rnd.randrange(256), 'class': name})
+    rules.append({'proto': 'tcp', 'class': 'MEDIUM'})
+    return rules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lookups', type=int, default=200000)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    packets = [Headers('00:00:00:00:00:01', '00:00:00:00:00:02', 0x0800,
+                       rnd.choice([6, 17, 1]), rnd.getrandbits(32), rnd.getrandbits(32),
+                       rnd.randrange(64), 40000, rnd.randrange(65536))
+               for _ in range(args.lookups)]
+
+    print(f"{'rules':>8} {'compile ms':>11} {'ns/lookup':>10}")
+    for count in (10, 100, 1000, 5000, 20000):
+        config = {'classes': CLASSES, 'default': 'LOW', 'rules': generate_rules(count, rnd)}
+        start = time.perf_counter()
+        table = qos_rules.RuleTable(config)
+        compile_ms = (time.perf_counter() - start) * 1e3
+        classify = table.classify
+        start = time.perf_counter()
+        for headers in packets:
+            classify(headers)
+        ns = (time.perf_counter() - start) / len(packets) * 1e9
+        print(f"{count:>8} {compile_ms:>11.1f} {ns:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,538 @@
+"""Offline packet-in replay through the controllers, with JSON results.
+
+Each controller module is loaded by a Ryu AppManager the way ryu-manager
+loads it, contexts included, and its registered handlers get the events of
+one FakeDatapath. A ReplaySwitch applies the FlowMods it captures and
+raises a packet-in only for packets that miss. It also expires idle entries
+on the trace's clock, sending FlowRemoved, and answers stats requests from
+its per-entry counters. Traffic comes from pcap files or from a synthetic
+generator. The generator is set by the number of hosts (MACs), the protocol
+mix and the share of flows replaced every round (churn).
+
+For every controller and scenario the report gives:
+  - packet-ins/s, counted over the time spent in the controller's handlers;
+  - FlowMods per flow, where a flow is one direction of traffic seen for
+    the first time or after FLOW_IDLE seconds of silence;
+  - memory growth, measured on a second run with tracemalloc and counting
+    only what stays allocated outside the benchmark's own files;
+  - the time to process the replies to one round of stats requests.
+Everything goes to a JSON file. --compare prints the change against an
+earlier file, e.g. one written at another commit.
+
+Admission control is off. Its token buckets run on wall-clock time and
+would shed LOW packet-ins that a replay delivers faster than real time.
+Warm restart is off too, so no snapshot is read or written.
+
+Usage: python benchmarks/replay.py [--hosts 64 1024] [--mix iot web mixed]
+           [--churn 0.2] [--pcap trace.pcap ...] [--out replay.json]
+           [--compare baseline.json]
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from fake_datapath import FakeDatapath, field_matches, packet_in_event
+from proactive_bench import build
+
+from ryu.base import app_manager
+from ryu.controller import ofp_event
+from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.lib import pcaplib
+from ryu.lib.packet import ethernet, ipv4, packet, tcp, udp
+from ryu.ofproto import ofproto_v1_3 as ofproto
+from ryu.ofproto import ofproto_v1_3_parser as parser
+
+import enhanced_traffic_controller
+
+CONTROLLERS = ('enhanced_traffic_controller', 'decision_controller')
+MIXES = {  # (ip_proto, dst_port, weight)
+    'iot': ((6, 1883, 5), (17, 5683, 4), (6, 502, 1)),
+    'web': ((6, 80, 4), (6, 443, 5), (17, 53, 1)),
+    'mixed': ((6, 80, 1), (6, 443, 1), (6, 1883, 1), (17, 53, 1), (17, 5683, 1), (6, 22, 1)),
+}
+FLOW_IDLE = enhanced_traffic_controller.EnhancedTrafficController.FLOW_IDLE_TIMEOUT
+ROUND_SECONDS = 20  # under FLOW_IDLE, so flows that carry on into the next round stay installed
+REPLY_ENTRIES = 500  # flow stats per multipart reply
+REPLAY_SETTINGS = {'ADMISSION': False, 'WARM_RESTART': False}  # see the module docstring
+COMPARED = ('packet_ins_per_sec', 'flow_mods_per_flow', 'memory_growth_kib', 'stats_reply_ms')
+
+
+class Entry(object):
+    __slots__ = ('table_id', 'priority', 'fields', 'cookie', 'idle_timeout', 'hard_timeout',
+                 'flags', 'instructions', 'installed', 'last_hit', 'packets', 'bytes')
+
+    def __init__(self, msg, fields, now):
+        self.table_id = msg.table_id
+        self.priority = msg.priority
+        self.fields = fields
+        self.cookie = msg.cookie
+        self.idle_timeout = msg.idle_timeout
+        self.hard_timeout = msg.hard_timeout
+        self.flags = msg.flags
+        self.instructions = msg.instructions
+        self.installed = now
+        self.last_hit = now
+        self.packets = 0
+        self.bytes = 0
+
+    def expired(self, now):
+        return ((self.idle_timeout and now - self.last_hit >= self.idle_timeout) or
+                (self.hard_timeout and now - self.installed >= self.hard_timeout))
+
+
+class ReplaySwitch(object):
+    """OpenFlow 1.3 tables with counters, timeouts and stats replies.
+
+    Exact matches are found through a hash per set of match fields, so a
+    lookup does not scan the table. Masked matches are checked one by one.
+    """
+
+    def __init__(self, datapath):
+        self.datapath = datapath
+        self.tables = {}  # table_id -> {field names: {values: [entries, highest priority first]}}
+        self.masked = {}  # table_id -> entries with a masked field
+        self.now = 0.0
+        self.messages = collections.Counter()  # every message the controller sent, by type
+        self.stats_requests = []
+        datapath.listeners.append(self.on_message)
+
+    def entries(self):
+        for index in self.tables.values():
+            for by_values in index.values():
+                for entries in by_values.values():
+                    for entry in entries:
+                        yield entry
+        for entries in self.masked.values():
+            for entry in entries:
+                yield entry
+
+    def on_message(self, msg):
+        self.messages[msg.__class__.__name__] += 1
+        if isinstance(msg, (parser.OFPAggregateStatsRequest, parser.OFPFlowStatsRequest)):
+            self.stats_requests.append(msg)
+        elif isinstance(msg, parser.OFPFlowMod):
+            self.flow_mod(msg)
+
+    def flow_mod(self, msg):
+        fields = dict(msg.match.items())
+        if msg.command in (ofproto.OFPFC_DELETE, ofproto.OFPFC_DELETE_STRICT):
+            for entry in list(self.entries()):
+                if (msg.table_id in (ofproto.OFPTT_ALL, entry.table_id) and
+                        all(entry.fields.get(k) == v for k, v in fields.items()) and
+                        (msg.command == ofproto.OFPFC_DELETE or
+                         (entry.priority == msg.priority and entry.fields == fields))):
+                    self.remove(entry)
+            return
+        old = self.find(msg.table_id, msg.priority, fields)
+        # OpenFlow 1.3 MODIFY leaves the cookie alone.
+        if old is not None and msg.command in (ofproto.OFPFC_MODIFY, ofproto.OFPFC_MODIFY_STRICT):
+            old.instructions = msg.instructions
+            return
+        entry = Entry(msg, fields, self.now)
+        if old is not None:
+            self.remove(old)
+            # A replaced entry's counters carry over, as in Open vSwitch.
+            if not msg.flags & ofproto.OFPFF_RESET_COUNTS:
+                entry.packets, entry.bytes = old.packets, old.bytes
+        if any(isinstance(v, tuple) for v in fields.values()):
+            self.masked.setdefault(msg.table_id, []).append(entry)
+            return
+        names = tuple(sorted(fields))
+        by_values = self.tables.setdefault(msg.table_id, {}).setdefault(names, {})
+        entries = by_values.setdefault(tuple(fields[n] for n in names), [])
+        entries.append(entry)
+        entries.sort(key=lambda e: -e.priority)
+
+    def find(self, table_id, priority, fields):
+        names = tuple(sorted(fields))
+        entries = self.tables.get(table_id, {}).get(names, {}).get(
+            tuple(fields[n] for n in names), ())
+        for entry in list(entries) + self.masked.get(table_id, []):
+            if entry.priority == priority and entry.fields == fields:
+                return entry
+        return None
+
+    def remove(self, entry):
+        if entry in self.masked.get(entry.table_id, ()):
+            self.masked[entry.table_id].remove(entry)
+            return
+        names = tuple(sorted(entry.fields))
+        by_values = self.tables[entry.table_id][names]
+        values = tuple(entry.fields[n] for n in names)
+        by_values[values].remove(entry)
+        if not by_values[values]:
+            del by_values[values]
+
+    def lookup(self, table_id, pkt):
+        best = None
+        for names, by_values in self.tables.get(table_id, {}).items():
+            entries = by_values.get(tuple(pkt.get(n) for n in names))
+            if entries and (best is None or entries[0].priority > best.priority):
+                best = entries[0]
+        for entry in self.masked.get(table_id, ()):
+            if ((best is None or entry.priority > best.priority) and
+                    all(field_matches(pkt.get(k), v) for k, v in entry.fields.items())):
+                best = entry
+        return best
+
+    def process(self, pkt, size):
+        """Return (table_id, True) if the packet would go to the controller."""
+        table_id = 0
+        while True:
+            entry = self.lookup(table_id, pkt)
+            if entry is None:
+                return table_id, True
+            entry.last_hit = self.now
+            entry.packets += 1
+            entry.bytes += size
+            next_table = None
+            for inst in entry.instructions:
+                if isinstance(inst, parser.OFPInstructionGotoTable):
+                    next_table = inst.table_id
+                for action in getattr(inst, 'actions', ()):
+                    if (isinstance(action, parser.OFPActionOutput) and
+                            action.port == ofproto.OFPP_CONTROLLER):
+                        return table_id, True
+            if next_table is None:
+                return table_id, False
+            table_id = next_table
+
+    def expire(self):
+        """Remove timed-out entries; returns the FlowRemoved messages they asked for."""
+        removed = []
+        for entry in [e for e in self.entries() if e.expired(self.now)]:
+            self.remove(entry)
+            if not entry.flags & ofproto.OFPFF_SEND_FLOW_REM:
+                continue
+            reason = (ofproto.OFPRR_IDLE_TIMEOUT if entry.idle_timeout and
+                      self.now - entry.last_hit >= entry.idle_timeout
+                      else ofproto.OFPRR_HARD_TIMEOUT)
+            removed.append(parser.OFPFlowRemoved(
+                self.datapath, entry.cookie, entry.priority, reason, entry.table_id,
+                int(self.now - entry.installed), 0, entry.idle_timeout, entry.hard_timeout,
+                entry.packets, entry.bytes, parser.OFPMatch(**entry.fields)))
+        return removed
+
+    def selected(self, req):
+        for entry in self.entries():
+            if (req.table_id in (ofproto.OFPTT_ALL, entry.table_id) and
+                    entry.cookie & req.cookie_mask == req.cookie & req.cookie_mask):
+                yield entry
+
+    def answer(self, req):
+        """The replies the switch sends to a stats request."""
+        dp = self.datapath
+        entries = list(self.selected(req))
+        if isinstance(req, parser.OFPAggregateStatsRequest):
+            reply = parser.OFPAggregateStatsReply(dp, body=parser.OFPAggregateStats(
+                packet_count=sum(e.packets for e in entries),
+                byte_count=sum(e.bytes for e in entries), flow_count=len(entries)), flags=0)
+            reply.xid = req.xid
+            return [reply]
+        replies = []
+        for start in range(0, max(len(entries), 1), REPLY_ENTRIES):
+            body = [parser.OFPFlowStats(
+                table_id=e.table_id, duration_sec=int(self.now - e.installed), duration_nsec=0,
+                priority=e.priority, idle_timeout=e.idle_timeout, hard_timeout=e.hard_timeout,
+                flags=e.flags, cookie=e.cookie, packet_count=e.packets, byte_count=e.bytes,
+                match=parser.OFPMatch(**e.fields), instructions=e.instructions)
+                for e in entries[start:start + REPLY_ENTRIES]]
+            more = start + REPLY_ENTRIES < len(entries)
+            reply = parser.OFPFlowStatsReply(dp, body=body,
+                                             flags=ofproto.OFPMPF_REPLY_MORE if more else 0)
+            reply.xid = req.xid
+            replies.append(reply)
+        return replies
+
+
+def synthetic(hosts, flows, rounds, packets, churn, mix, seed=11):
+    """(time, data, fields) of `rounds` rounds of `flows` flows each.
+
+    Every round keeps a (1 - churn) share of the previous round's flows and
+    starts new ones between random hosts for the rest. Each flow sends
+    `packets` packets per round, alternating request and response.
+    """
+    rnd = random.Random(seed)
+    kinds = MIXES[mix]
+    weights = [w for _, _, w in kinds]
+    built = {}
+
+    def frame(src, dst, proto, port):
+        key = (src, dst, proto, port)
+        if key not in built:
+            built[key] = build(src, dst, proto, port)
+        return built[key]
+
+    active = []
+    trace = []
+    for r in range(rounds):
+        active = rnd.sample(active, int(len(active) * (1 - churn)))
+        while len(active) < flows:
+            a, b = rnd.sample(range(hosts), 2)
+            proto, port, _ = rnd.choices(kinds, weights)[0]
+            active.append((a, b, proto, port))
+        rnd.shuffle(active)  # new flows start throughout the round, not at its end
+        count = len(active) * packets
+        for i in range(packets):
+            for j, (a, b, proto, port) in enumerate(active):
+                t = r * ROUND_SECONDS + ROUND_SECONDS * (i * len(active) + j) / count
+                data, fields = (frame(a, b, proto, port) if i % 2 == 0
+                                else frame(b, a, proto, 40000))
+                trace.append((t, data, fields))
+    return trace
+
+
+def pcap_trace(path):
+    """(time, data, fields) of the Ethernet frames in a pcap file.
+
+    Every source MAC is given its own switch port in order of appearance.
+    """
+    ports = {}
+    trace = []
+    start = None
+    with open(path, 'rb') as f:
+        for ts, buf in pcaplib.Reader(f):
+            pkt = packet.Packet(buf)
+            eth = pkt.get_protocol(ethernet.ethernet)
+            if eth is None:
+                continue
+            if start is None:
+                start = ts
+            fields = {'in_port': ports.setdefault(eth.src, len(ports) + 1),
+                      'eth_src': eth.src, 'eth_dst': eth.dst, 'eth_type': eth.ethertype}
+            ip = pkt.get_protocol(ipv4.ipv4)
+            if ip is not None:
+                fields.update(ip_proto=ip.proto, ipv4_src=ip.src, ipv4_dst=ip.dst,
+                              ip_dscp=ip.tos >> 2)
+                for proto, prefix in ((tcp.tcp, 'tcp'), (udp.udp, 'udp')):
+                    l4 = pkt.get_protocol(proto)
+                    if l4 is not None:
+                        fields[prefix + '_src'] = l4.src_port
+                        fields[prefix + '_dst'] = l4.dst_port
+            trace.append((ts - start, bytes(buf), fields))
+    return trace
+
+
+def flow_of(fields):
+    return (fields['eth_src'], fields['eth_dst'], fields.get('ip_proto'),
+            fields.get('tcp_src', fields.get('udp_src')),
+            fields.get('tcp_dst', fields.get('udp_dst')))
+
+
+def load(name, **settings):
+    """Instantiate controller module `name` with its contexts, as ryu-manager would.
+
+    `settings` override class attributes; they are set on a subclass, so
+    __init__ sees them too.
+    """
+    manager = app_manager.AppManager()
+    manager.load_apps([name])
+    contexts = manager.create_contexts()
+    cls = manager.applications_cls[name]
+    if settings:
+        cls = type(cls.__name__, (cls,), settings)
+    app = manager.instantiate(cls, **contexts)
+    return manager, app
+
+
+def deliver(app, ev, state=MAIN_DISPATCHER):
+    for handler in app.get_handlers(ev, state):
+        handler(ev)
+
+
+def connect(app, dp):
+    """The events of a switch handshake, in the states ofp_handler sends them."""
+    for state in (CONFIG_DISPATCHER, None, MAIN_DISPATCHER):
+        if state is None:
+            features = parser.OFPSwitchFeatures(dp, datapath_id=dp.id, n_buffers=0,
+                                                n_tables=254, auxiliary_id=0, capabilities=0)
+            deliver(app, ofp_event.EventOFPSwitchFeatures(features), CONFIG_DISPATCHER)
+            continue
+        ev = ofp_event.EventOFPStateChange(dp)
+        ev.state = state
+        deliver(app, ev, state)
+    for writer in getattr(app, 'writers', {}).values():
+        writer.flush()
+
+
+def replay(name, trace):
+    """Play `trace` to controller `name`; returns (results, app busy seconds)."""
+    manager, app = load(name, **REPLAY_SETTINGS)
+    try:
+        dp = FakeDatapath(1)
+        switch = ReplaySwitch(dp)
+        connect(app, dp)
+        setup_mods = switch.messages['OFPFlowMod']
+        busy = 0.0
+        packet_ins = 0
+        flows = 0
+        last_seen = {}
+        next_expiry = 0.0
+        clock = time.perf_counter
+        for t, data, fields in trace:
+            switch.now = t
+            if t >= next_expiry:
+                for msg in switch.expire():
+                    start = clock()
+                    deliver(app, ofp_event.EventOFPFlowRemoved(msg))
+                    busy += clock() - start
+                next_expiry = t + 1.0
+            key = flow_of(fields)
+            if t - last_seen.get(key, -FLOW_IDLE) >= FLOW_IDLE:
+                flows += 1
+            last_seen[key] = t
+            table_id, to_controller = switch.process(fields, len(data))
+            if to_controller:
+                ev = packet_in_event(dp, data, fields['in_port'], table_id)
+                start = clock()
+                deliver(app, ev)
+                busy += clock() - start
+                packet_ins += 1
+            # The switch listener has counted them; don't keep every message alive.
+            del dp.sent[:]
+
+        del switch.stats_requests[:]
+        app.request_stats(dp)
+        replies = [r for req in switch.stats_requests for r in switch.answer(req)]
+        start = clock()
+        for reply in replies:
+            deliver(app, ofp_event.ofp_msg_to_ev(reply))
+        stats_time = clock() - start
+        del dp.sent[:]
+        flow_mods = switch.messages['OFPFlowMod'] - setup_mods
+        return {
+            'packets': len(trace),
+            'flows': flows,
+            'packet_ins': packet_ins,
+            'packet_ins_per_sec': packet_ins / busy if busy else None,
+            'flow_mods': flow_mods,
+            'flow_mods_per_flow': flow_mods / flows if flows else None,
+            'messages': dict(switch.messages),
+            'stats_entries': sum(1 for _ in switch.entries()),
+            'stats_replies': len(replies),
+            'stats_reply_ms': stats_time * 1e3,
+        }
+    finally:
+        manager.close()
+
+
+def memory_growth(name, trace):
+    """KiB still allocated after replaying `trace`, outside the benchmark files."""
+    here = os.path.join(os.path.dirname(os.path.abspath(__file__)), '*')
+    exclude = [tracemalloc.Filter(False, here), tracemalloc.Filter(False, tracemalloc.__file__)]
+    manager, app = load(name, **REPLAY_SETTINGS)
+    try:
+        dp = FakeDatapath(1)
+        switch = ReplaySwitch(dp)
+        connect(app, dp)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot().filter_traces(exclude)
+        next_expiry = 0.0
+        for t, data, fields in trace:
+            switch.now = t
+            if t >= next_expiry:
+                for msg in switch.expire():
+                    deliver(app, ofp_event.EventOFPFlowRemoved(msg))
+                next_expiry = t + 1.0
+            table_id, to_controller = switch.process(fields, len(data))
+            if to_controller:
+                deliver(app, packet_in_event(dp, data, fields['in_port'], table_id))
+            del dp.sent[:]
+        after = tracemalloc.take_snapshot().filter_traces(exclude)
+        tracemalloc.stop()
+        return sum(s.size_diff for s in after.compare_to(before, 'filename')) / 1024.0
+    finally:
+        manager.close()
+
+
+def scenarios(args):
+    for path in args.pcap:
+        yield {'source': 'pcap:' + os.path.basename(path)}, pcap_trace(path)
+    if args.pcap and not args.synthetic:
+        return
+    for hosts in args.hosts:
+        for mix in args.mix:
+            for churn in args.churn:
+                yield ({'source': 'synthetic', 'hosts': hosts, 'mix': mix, 'churn': churn},
+                       synthetic(hosts, args.flows, args.rounds, args.packets, churn, mix))
+
+
+def scenario_key(result):
+    return tuple(result.get(k) for k in ('controller', 'source', 'hosts', 'mix', 'churn'))
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    with open(path) as f:
+        baseline = dict((scenario_key(r), r) for r in json.load(f)['results'])
+    print(f"change against {path}:")
+    for result in results:
+        old = baseline.get(scenario_key(result))
+        if old is None:
+            continue
+        changes = []
+        for metric in COMPARED:
+            a, b = old.get(metric), result.get(metric)
+            if a and b is not None:
+                changes.append(f"{metric} {(b / a - 1) * 100:+.0f}%")
+        label = ' '.join(str(v) for v in scenario_key(result) if v is not None)
+        print(f"  {label}: {', '.join(changes)}")
+
+
+def main():
+    parser_ = argparse.ArgumentParser()
+    parser_.add_argument('--controllers', nargs='+', default=list(CONTROLLERS))
+    parser_.add_argument('--pcap', nargs='*', default=[])
+    parser_.add_argument('--synthetic', action='store_true',
+                         help="run the synthetic scenarios as well as --pcap")
+    parser_.add_argument('--hosts', type=int, nargs='+', default=[64, 1024])
+    parser_.add_argument('--mix', nargs='+', choices=sorted(MIXES), default=['mixed'])
+    parser_.add_argument('--churn', type=float, nargs='+', default=[0.2])
+    parser_.add_argument('--flows', type=int, default=500, help="flows per round")
+    parser_.add_argument('--rounds', type=int, default=5)
+    parser_.add_argument('--packets', type=int, default=4, help="packets per flow and round")
+    parser_.add_argument('--out', default='replay.json')
+    parser_.add_argument('--compare')
+    args = parser_.parse_args()
+
+    results = []
+    print(f"{'controller':>28} {'scenario':>24} {'pkt-ins':>8} {'pkt-in/s':>9} "
+          f"{'mods/flow':>9} {'mem KiB':>8} {'entries':>8} {'stats ms':>8}")
+    for scenario, trace in scenarios(args):
+        for name in args.controllers:
+            result = dict(controller=name, **scenario)
+            result.update(replay(name, trace))
+            result['memory_growth_kib'] = memory_growth(name, trace)
+            results.append(result)
+            label = ' '.join(str(v) for v in scenario.values())
+            rate = result['packet_ins_per_sec']
+            mods = result['flow_mods_per_flow']
+            print(f"{name:>28} {label:>24} {result['packet_ins']:>8} "
+                  f"{rate or 0:>9.0f} {mods or 0:>9.2f} {result['memory_growth_kib']:>8.0f} "
+                  f"{result['stats_entries']:>8} {result['stats_reply_ms']:>8.1f}")
+
+    with open(args.out, 'w') as f:
+        json.dump({'commit': commit(), 'python': platform.python_version(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'args': vars(args),
+                   'results': results}, f, indent=1)
+    print(f"wrote {len(results)} results to {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
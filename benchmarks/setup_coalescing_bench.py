@@ -0,0 +1,58 @@
+"""Replay a packet-in burst per flow and count the FlowMods it produces.
+
+Every packet of a new flow is delivered as a packet-in before the switch has
+the flow installed, like an iperf start-up. With coalescing enabled each flow
+should cost exactly one FlowMod, and every packet still gets a PacketOut.
+
+Usage: python benchmarks/setup_coalescing_bench.py [--flows N] [--burst N]
+"""
+import argparse
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath, packet_in_event
+from proactive_bench import build
+
+import enhanced_traffic_controller
+
+
+def replay(setup_ttl, flows, burst):
+    app = enhanced_traffic_controller.EnhancedTrafficController()
+    app.SETUP_TTL = setup_ttl
+    dp = FakeDatapath(1)
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    for i in range(flows):
+        a, b = 2 * i, 2 * i + 1
+        # The first packet is flooded and teaches the controller where b is,
+        # the second one starts the a -> b flow setup.
+        for src, dst in ((b, a), (a, b)):
+            data, fields = build(src, dst, 6, 5001)
+            app.packet_in_handler(packet_in_event(dp, data, fields['in_port']))
+        data, fields = build(a, b, 6, 5001)
+        for _ in range(burst):
+            app.packet_in_handler(packet_in_event(dp, data, fields['in_port']))
+    parser = dp.ofproto_parser
+    flow_mods = len(dp.sent_of(parser.OFPFlowMod)) - 1  # minus table-miss
+    packet_outs = len(dp.sent_of(parser.OFPPacketOut))
+    return flow_mods, packet_outs, app.suppressed_setups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', type=int, default=100)
+    parser.add_argument('--burst', type=int, default=30)
+    args = parser.parse_args()
+
+    expected_outs = args.flows * (args.burst + 2)
+    for name, ttl in (('no coalescing', 0), ('coalescing', 1.0)):
+        flow_mods, packet_outs, suppressed = replay(ttl, args.flows, args.burst)
+        print(f"{name:>14}: {flow_mods:6d} FlowMods, {packet_outs:6d} PacketOuts, "
+              f"{suppressed:6d} suppressed")
+        assert packet_outs == expected_outs
+    flow_mods, _, suppressed = replay(1.0, args.flows, args.burst)
+    assert flow_mods == args.flows, flow_mods
+    assert suppressed == args.flows * args.burst, suppressed
+    print("OK: one FlowMod per flow, duplicates answered with PacketOut only")
+
+
+if __name__ == '__main__':
+    main()
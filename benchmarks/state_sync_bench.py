@@ -0,0 +1,155 @@
+"""Propagation latency and bandwidth of StateSync between two processes.
+
+A second process runs an echo node. The first one measures:
+
+  ping   one load record there and an echo back, repeated (one-way = RTT / 2)
+  round  a full delta for N switches (every load, 10% of owners and of MACs
+         changed), followed by a ping, so the echo proves every earlier
+         datagram was applied
+
+Both nodes talk over Unix datagram sockets by default, or UDP on localhost
+with --udp. The JSON size of the same records is shown for comparison.
+
+Usage: python benchmarks/state_sync_bench.py [--switches 1000] [--hosts-per-switch 4] [--udp]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+PING = 1 << 62
+PONG = PING + 1
+
+
+def addresses(udp, tmpdir):
+    if udp:
+        return ('127.0.0.1', 17733), ('127.0.0.1', 17734)
+    return os.path.join(tmpdir, 'a.sock'), os.path.join(tmpdir, 'b.sock')
+
+
+def echo_main(bind, peer):
+    from ryu.lib import hub
+    hub.patch()
+    import state_sync
+
+    def on_update(kind, key, record):
+        if kind == 'load' and key == PING:
+            # Report how many records this node has applied so far.
+            sync.set_load(PONG, record[2], sync.applied)
+            sync.flush()
+
+    sync = state_sync.StateSync(2, bind, [peer], full_sync_period=3600, listener=on_update)
+    threads = sync.start()
+    hub.joinall(threads)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--switches', type=int, default=1000)
+    parser.add_argument('--hosts-per-switch', type=int, default=4)
+    parser.add_argument('--pings', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--udp', action='store_true')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    bind_a, bind_b = addresses(args.udp, tmpdir)
+    ctx = multiprocessing.get_context('spawn')
+    echo = ctx.Process(target=echo_main, args=(bind_b, bind_a), daemon=True)
+    echo.start()
+
+    from ryu.lib import hub
+    hub.patch()
+    import state_sync
+
+    pongs = {}
+    pong_event = hub.Event()
+
+    def on_update(kind, key, record):
+        if kind == 'load' and key == PONG:
+            pongs['last'] = (record[2], record[3], time.perf_counter())
+            pong_event.set()
+
+    sync = state_sync.StateSync(1, bind_a, [bind_b], full_sync_period=3600, listener=on_update)
+    sync.start()
+    ping_id = [0]
+
+    def ping(timeout=1.0):
+        ping_id[0] += 1
+        pong_event.clear()
+        start = time.perf_counter()
+        sync.set_load(PING, ping_id[0], 0)
+        sync.flush()
+        while True:
+            if not pong_event.wait(timeout):
+                return None
+            value, applied, when = pongs['last']
+            if value == ping_id[0]:
+                return when - start, applied
+            pong_event.clear()
+
+    while ping(0.2) is None:  # wait for the echo node to bind
+        pass
+    for _ in range(100):
+        ping()
+
+    rtts = sorted(ping()[0] for _ in range(args.pings))
+    one_way = [r / 2 * 1e6 for r in rtts]
+    print(f"ping over {'UDP' if args.udp else 'Unix'} sockets, {args.pings} samples: "
+          f"one-way p50 {one_way[len(one_way) // 2]:.0f} us, "
+          f"p99 {one_way[int(len(one_way) * 0.99)]:.0f} us")
+
+    rnd = random.Random(1)
+    switches = range(1, args.switches + 1)
+    macs = ['02:00:%02x:%02x:%02x:%02x' % (sw >> 8 & 0xff, sw & 0xff, h >> 8 & 0xff, h & 0xff)
+            for sw in switches for h in range(args.hosts_per_switch)]
+    for sw in switches:
+        sync.set_owner(sw, 1)
+    for i, mac in enumerate(macs):
+        sync.set_mac(mac, i // args.hosts_per_switch + 1, i % args.hosts_per_switch + 1)
+
+    sync.flush()
+    expected = ping()[1]
+    times, sizes, datagrams, json_sizes = [], [], [], []
+    for r in range(args.rounds):
+        for sw in switches:
+            sync.set_load(sw, rnd.uniform(0, 5000), rnd.uniform(0, 5e6))
+        for sw in rnd.sample(switches, len(switches) // 10):
+            sync.set_owner(sw, rnd.randint(1, 2))
+        for mac in rnd.sample(macs, len(macs) // 10):
+            sync.set_mac(mac, rnd.randint(1, args.switches), rnd.randint(1, 48))
+        records = len(sync.dirty_loads) + len(sync.dirty_owners) + len(sync.dirty_macs)
+        json_sizes.append(len(json.dumps({
+            'loads': dict((str(k), sync.loads[k]) for k in sync.dirty_loads),
+            'owners': dict((str(k), sync.owners[k]) for k in sync.dirty_owners),
+            'macs': dict((state_sync.mac_str(k), sync.macs[k]) for k in sync.dirty_macs),
+        }).encode()))
+        sent_before, dgrams_before = sync.sent_bytes, sync.sent_datagrams
+        start = time.perf_counter()
+        sync.flush()
+        sizes.append(sync.sent_bytes - sent_before)
+        datagrams.append(sync.sent_datagrams - dgrams_before)
+        rtt, applied = ping()
+        times.append(time.perf_counter() - start - rtt / 2)
+        expected += records + 1  # the round's records plus its ping
+        assert applied == expected, (applied, expected)
+
+    times.sort()
+    size = sum(sizes) / len(sizes)
+    print(f"round of {args.switches} switches ({records} records): "
+          f"{size / 1024:.1f} KiB in {sum(datagrams) / len(datagrams):.0f} datagrams, "
+          f"JSON would be {sum(json_sizes) / len(json_sizes) / 1024:.1f} KiB")
+    print(f"  full delta applied by the peer: p50 {times[len(times) // 2] * 1e3:.2f} ms, "
+          f"max {times[-1] * 1e3:.2f} ms")
+    print(f"  bandwidth at one round per 10 s stats period: {size * 8 / 10 / 1000:.1f} kbit/s")
+    echo.terminate()
+
+
+if __name__ == '__main__':
+    main()
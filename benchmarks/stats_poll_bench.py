@@ -0,0 +1,157 @@
+"""Packet-in latency while stats replies are being processed.
+
+Ryu handles every event of an app on one green thread, so a packet-in that
+arrives behind a pile of stats replies waits for all of them. This models
+that queue: the cost of a packet-in and of a flow-stats reply are measured
+on the real handlers, then N switches are polled either all at once every
+STATS_PERIOD (the old _monitor loop) or through PollScheduler, while
+packet-ins arrive as a Poisson stream. 10% of the switches have a load that
+keeps moving, the rest are idle.
+
+Usage: python benchmarks/stats_poll_bench.py [--switches 1000] [--flows 100] [--rate 500]
+"""
+import argparse
+import collections
+import heapq
+import itertools
+import random
+import time
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath, packet_in_event
+from proactive_bench import build
+
+import decision_controller
+import enhanced_traffic_controller
+import stats_scheduler
+
+RTT = 0.002
+
+
+def measure_costs(flows):
+    app = enhanced_traffic_controller.EnhancedTrafficController()
+    dp = FakeDatapath(1)
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    events = []
+    for i in range(2000):
+        data, fields = build(i % 50, (i + 1) % 50, 6, 80)
+        events.append(packet_in_event(dp, data, fields['in_port']))
+    start = time.perf_counter()
+    for ev in events:
+        app.packet_in_handler(ev)
+    packet_in_cost = (time.perf_counter() - start) / len(events)
+
+    dc = decision_controller.DecisionController()
+    parser = dp.ofproto_parser
+    body = [parser.OFPFlowStats(table_id=0, duration_sec=10 + r, duration_nsec=0, priority=10,
+                                idle_timeout=30, hard_timeout=0, flags=0, cookie=0,
+                                packet_count=i * r, byte_count=i * r * 100,
+                                match=parser.OFPMatch(in_port=i % 48 + 1,
+                                                      eth_dst='02:00:00:00:00:%02x' % (i % 256)),
+                                instructions=[])
+            for r in range(1, 3) for i in range(flows)]
+    replies = [parser.OFPFlowStatsReply(dp, body=body[r * flows:(r + 1) * flows], flags=0)
+               for r in range(2)]
+    rounds = 50
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for reply in replies:
+            dc.flow_stats_reply_handler(SimpleNamespace(msg=reply))
+    stats_cost = (time.perf_counter() - start) / (rounds * len(replies))
+    return packet_in_cost, stats_cost
+
+
+def simulate(mode, switches, rate, duration, packet_in_cost, stats_cost, period, seed=1):
+    rnd = random.Random(seed)
+    now = [0.0]
+    events = []
+    seq = itertools.count()
+    queue = collections.deque()
+    busy = [False]
+    latencies = []
+    polls = [0]
+    loads = dict((sw, rnd.uniform(100, 1000)) for sw in range(switches))
+    moving = set(rnd.sample(range(switches), switches // 10))
+    scheduler = stats_scheduler.PollScheduler(period, clock=lambda: now[0],
+                                              rnd=random.Random(seed))
+
+    def at(when, kind, data=None):
+        heapq.heappush(events, (when, next(seq), kind, data))
+
+    def arrive(job):
+        queue.append(job)
+        if not busy[0]:
+            start_next()
+
+    def start_next():
+        if queue:
+            busy[0] = True
+            kind, arrived, data = queue[0]
+            at(now[0] + (packet_in_cost if kind == 'packet_in' else stats_cost), 'finish')
+        else:
+            busy[0] = False
+
+    def poll(dpid):
+        polls[0] += 1
+        at(now[0] + RTT, 'arrive', ('stats', now[0] + RTT, dpid))
+
+    t = 0.0
+    while t < duration:
+        t += rnd.expovariate(rate)
+        at(t, 'arrive', ('packet_in', t, None))
+    if mode == 'fixed':
+        for k in range(int(duration / period) + 1):
+            at(k * period, 'poll_all')
+    else:
+        for sw in range(switches):
+            scheduler.add(sw)
+        at(0.0, 'wakeup')
+
+    while events:
+        now[0], _, kind, data = heapq.heappop(events)
+        if now[0] > duration:
+            break
+        if kind == 'arrive':
+            arrive(data)
+        elif kind == 'finish':
+            job_kind, arrived, dpid = queue.popleft()
+            if job_kind == 'packet_in':
+                latencies.append(now[0] - arrived)
+            else:
+                if dpid in moving:
+                    loads[dpid] *= rnd.uniform(0.5, 1.5)
+                scheduler.done(dpid, loads[dpid])
+            start_next()
+        elif kind == 'poll_all':
+            for sw in range(switches):
+                poll(sw)
+        elif kind == 'wakeup':
+            for sw in scheduler.due():
+                poll(sw)
+            at(now[0] + max(scheduler.sleep_time(), 0.001), 'wakeup')
+    latencies.sort()
+    return latencies, polls[0] / duration * 60
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--switches', type=int, default=1000)
+    parser.add_argument('--flows', type=int, default=100, help='flows per switch')
+    parser.add_argument('--rate', type=float, default=500, help='packet-ins per second')
+    parser.add_argument('--duration', type=float, default=300)
+    args = parser.parse_args()
+
+    packet_in_cost, stats_cost = measure_costs(args.flows)
+    print(f"measured cost: packet-in {packet_in_cost * 1e6:.0f} us, "
+          f"{args.flows}-flow stats reply {stats_cost * 1e3:.2f} ms")
+    print(f"{args.switches} switches, {args.rate:.0f} packet-in/s, {args.duration:.0f} s")
+    print(f"{'polling':>10} {'polls/min':>10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode in ('fixed', 'scheduled'):
+        lat, polls = simulate(mode, args.switches, args.rate, args.duration,
+                              packet_in_cost, stats_cost, 10.0)
+        print(f"{mode:>10} {polls:>10.0f} {lat[len(lat) // 2] * 1e3:>8.2f} "
+              f"{lat[int(len(lat) * 0.99)] * 1e3:>8.2f} {lat[-1] * 1e3:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Flow-stats reply processing time: per-flow dict lookup vs. cookie weights.
+
+The legacy path rebuilds (dpid, src, dst, in_port) and looks it up in
+flow_priorities for every entry. The cookie path reads the weight straight
+out of stat.cookie. The aggregate path gets one OFPAggregateStatsReply per
+class, so its cost does not depend on the flow count at all.
+
+Stat objects are built once for a pool of up to 100k flows and reused to
+make up larger replies, which keeps the 1M case within memory.
+
+Usage: python benchmarks/stats_reply_bench.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+from fake_datapath import FakeDatapath
+
+import enhanced_traffic_controller
+import flow_store
+
+POOL = 100000
+
+
+def mac(i):
+    return '02:00:00:%02x:%02x:%02x' % (i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)
+
+
+def build_pool(app, dp, count):
+    parser = dp.ofproto_parser
+    table = app.rules.table
+    stats = []
+    for i in range(count):
+        name = table.class_names[i % len(table.class_names)]
+        match = parser.OFPMatch(in_port=i % 48 + 1, eth_dst=mac(i), eth_src=mac(i + count))
+        stats.append(parser.OFPFlowStats(table_id=0, duration_sec=10, duration_nsec=0,
+                                         priority=table.priority_value(name), idle_timeout=30,
+                                         hard_timeout=0, flags=0, cookie=table.cookie(name),
+                                         packet_count=i % 1000, byte_count=i % 1000 * 100,
+                                         match=match, instructions=[]))
+        app.flow_priorities[flow_store.flow_key(dp.id, mac(i + count), mac(i), i % 48 + 1)] = \
+            table.priority_value(name)
+    return stats
+
+
+def legacy_handler(app, dpid, body):
+    total_load = 0
+    for stat in body:
+        src = stat.match.get('eth_src')
+        dst = stat.match.get('eth_dst')
+        in_port = stat.match.get('in_port')
+        priority = app.flow_priorities.get(flow_store.flow_key(dpid, src, dst, in_port), 10)
+        weight = 3 if priority >= 30 else 2 if priority >= 20 else 1
+        total_load += stat.packet_count * weight
+    return total_load
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    app = enhanced_traffic_controller.EnhancedTrafficController()
+    app.FLOW_TABLE_CAP = app.flow_priorities.max_entries = POOL
+    dp = FakeDatapath(1)
+    pool = build_pool(app, dp, min(POOL, max(args.sizes)))
+    ofp_parser = dp.ofproto_parser
+
+    print(f"{'flows':>8} {'legacy ms':>10} {'cookie ms':>10} {'aggregate ms':>13}")
+    for size in args.sizes:
+        body = [pool[i % len(pool)] for i in range(size)]
+
+        start = time.perf_counter()
+        legacy = legacy_handler(app, dp.id, body)
+        legacy_ms = (time.perf_counter() - start) * 1e3
+
+        reply = ofp_parser.OFPFlowStatsReply(dp, body=body, flags=0)
+        start = time.perf_counter()
+        app.flow_stats_reply_handler(SimpleNamespace(msg=reply))
+        cookie_ms = (time.perf_counter() - start) * 1e3
+        assert app.load_stats[dp.id] == legacy
+
+        app.request_stats(dp)
+        replies = []
+        for xid, name in app.class_stats_pending[dp.id].items():
+            agg = ofp_parser.OFPAggregateStatsReply(dp, body=ofp_parser.OFPAggregateStats(
+                packet_count=size, byte_count=size * 100, flow_count=size // 3), flags=0)
+            agg.xid = xid
+            replies.append(agg)
+        start = time.perf_counter()
+        for agg in replies:
+            app.aggregate_stats_reply_handler(SimpleNamespace(msg=agg))
+        aggregate_ms = (time.perf_counter() - start) * 1e3
+        assert not app.class_stats_pending[dp.id]
+
+        print(f"{size:>8} {legacy_ms:>10.1f} {cookie_ms:>10.1f} {aggregate_ms:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Packet-ins after an EnhancedTrafficController restart, cold vs. warm.
+
+A switch keeps its flow table while its controller restarts. A cold
+controller therefore never hears from hosts whose flows are all still
+installed: traffic towards them is flooded, and every packet of it comes
+back as a packet-in until one of their flows times out and they show up
+again. A warm controller starts with the MACs and flows of its snapshot and
+learns the rest from the flow table it reads back on connect.
+
+Synthetic traffic (see replay.py) runs through one ReplaySwitch. The
+controller is stopped at --restart-at, packets that miss are lost for
+--downtime seconds, and then a new instance connects. Modes:
+  no restart  the reference run
+  cold        WARM_RESTART off
+  dump only   warm restart without a snapshot, as after a crash before the first one
+  warm        snapshot written on stop, then restored and reconciled
+For each mode it reports the packet-ins in the first 10 s after reconnect
+and the busiest second, the packet-ins above the reference run, and when
+the per-second count settled back to the reference's. It also gives the
+time to start the instance and to reconcile the flow dump, and the size of
+the snapshot.
+
+Usage: python benchmarks/warm_restart_bench.py [--hosts 1024] [--flows 2000] [--rounds 8]
+"""
+import argparse
+import collections
+import os
+import tempfile
+import time
+
+from fake_datapath import FakeDatapath, packet_in_event
+import replay
+
+from ryu.controller import ofp_event
+
+NAME = 'enhanced_traffic_controller'
+MODES = ('no restart', 'cold', 'dump only', 'warm')
+BURST_WINDOW = 10  # seconds after reconnect counted as the burst
+SETTLED = 1.1  # per-second packet-ins within 10% (+1) of the reference run
+
+
+def answer(app, switch):
+    """Deliver the switch's replies to the stats requests sent so far; returns the seconds."""
+    replies = [r for req in switch.stats_requests for r in switch.answer(req)]
+    del switch.stats_requests[:]
+    begin = time.perf_counter()
+    for reply in replies:
+        replay.deliver(app, ofp_event.ofp_msg_to_ev(reply))
+    return time.perf_counter() - begin
+
+
+def start(mode, switch, path):
+    settings = {'ADMISSION': False, 'WARM_RESTART': mode != 'cold', 'SNAPSHOT_FILE': path}
+    clock = time.perf_counter
+    begin = clock()
+    manager, app = replay.load(NAME, **settings)
+    started = clock()
+    # A reconnect is a new connection, so a new Datapath.
+    dp = FakeDatapath(1)
+    switch.datapath = dp
+    dp.listeners.append(switch.on_message)
+    replay.connect(app, dp)
+    return manager, app, dp, (started - begin, answer(app, switch))
+
+
+def run(mode, trace, args, path):
+    if os.path.exists(path):
+        os.unlink(path)
+    switch = replay.ReplaySwitch(FakeDatapath(1))
+    manager, app, dp, _ = start(mode, switch, path)
+    down, up = args.restart_at, args.restart_at + args.downtime
+    counts = collections.Counter()  # second -> packet-ins
+    result = {'lost': 0, 'start_ms': None, 'reconcile_ms': None, 'snapshot_kib': None}
+    restarted = mode == 'no restart'
+    next_expiry = 0.0
+    for t, data, fields in trace:
+        if not restarted and t >= down:
+            manager.close()  # stop() writes the snapshot
+            if os.path.exists(path):
+                result['snapshot_kib'] = os.path.getsize(path) / 1024.0
+                if mode == 'dump only':
+                    os.unlink(path)
+            app = None
+            restarted = True
+        if app is None and t >= up:
+            manager, app, dp, (started, reconciled) = start(mode, switch, path)
+            result['start_ms'] = started * 1e3
+            result['reconcile_ms'] = reconciled * 1e3
+        switch.now = t
+        if t >= next_expiry:
+            for msg in switch.expire():
+                if app is not None:
+                    replay.deliver(app, ofp_event.EventOFPFlowRemoved(msg))
+            next_expiry = t + 1.0
+        table_id, to_controller = switch.process(fields, len(data))
+        if to_controller:
+            if app is None:
+                result['lost'] += 1
+            else:
+                replay.deliver(app, packet_in_event(dp, data, fields['in_port'], table_id))
+                counts[int(t)] += 1
+        del dp.sent[:]
+    manager.close()
+    return counts, result
+
+
+def fmt(value):
+    return f"{'-':>8}" if value is None else f"{value:8.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hosts', type=int, default=1024)
+    parser.add_argument('--flows', type=int, default=2000, help="flows per round")
+    parser.add_argument('--rounds', type=int, default=8)
+    parser.add_argument('--packets', type=int, default=4, help="packets per flow and round")
+    parser.add_argument('--churn', type=float, default=0.2)
+    parser.add_argument('--mix', choices=sorted(replay.MIXES), default='mixed')
+    parser.add_argument('--restart-at', type=float, default=65.0, help="trace seconds")
+    parser.add_argument('--downtime', type=float, default=2.0)
+    args = parser.parse_args()
+
+    trace = replay.synthetic(args.hosts, args.flows, args.rounds, args.packets,
+                             args.churn, args.mix)
+    end = int(trace[-1][0]) + 1
+    up = int(args.restart_at + args.downtime)
+    print(f"{len(trace)} packets over {end} s between {args.hosts} hosts, restart at "
+          f"{args.restart_at:.0f} s for {args.downtime:.0f} s")
+    print(f"{'mode':>10} {'start ms':>8} {'dump ms':>8} {'snap KiB':>8} "
+          f"{'first 10s':>9} {'peak/s':>6} {'excess':>7} {'settled':>8} {'lost':>5}")
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, NAME + '.snapshot')
+        for mode in MODES:
+            counts, result = run(mode, trace, args, path)
+            if reference is None:
+                reference = counts
+            after = range(up, end)
+            burst = sum(counts[s] for s in after[:BURST_WINDOW])
+            peak = max(counts[s] for s in after[:BURST_WINDOW])
+            excess = sum(max(0, counts[s] - reference[s]) for s in after)
+            unsettled = [s for s in after if counts[s] > reference[s] * SETTLED + 1]
+            settled = (unsettled[-1] + 1 - up) if unsettled else 0
+            settled = f"{settled} s" if not unsettled or unsettled[-1] < end - 1 else "never"
+            print(f"{mode:>10} {fmt(result['start_ms'])} "
+                  f"{fmt(result['reconcile_ms'])} {fmt(result['snapshot_kib'])} "
+                  f"{burst:>9} {peak:>6} {excess:>7} {settled:>8} {result['lost']:>5}")
+
+
+if __name__ == '__main__':
+    main()
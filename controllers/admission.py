@@ -0,0 +1,111 @@
+import collections
+import time
+
+
+class TokenBucket(object):
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now):
+        tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if tokens >= 1:
+            self.tokens = tokens - 1
+            return True
+        self.tokens = tokens
+        return False
+
+
+class AdmissionQueue(object):
+    """Per-datapath token buckets in front of a strict-priority work queue.
+
+    `levels` lists class names from most to least urgent; unknown names are
+    treated as the least urgent. Every item takes a token from its
+    datapath's bucket. With the bucket empty, items of a `sheddable` class
+    are dropped, unless the caller says this one may not be shed, and the
+    rest are still queued. At most `max_queue` items
+    wait; when full, an arriving item pushes out the newest item of a less
+    urgent class, or is dropped itself if there is none. pop() returns the
+    oldest item of the most urgent non-empty class.
+
+    Items are counted as admitted by admit(), whether the caller then queues
+    them or handles them straight away; one pushed out of the queue later
+    moves from the admitted to the shed count.
+    """
+
+    def __init__(self, levels, rate=500.0, burst=1000, max_queue=4096, sheddable=None,
+                 clock=time.monotonic):
+        self.levels = list(levels)
+        self.rank = dict((name, i) for i, name in enumerate(self.levels))
+        self.queues = [collections.deque() for _ in self.levels]
+        self.sheddable = set(self.levels[-1:] if sheddable is None else sheddable)
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.clock = clock
+        self.buckets = {}          # dpid -> TokenBucket
+        self.size = 0
+        self.admitted = dict((name, 0) for name in self.levels)
+        self.shed = dict((name, 0) for name in self.levels)
+
+    def __len__(self):
+        return self.size
+
+    def remove(self, dpid):
+        self.buckets.pop(dpid, None)
+
+    def admit(self, dpid, level, shed=True):
+        """Charge the datapath's bucket; False if the item should be shed.
+
+        With `shed` False the item is admitted even over the rate.
+        """
+        now = self.clock()
+        bucket = self.buckets.get(dpid)
+        if bucket is None:
+            bucket = self.buckets[dpid] = TokenBucket(self.rate, self.burst, now)
+        if bucket.take(now) or not shed or level not in self.sheddable:
+            self._count(self.admitted, level)
+            return True
+        self._count(self.shed, level)
+        return False
+
+    def push(self, level, item):
+        """Queue an admitted item; False if it had to be dropped."""
+        rank = self.rank.get(level, len(self.levels) - 1)
+        if self.size >= self.max_queue:
+            for victim in range(len(self.queues) - 1, rank, -1):
+                if self.queues[victim]:
+                    self.queues[victim].pop()
+                    self._drop(self.levels[victim])
+                    self.size -= 1
+                    break
+            else:
+                self._drop(level)
+                return False
+        self.queues[rank].append(item)
+        self.size += 1
+        return True
+
+    def offer(self, dpid, level, item):
+        return self.admit(dpid, level) and self.push(level, item)
+
+    def pop(self):
+        for queue in self.queues:
+            if queue:
+                self.size -= 1
+                return queue.popleft()
+        return None
+
+    def _count(self, counters, level, n=1):
+        if level not in counters:
+            level = self.levels[-1]
+        counters[level] += n
+
+    def _drop(self, level):
+        self._count(self.admitted, level, -1)
+        self._count(self.shed, level)
@@ -1,156 +1,446 @@
-from ryu.base import app_manager
-from ryu.controller import ofp_event
-from ryu.controller.handler import MAIN_DISPATCHER, DEAD_DISPATCHER, set_ev_cls
-from ryu.lib import hub
-from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet, ethernet
-
-
-class DecisionController(app_manager.RyuApp):
-    OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]  # Use OpenFlow 1.3
-
-    def __init__(self, *args, **kwargs):
-        super(DecisionController, self).__init__(*args, **kwargs)
-        self.controller_loads = {}  # dpid -> load
-        self.threshold = 1000000  # initial migration threshold
-        self.datapaths = {}
-        self.switch_to_controller = {}  # switch dpid to controller dpid
-        self.switch_priority = {}  # switch dpid to priority: HIGH/MEDIUM/LOW
-        self.monitor_thread = hub.spawn(self._monitor)
-
-    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
-    def _state_change_handler(self, ev):
-        datapath = ev.datapath
-        dpid = datapath.id
-        if ev.state == MAIN_DISPATCHER:
-            self.datapaths[dpid] = datapath
-            self.logger.info("Registered datapath %s", dpid)
-            self.switch_to_controller[dpid] = dpid  # Initially own controller
-            self.switch_priority[dpid] = 'LOW'  # Default priority
-        elif ev.state == DEAD_DISPATCHER:
-            if dpid in self.datapaths:
-                self.logger.info("Unregistered datapath %s", dpid)
-                self.datapaths.pop(dpid)
-            if dpid in self.switch_to_controller:
-                self.switch_to_controller.pop(dpid)
-            if dpid in self.switch_priority:
-                self.switch_priority.pop(dpid)
-
-    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, MAIN_DISPATCHER)
-    def switch_features_handler(self, ev):
-        datapath = ev.msg.datapath
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        # install table-miss flow entry to send unmatched packets to controller
-        match = parser.OFPMatch()
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
-        self.logger.info(f"Switch {datapath.id}: Installed table-miss flow")
-
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-        if buffer_id:
-            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
-                                    priority=priority, match=match,
-                                    instructions=inst)
-        else:
-            mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
-                                    match=match, instructions=inst)
-        datapath.send_msg(mod)
-
-    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
-    def _packet_in_handler(self, ev):
-        msg = ev.msg
-        datapath = msg.datapath
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocol(ethernet.ethernet)
-        if eth.ethertype == 0x88cc:  # Ignore LLDP packets
-            return
-
-        in_port = msg.match['in_port']
-
-        # Example: Flood all packets (replace with real logic)
-        actions = [parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
-        data = None
-        if msg.buffer_id == ofproto.OFP_NO_BUFFER:
-            data = msg.data
-        out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
-                                  in_port=in_port, actions=actions, data=data)
-        datapath.send_msg(out)
-        self.logger.debug(f"Flooded packet on switch {datapath.id}")
-
-    def _monitor(self):
-        while True:
-            self.collect_loads()
-            self.adjust_threshold()
-            self.check_migration()
-            hub.sleep(10)
-
-    def collect_loads(self):
-        for dp in self.datapaths.values():
-            self.request_stats(dp)
-
-    def request_stats(self, datapath):
-        parser = datapath.ofproto_parser
-        req = parser.OFPFlowStatsRequest(datapath)
-        datapath.send_msg(req)
-
-    @set_ev_cls(ofp_event.EventOFPFlowStatsReply)
-    def flow_stats_reply_handler(self, ev):
-        dpid = ev.msg.datapath.id
-        total_load = 0
-        for stat in ev.msg.body:
-            weight = 1
-            total_load += stat.packet_count * weight
-        self.controller_loads[dpid] = total_load
-        self.logger.info("Controller load - DPID %s: %d", dpid, total_load)
-
-    def adjust_threshold(self):
-        if len(self.controller_loads) == 0:
-            return
-        avg_load = sum(self.controller_loads.values()) / len(self.controller_loads)
-        new_threshold = int(avg_load * 1.5)
-        if new_threshold != self.threshold:
-            self.logger.info("Adjusting threshold from %d to %d",
-                             self.threshold, new_threshold)
-            self.threshold = new_threshold
-
-    def check_migration(self):
-        for dpid, load in self.controller_loads.items():
-            if load > self.threshold:
-                self.logger.info(f"Overload detected on controller {dpid}, migrating switches...")
-                self.migrate_switches(dpid)
-
-    def migrate_switches(self, overloaded_dpid):
-        self.logger.info(f"Performing migration from overloaded controller {overloaded_dpid}")
-
-        switches = [sw for sw, ctrl in self.switch_to_controller.items() if ctrl == overloaded_dpid]
-        sorted_controllers = sorted(((d, l) for d, l in self.controller_loads.items() if d != overloaded_dpid),
-                                    key=lambda x: x[1])
-        if not sorted_controllers:
-            self.logger.info("No other controllers to migrate to")
-            return
-        target_dpid = sorted_controllers[0][0]
-
-        low_priority_switches = [sw for sw in switches if self.switch_priority.get(sw, 'LOW') == 'LOW']
-        if not low_priority_switches:
-            self.logger.info("No low priority switches available for migration")
-            return
-
-        for sw in low_priority_switches:
-            self.logger.info(f"Migrating switch {sw} from controller {overloaded_dpid} to {target_dpid}")
-            self.switch_to_controller[sw] = target_dpid
-            # Notify external script or orchestration system to perform actual migration
-            break  # migrate one at a time
-
-
-if __name__ == "__main__":
-    from ryu.cmd import manager
-
-    manager.main()
+from ryu.base import app_manager
+from ryu.controller import ofp_event
+from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, DEAD_DISPATCHER, set_ev_cls
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_3
+from ryu.lib.packet import packet, ethernet
+import time
+
+import numpy as np
+
+import flow_writer
+import load_estimator
+import migration_executor
+import migration_planner
+import snapshot
+import state_sync
+import stats_scheduler
+
+
+class DecisionController(app_manager.RyuApp):
+    OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]  # Use OpenFlow 1.3
+    NODE_ID = 2  # this controller instance in the cluster
+    SYNC_BIND = ('127.0.0.1', 7734)  # state sync socket, a path for a Unix socket
+    SYNC_PEERS = [('127.0.0.1', 7733)]  # enhanced_traffic_controller
+    WRITE_WINDOW = 0.005  # seconds a FlowMod may wait to be batched
+    WRITE_BATCH = 64  # messages per batch before an early flush
+    LOAD_METRIC = 'pps'  # 'pps' (packets/sec) or 'bps' (bytes/sec)
+    LOAD_ALPHA = 0.3  # EWMA weight of the newest rate sample
+    STATS_PERIOD = 10  # seconds, base polling interval per switch
+    STATS_MIN_PERIOD = 2  # fastest polling for busy or near-threshold switches
+    STATS_MAX_PERIOD = 60  # slowest polling for idle switches
+    MAX_OUTSTANDING_STATS = 16  # stats requests awaiting a reply
+    NEAR_THRESHOLD = 0.8  # poll faster once a controller passes 80% of threshold
+    CONTROLLER_CAPACITY = {}  # controller id -> relative capacity, default 1.0
+    MAX_MOVES_PER_ROUND = 16
+    MIGRATION_COOLDOWN = 60  # seconds before a moved switch may move again
+    HYSTERESIS = 0.1  # keep rebalancing until the peak is 10% under threshold
+    HANDOVER_TIMEOUT = 5.0  # seconds before a role handover is rolled back
+    WARM_RESTART = True  # keep switch owners and priorities across restarts
+    SNAPSHOT_FILE = 'decision_controller.snapshot'  # relative to the working directory
+    SNAPSHOT_PERIOD = 30  # seconds between snapshots, another one is written on stop
+
+    def __init__(self, *args, **kwargs):
+        super(DecisionController, self).__init__(*args, **kwargs)
+        self.loads = load_estimator.LoadEstimator(alpha=self.LOAD_ALPHA)
+        self.threshold = 1000000  # initial migration threshold, in LOAD_METRIC units
+        self.datapaths = {}
+        self.writers = {}  # dpid -> FlowWriter
+        self.switch_to_controller = {}  # switch dpid to controller dpid
+        self.switch_priority = {}  # switch dpid to priority: HIGH/MEDIUM/LOW
+        self.remembered = {}  # dpid -> (controller, priority) of switches not connected now
+        self.controllers = set()  # known controller ids
+        self.last_migrated = {}  # switch dpid -> time of its last move
+        self.rebalancing = False
+        self.hot_controllers = set()  # controllers above NEAR_THRESHOLD
+        self.poller = stats_scheduler.PollScheduler(self.STATS_PERIOD, self.STATS_MIN_PERIOD,
+                                                    self.STATS_MAX_PERIOD,
+                                                    self.MAX_OUTSTANDING_STATS)
+        self.channels = {}  # switch dpid -> {controller id: datapath}
+        self.executor = migration_executor.MigrationExecutor(self.HANDOVER_TIMEOUT,
+                                                             callback=self.handover_done,
+                                                             node_id=self.NODE_ID,
+                                                             send=self.send_handover)
+        self.sync = state_sync.StateSync(self.NODE_ID, self.SYNC_BIND, self.SYNC_PEERS,
+                                         listener=self.sync_update)
+        self.sync_threads = []
+        self.monitor_thread = hub.spawn(self._monitor)
+        self.poll_thread = hub.spawn(self._poll)
+        if self.WARM_RESTART:
+            self.load_snapshot()
+            self.snapshot_thread = hub.spawn(self._snapshot)
+
+    def start(self):
+        super(DecisionController, self).start()
+        self.sync_threads = self.sync.start()
+
+    def stop(self):
+        if self.WARM_RESTART:
+            self.save_snapshot()
+        self.sync.close()
+        for thread in self.sync_threads:
+            hub.kill(thread)
+        super(DecisionController, self).stop()
+
+    def sync_update(self, kind, key, record):
+        if kind == 'handover':
+            self.executor.on_message(key, *record,
+                                     datapath=self.channels.get(key, {}).get(self.NODE_ID))
+        elif kind == 'owner' and key in self.datapaths:
+            if self.executor.busy(key):
+                return  # the handover decides
+            if record is None:
+                # The owner let go of the switch or went away, and we are still connected.
+                self.sync.set_owner(key, self.NODE_ID)
+                self.sync.flush()
+            owner = self.sync.owner(key)
+            self.switch_to_controller[key] = owner
+            self.controllers.add(owner)
+            self.executor.assign_role(self.datapaths[key], owner == self.NODE_ID)
+        elif kind == 'owner':
+            if record is None:
+                # Retracted by its owner or expired with a controller that went away.
+                self.switch_to_controller.pop(key, None)
+                self.switch_priority.pop(key, None)
+                return
+            # Switch attached to another instance, or moved there by a peer.
+            self.switch_to_controller[key] = record[2]
+            self.controllers.add(record[2])
+            self.switch_priority.setdefault(key, 'LOW')
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
+    def _state_change_handler(self, ev):
+        datapath = ev.datapath
+        dpid = datapath.id
+        if ev.state == MAIN_DISPATCHER:
+            self.datapaths[dpid] = datapath
+            self.logger.info("Registered datapath %s", dpid)
+            # This controller at LOW, unless the switch was known before a reconnect or
+            # restart, or another controller connected to it already owns it.
+            owner, priority = self.remembered.pop(dpid, (self.NODE_ID, 'LOW'))
+            current = self.sync.owner(dpid)
+            if current is None:
+                self.sync.set_owner(dpid, owner)
+                self.sync.flush()
+            else:
+                owner = current
+            self.switch_to_controller[dpid] = owner
+            self.register_channel(dpid, self.NODE_ID, datapath)
+            self.controllers.add(self.NODE_ID)
+            self.controllers.add(owner)
+            self.switch_priority[dpid] = priority
+            self.executor.assign_role(datapath, owner == self.NODE_ID)
+            self.poller.add(dpid)
+        elif ev.state == DEAD_DISPATCHER:
+            if dpid in self.datapaths:
+                self.logger.info("Unregistered datapath %s", dpid)
+                self.datapaths.pop(dpid)
+            self.writers.pop(dpid, None)
+            self.poller.remove(dpid)
+            self.loads.remove(dpid)
+            self.sync.retract_load(dpid)
+            self.sync.retract_owner(dpid, self.NODE_ID)
+            self.sync.flush()
+            if self.WARM_RESTART and dpid in self.switch_to_controller:
+                self.remembered[dpid] = (self.switch_to_controller[dpid],
+                                         self.switch_priority.get(dpid, 'LOW'))
+            if dpid in self.switch_to_controller:
+                self.switch_to_controller.pop(dpid)
+            if dpid in self.switch_priority:
+                self.switch_priority.pop(dpid)
+            self.last_migrated.pop(dpid, None)
+            channels = self.channels.get(dpid, {})
+            for ctrl in [c for c, dp in channels.items() if dp is datapath]:
+                del channels[ctrl]
+            if not channels:
+                self.channels.pop(dpid, None)
+
+    def register_channel(self, dpid, controller, datapath):
+        """Record the connection through which `controller` reaches switch `dpid`."""
+        self.channels.setdefault(dpid, {})[controller] = datapath
+
+    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, MAIN_DISPATCHER)
+    def switch_features_handler(self, ev):
+        datapath = ev.msg.datapath
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        # install table-miss flow entry to send unmatched packets to controller
+        match = parser.OFPMatch()
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+                                          ofproto.OFPCML_NO_BUFFER)]
+        self.add_flow(datapath, 0, match, actions)
+        self.logger.info(f"Switch {datapath.id}: Installed table-miss flow")
+
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        if buffer_id:
+            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
+                                    priority=priority, match=match,
+                                    instructions=inst)
+        else:
+            mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
+                                    match=match, instructions=inst)
+        self.writer_for(datapath).send(mod)
+
+    def writer_for(self, datapath):
+        writer = self.writers.get(datapath.id)
+        if writer is None or writer.datapath is not datapath:
+            writer = flow_writer.FlowWriter(datapath, self.WRITE_WINDOW, self.WRITE_BATCH)
+            self.writers[datapath.id] = writer
+        return writer
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _barrier_reply_handler(self, ev):
+        if self.executor.on_barrier_reply(ev.msg.datapath, ev.msg):
+            return
+        writer = self.writers.get(ev.msg.datapath.id)
+        if writer is not None:
+            writer.on_barrier_reply(ev.msg.xid)
+
+    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    def _packet_in_handler(self, ev):
+        msg = ev.msg
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if not self.executor.should_handle(datapath):
+            return  # the other controller owns this switch for now
+
+        pkt = packet.Packet(msg.data)
+        eth = pkt.get_protocol(ethernet.ethernet)
+        if eth.ethertype == 0x88cc:  # Ignore LLDP packets
+            return
+
+        in_port = msg.match['in_port']
+
+        # Example: Flood all packets (replace with real logic)
+        actions = [parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
+        data = None
+        if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+            data = msg.data
+        out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
+                                  in_port=in_port, actions=actions, data=data)
+        self.writer_for(datapath).send(out, flush=True)
+        self.logger.debug(f"Flooded packet on switch {datapath.id}")
+
+    @set_ev_cls(ofp_event.EventOFPRoleReply, MAIN_DISPATCHER)
+    def _role_reply_handler(self, ev):
+        self.executor.on_role_reply(ev.msg.datapath, ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def _flow_removed_handler(self, ev):
+        self.executor.on_flow_removed(ev.msg.datapath, ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+    def _error_msg_handler(self, ev):
+        if self.executor.on_error(ev.msg.datapath, ev.msg):
+            self.logger.warning("Role handover of switch %s failed: error type %d code %d",
+                                ev.msg.datapath.id, ev.msg.type, ev.msg.code)
+
+    def _monitor(self):
+        while True:
+            self.executor.expire()
+            # Settles two controllers that claimed a switch at the same time.
+            for dpid, datapath in list(self.datapaths.items()):
+                if not self.executor.busy(dpid):
+                    self.executor.assign_role(
+                        datapath, self.switch_to_controller.get(dpid) == self.NODE_ID)
+            self.adjust_threshold()
+            self.check_migration()
+            hub.sleep(self.STATS_PERIOD)
+
+    def _poll(self):
+        while True:
+            for dpid in self.poller.due():
+                datapath = self.datapaths.get(dpid)
+                if datapath is None:
+                    self.poller.remove(dpid)
+                else:
+                    self.request_stats(datapath)
+            hub.sleep(self.poller.sleep_time())
+
+    def _snapshot(self):
+        while True:
+            hub.sleep(self.SNAPSHOT_PERIOD)
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        switches = dict(self.remembered)
+        for dpid, owner in self.switch_to_controller.items():
+            switches[dpid] = (owner, self.switch_priority.get(dpid, 'LOW'))
+        state = {
+            'node': self.NODE_ID,
+            'switches': [[dpid, owner, priority] for dpid, (owner, priority) in switches.items()],
+        }
+        try:
+            snapshot.save(self.SNAPSHOT_FILE, state)
+        except OSError as e:
+            self.logger.error(f"Failed to write snapshot {self.SNAPSHOT_FILE}: {e}")
+
+    def load_snapshot(self):
+        try:
+            state = snapshot.load(self.SNAPSHOT_FILE)
+            if state is None:
+                return
+            restored = dict((dpid, (owner, priority))
+                            for dpid, owner, priority in state['switches'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.error(f"Starting without switch owners, cannot restore {self.SNAPSHOT_FILE}: {e}")
+            return
+        self.remembered = restored
+        self.logger.info("Restored owners of %d switches from a snapshot taken %.0fs ago",
+                         len(restored), state['saved'])
+
+    def request_stats(self, datapath):
+        parser = datapath.ofproto_parser
+        req = parser.OFPFlowStatsRequest(datapath)
+        datapath.send_msg(req)
+
+    def controller_capacities(self):
+        ids = self.controllers | set(self.switch_to_controller.values())
+        return dict((c, self.CONTROLLER_CAPACITY.get(c, 1.0)) for c in ids)
+
+    def switch_loads(self):
+        """(dpids, loads) of local switches plus those reported by peers."""
+        dpids, values = self.loads.loads(self.LOAD_METRIC)
+        remote = self.sync.peer_loads(self.LOAD_METRIC)
+        for dpid in dpids.tolist():
+            remote.pop(dpid, None)
+        if not remote:
+            return dpids, values
+        return (np.concatenate([dpids, np.fromiter(remote, dtype=dpids.dtype, count=len(remote))]),
+                np.concatenate([values, np.fromiter(remote.values(), dtype=float, count=len(remote))]))
+
+    def controller_load_vector(self):
+        """(controller ids, summed switch loads, capacities) as arrays.
+
+        A switch nobody owns yet counts towards this controller, which is
+        the one that takes it on connect.
+        """
+        dpids, values = self.switch_loads()
+        owners = np.fromiter((self.switch_to_controller.get(int(d), self.NODE_ID) for d in dpids),
+                             dtype=np.int64, count=len(dpids))
+        capacities = self.controller_capacities()
+        ids = np.array(sorted(set(capacities) | set(owners.tolist())), dtype=np.int64)
+        totals = np.bincount(np.searchsorted(ids, owners), weights=values, minlength=len(ids))
+        caps = np.array([capacities.get(int(c), 1.0) for c in ids])
+        return ids, totals, caps
+
+    @property
+    def controller_loads(self):
+        ids, totals, _ = self.controller_load_vector()
+        return dict(zip(ids.tolist(), totals.tolist()))
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply)
+    def flow_stats_reply_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        more = msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE
+        rates = self.loads.add_reply(dpid, msg.body, more)
+        if rates is None:
+            return
+        load = rates[0] if self.LOAD_METRIC == 'pps' else rates[1]
+        self.poller.done(dpid, load, hot=self.switch_to_controller.get(dpid) in self.hot_controllers)
+        self.sync.set_load(dpid, *rates)
+        self.sync.flush()
+        self.logger.info("Controller load - DPID %s: %.1f pkt/s, %.1f B/s", dpid, *rates)
+
+    def adjust_threshold(self):
+        _, totals, caps = self.controller_load_vector()
+        if len(totals) == 0:
+            return
+        # Average utilisation, so the threshold also applies to unequal capacities.
+        avg_load = float(totals.sum() / caps.sum())
+        new_threshold = avg_load * 1.5
+        if new_threshold != self.threshold:
+            self.logger.info("Adjusting threshold from %.1f to %.1f",
+                             self.threshold, new_threshold)
+            self.threshold = new_threshold
+
+    def check_migration(self):
+        ids, totals, caps = self.controller_load_vector()
+        self.hot_controllers = set(ids[totals / caps > self.threshold * self.NEAR_THRESHOLD].tolist())
+        if len(ids) < 2:
+            return
+        peak = float((totals / caps).max())
+        if peak > self.threshold:
+            if not self.rebalancing:
+                overloaded = ids[totals / caps > self.threshold].tolist()
+                self.logger.info(f"Overload detected on controllers {overloaded}, migrating switches...")
+            self.rebalancing = True
+        elif peak < self.threshold * (1 - self.HYSTERESIS):
+            self.rebalancing = False
+        if self.rebalancing:
+            self.migrate_switches()
+
+    def migrate_switches(self):
+        now = time.monotonic()
+        # HIGH/MEDIUM switches stay pinned; recently moved ones sit out a cooldown.
+        movable = set(sw for sw in self.switch_to_controller
+                      if self.switch_priority.get(sw, 'LOW') == 'LOW' and not self.executor.busy(sw) and
+                      now - self.last_migrated.get(sw, -self.MIGRATION_COOLDOWN) >= self.MIGRATION_COOLDOWN)
+        dpids, values = self.switch_loads()
+        loads = dict(zip(dpids.tolist(), values.tolist()))
+        while True:
+            moves = migration_planner.plan_migrations(
+                loads, self.switch_to_controller, self.controller_capacities(), movable,
+                max_moves=self.MAX_MOVES_PER_ROUND,
+                target=self.threshold * (1 - self.HYSTERESIS))
+            # Channels of other controllers are in their own processes, which
+            # run their side of the handover through state_sync. A move this
+            # side has no channel for is dropped and the rest planned again
+            # without it, as they assumed it was made.
+            unreachable = [(sw, src, dst) for sw, src, dst in moves
+                           if self.NODE_ID in (src, dst) and
+                           self.NODE_ID not in self.channels.get(sw, {})]
+            if not unreachable:
+                break
+            for sw, src, dst in unreachable:
+                self.logger.warning(f"No channel to switch {sw}, not migrating it from "
+                                    f"controller {src} to {dst}")
+                movable.discard(sw)
+                self.last_migrated[sw] = now
+        if not moves:
+            self.logger.info("No migration lowers the peak controller load")
+            return
+        for sw, src, dst in moves:
+            channels = self.channels.get(sw, {})
+            old, new = channels.get(src), channels.get(dst)
+            self.logger.info(f"Migrating switch {sw} from controller {src} to {dst}")
+            self.switch_to_controller[sw] = dst
+            self.last_migrated[sw] = now
+            self.sync.set_owner(sw, dst)
+            if old is None and new is None:
+                self.executor.request(sw, src, dst)
+            else:
+                self.executor.start(old, new, src, dst, started=now)
+        self.sync.flush()
+
+    def send_handover(self, dpid, handover_id, src, dst, message, generation):
+        self.sync.send_handover(dpid, handover_id, src, dst, message, generation)
+        self.sync.flush()
+
+    def handover_done(self, handover):
+        if not handover.ok:
+            self.logger.warning(f"Handover of switch {handover.dpid} to controller {handover.dst} "
+                                f"failed, keeping controller {handover.src}")
+            self.switch_to_controller[handover.dpid] = handover.src
+            self.sync.set_owner(handover.dpid, handover.src)
+            self.sync.flush()
+            return
+        self.switch_to_controller[handover.dpid] = handover.dst
+        self.sync.set_owner(handover.dpid, handover.dst)
+        self.sync.flush()
+        if handover.latency is None:
+            self.logger.info("Switch %s released to controller %s", handover.dpid, handover.dst)
+        else:
+            self.logger.info("Switch %s handed over from controller %s to %s in %.1f ms",
+                             handover.dpid, handover.src, handover.dst, handover.latency * 1e3)
+
+
+if __name__ == "__main__":
+    from ryu.cmd import manager
+
+    manager.main()
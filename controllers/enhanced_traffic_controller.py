@@ -1,185 +1,1043 @@
-from ryu.base import app_manager
-from ryu.controller import ofp_event
-from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, set_ev_cls
-from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet, ethernet, ipv4, tcp, udp, icmp
-from ryu.lib import hub
-import time
-
-class EnhancedTrafficController(app_manager.RyuApp):
-    OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
-    STATS_PERIOD = 10  # seconds
-
-    def __init__(self, *args, **kwargs):
-        super(EnhancedTrafficController, self).__init__(*args, **kwargs)
-        self.mac_to_port = {}
-        self.datapaths = {}
-        self.load_stats = {}  # holds weighted load per switch
-        self.flow_priorities = {}  # key: (dpid, src, dst, in_port), value: priority
-        self.monitor_thread = hub.spawn(self._monitor)
-
-    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
-    def switch_features_handler(self, ev):
-        datapath = ev.msg.datapath
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        match = parser.OFPMatch()
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
-        self.logger.info(f"Switch {datapath.id}: Installed table-miss flow")
-
-    def priority_value(self, priority_str):
-        priorities = {'HIGH': 30, 'MEDIUM': 20, 'LOW': 10}
-        return priorities.get(priority_str, 10)
-
-    def add_flow(self, datapath, priority, match, actions,
-                 buffer_id=None, idle_timeout=0, hard_timeout=0):
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        if isinstance(priority, str):
-            priority_val = self.priority_value(priority)
-        else:
-            priority_val = priority
-
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
-                                             actions)]
-        try:
-            if buffer_id:
-                mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
-                                        priority=priority_val, match=match,
-                                        instructions=inst, idle_timeout=idle_timeout,
-                                        hard_timeout=hard_timeout)
-            else:
-                mod = parser.OFPFlowMod(datapath=datapath, priority=priority_val,
-                                        match=match, instructions=inst,
-                                        idle_timeout=idle_timeout, hard_timeout=hard_timeout)
-            datapath.send_msg(mod)
-            dpid = datapath.id
-            src = match.get('eth_src')
-            dst = match.get('eth_dst')
-            in_port = match.get('in_port')
-            flow_key = (dpid, src, dst, in_port)
-            self.flow_priorities[flow_key] = priority_val
-            self.logger.info(f"Flow added on DPID {dpid} with priority {priority_val}")
-        except Exception as e:
-            self.logger.error(f"Failed to add flow: {e}")
-
-    def classify_priority(self, pkt):
-        ip_pkt = pkt.get_protocol(ipv4.ipv4)
-        if not ip_pkt:
-            return 'LOW'
-        proto = ip_pkt.proto
-        if proto == 6:  # TCP
-            tcp_pkt = pkt.get_protocol(tcp.tcp)
-            if tcp_pkt and tcp_pkt.dst_port in [80, 443]:
-                return 'HIGH'
-            else:
-                return 'MEDIUM'
-        elif proto == 17:  # UDP
-            udp_pkt = pkt.get_protocol(udp.udp)
-            if udp_pkt and udp_pkt.dst_port == 53:
-                return 'HIGH'
-            else:
-                return 'LOW'
-        elif proto == 1:  # ICMP
-            return 'MEDIUM'
-        else:
-            return 'LOW'
-
-    def priority_to_queue(self, priority):
-        if priority == 'HIGH':
-            return 1
-        elif priority == 'MEDIUM':
-            return 2
-        else:
-            return 3
-
-    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
-    def packet_in_handler(self, ev):
-        msg = ev.msg
-        datapath = msg.datapath
-        dpid = datapath.id
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        in_port = msg.match['in_port']
-
-        # Log datapath ID to confirm packet_in from all switches including s2
-        self.logger.info(f"Packet_in received from DPID {dpid}")
-
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocol(ethernet.ethernet)
-        if eth.ethertype == 0x88cc:
-            return
-        dst = eth.dst
-        src = eth.src
-
-        # Learn MAC address per datapath
-        self.mac_to_port.setdefault(dpid, {})
-        self.mac_to_port[dpid][src] = in_port
-
-        out_port = self.mac_to_port[dpid].get(dst, ofproto.OFPP_FLOOD)
-
-        priority = self.classify_priority(pkt)
-        queue_id = self.priority_to_queue(priority)
-
-        self.logger.info(f"DPID {dpid} Packet from {src} to {dst} Priority={priority} Queue={queue_id}")
-
-        actions = [parser.OFPActionSetQueue(queue_id),
-                   parser.OFPActionOutput(out_port)]
-
-        if out_port != ofproto.OFPP_FLOOD:
-            match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
-            self.add_flow(datapath, priority, match, actions,
-                          buffer_id=msg.buffer_id, idle_timeout=30)
-        data = None
-        if msg.buffer_id == ofproto.OFP_NO_BUFFER:
-            data = msg.data
-        out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
-                                  in_port=in_port, actions=actions, data=data)
-        datapath.send_msg(out)
-
-    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, CONFIG_DISPATCHER])
-    def _state_change_handler(self, ev):
-        datapath = ev.datapath
-        if ev.state == MAIN_DISPATCHER:
-            if datapath.id not in self.datapaths:
-                self.logger.info("Register datapath: %s", datapath.id)
-                self.datapaths[datapath.id] = datapath
-        elif ev.state == CONFIG_DISPATCHER:
-            if datapath.id in self.datapaths:
-                del self.datapaths[datapath.id]
-
-    def _monitor(self):
-        while True:
-            for dp in self.datapaths.values():
-                self.request_stats(dp)
-            hub.sleep(self.STATS_PERIOD)
-
-    def request_stats(self, datapath):
-        self.logger.debug("Requesting stats from datapath %s", datapath.id)
-        parser = datapath.ofproto_parser
-        req = parser.OFPFlowStatsRequest(datapath)
-        datapath.send_msg(req)
-
-    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
-    def flow_stats_reply_handler(self, ev):
-        datapath = ev.msg.datapath
-        dpid = datapath.id
-        total_load = 0
-        for stat in ev.msg.body:
-            src = stat.match.get('eth_src')
-            dst = stat.match.get('eth_dst')
-            in_port = stat.match.get('in_port')
-            flow_key = (dpid, src, dst, in_port)
-            priority = self.flow_priorities.get(flow_key, 10)
-            weight = 3 if priority >= 30 else 2 if priority >= 20 else 1
-            load = stat.packet_count * weight
-            total_load += load
-        self.load_stats[dpid] = total_load
-        self.logger.info(f"DPID {dpid} Load: {total_load}")
-
-
-if __name__ == "__main__":
-    from ryu.cmd import manager
-    manager.main()
+from ryu.app.wsgi import WSGIApplication
+from ryu.base import app_manager
+from ryu.controller import ofp_event
+from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, DEAD_DISPATCHER, set_ev_cls
+from ryu.ofproto import ofproto_v1_3
+from ryu.lib.packet import packet
+from ryu.lib import hub
+from ryu.topology import event as topo_event
+import logging
+import os
+import struct
+import time
+
+import admission
+import fast_parser
+import flow_store
+import flow_writer
+import heavy_hitters
+import instrumentation
+import metrics_store
+import meter_control
+import migration_executor
+import path_table
+import qos_rules
+import snapshot
+import state_sync
+import stats_scheduler
+
+class EnhancedTrafficController(app_manager.RyuApp):
+    OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}  # serves /metrics on ryu-manager's --wsapi-port
+    NODE_ID = 1  # this controller instance in the cluster
+    SYNC_BIND = ('127.0.0.1', 7733)  # state sync socket, a path for a Unix socket
+    SYNC_PEERS = [('127.0.0.1', 7734)]  # decision_controller
+    HANDOVER_TIMEOUT = 5.0  # seconds before this side of a role handover gives up
+    STATS_PERIOD = 10  # seconds
+    STATS_MIN_PERIOD = 2  # fastest polling for switches whose load moves quickly
+    STATS_MAX_PERIOD = 60  # slowest polling for idle switches
+    MAX_OUTSTANDING_STATS = 16  # switches with stats requests awaiting replies
+    FAST_PATH = True  # decode packet-in headers without building a full Packet
+    RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'qos_rules.json')
+    PROACTIVE = False  # install the multi-table QoS pipeline at connect time
+    QOS_TABLE = 0  # classify by ip_proto/ports and write the queue action
+    SRC_TABLE = 1  # known (in_port, eth_src) pairs, misses go to the controller
+    DST_TABLE = 2  # eth_dst -> output port
+    FLOW_IDLE_TIMEOUT = 30
+    WRITE_WINDOW = 0.005  # seconds a FlowMod may wait to be batched
+    WRITE_BATCH = 64  # messages per batch before an early flush
+    SETUP_TTL = 1.0  # seconds a flow setup suppresses duplicate FlowMods, 0 disables
+    FLOW_TABLE_CAP = 200000  # tracked flow priorities before LRU eviction
+    FLOW_TTL = 3600  # fallback expiry for flows whose FlowRemoved was missed
+    MAC_TABLE_CAP = 50000  # learned MACs per switch
+    MAC_AGING = 300  # seconds before an unseen MAC is forgotten
+    ADMISSION = True  # queue packet-ins by class while the event queue is backed up
+    PACKET_IN_RATE = 500  # packet-ins per second per switch before backed-up LOW ones are shed
+    PACKET_IN_BURST = 1000
+    PACKET_IN_QUEUE = 4096  # classified packet-ins waiting for a worker
+    PACKET_IN_WORKERS = 4
+    PATH_INSTALL = True  # install the whole path on the first packet-in (reactive mode)
+    METERS = True  # police each class with an OpenFlow meter once the switch reports meter support
+    LINK_CAPACITY = 100000000  # bits/s, the port max-rate in setup_queues.sh
+    METER_FLOORS = {'MEDIUM': 20000000, 'LOW': 10000000}  # never meter a class below this
+    METER_BURST = 0.1  # seconds of traffic at the meter rate allowed in one burst
+    HEAVY_HITTERS = True  # move elephant flows of HEAVY_CLASS to DEMOTE_CLASS's queue
+    HEAVY_CLASS = 'MEDIUM'
+    DEMOTE_CLASS = 'LOW'
+    HEAVY_SHARE = 0.2  # share of the class's bytes per stats round that makes an elephant
+    HEAVY_COOL_SHARE = 0.05  # share below which a demoted flow gets its queue back
+    HEAVY_COUNTERS = 1000  # Space-Saving counters per flow dump
+    STAGES = ('parse', 'classify', 'learn', 'flow_mod', 'packet_out')  # timed packet-in stages
+    PACKET_LOG_BURST = 10  # per-packet debug records let through per second
+    PROFILE = os.environ.get('SDN_PROFILE', '')  # cprofile or pyinstrument, written on stop
+    PROFILE_OUT = os.environ.get('SDN_PROFILE_OUT', 'enhanced_traffic_controller.prof')
+    METRICS_PERIOD = 1  # seconds between packet-in rate and install latency samples
+    METRICS_CAPACITY = 3600  # samples kept per time series
+    WARM_RESTART = True  # snapshot learned state and check it against switch flow tables on connect
+    SNAPSHOT_FILE = 'enhanced_traffic_controller.snapshot'  # relative to the working directory
+    SNAPSHOT_PERIOD = 30  # seconds between snapshots, another one is written on stop
+
+    def __init__(self, *args, **kwargs):
+        super(EnhancedTrafficController, self).__init__(*args, **kwargs)
+        self.mac_to_port = {}  # dpid -> BoundedStore of mac -> port
+        self.datapaths = {}
+        self.writers = {}  # dpid -> FlowWriter
+        self.load_stats = {}  # holds weighted load per switch
+        self.class_stats = {}  # dpid -> {class: (packets, bytes, flows)}
+        self.class_stats_pending = {}  # dpid -> {xid: class} of aggregate requests
+        self.partial_loads = {}  # dpid -> load summed over multipart replies so far
+        self.flow_dumps = {}  # dpid -> xids of the HEAVY_CLASS and demoted flow dumps still open
+        self.elephants = heavy_hitters.ElephantDetector(self.HEAVY_COUNTERS, self.HEAVY_SHARE,
+                                                        self.HEAVY_COOL_SHARE,
+                                                        self.FLOW_TABLE_CAP)
+        # key: flow_store.flow_key(dpid, src, dst, in_port), value: priority
+        self.flow_priorities = flow_store.BoundedStore(self.FLOW_TABLE_CAP, self.FLOW_TTL)
+        self.restored_flows = {}  # dpid -> flow keys from the snapshot, until reconciled
+        self.reconciling = {}  # dpid -> xid of the flow dump read back on connect
+        self.reconciled = {}  # dpid -> flow keys found in that dump so far
+        self.pending_setups = {}  # key: (dpid, in_port, src, dst), value: expiry time
+        self.suppressed_setups = 0
+        self.hosts = path_table.HostTable(self.MAC_TABLE_CAP, self.MAC_AGING)
+        self.topology = path_table.Topology()  # filled from ryu.topology with --observe-links
+        self.sync = state_sync.StateSync(self.NODE_ID, self.SYNC_BIND, self.SYNC_PEERS,
+                                         listener=self.sync_update, holds_mac=self.holds_mac)
+        self.sync_threads = []
+        # Our side of switch migrations decided by the decision_controller.
+        self.executor = migration_executor.MigrationExecutor(self.HANDOVER_TIMEOUT,
+                                                             callback=self.handover_done,
+                                                             node_id=self.NODE_ID,
+                                                             send=self.send_handover)
+        self.stats = instrumentation.Instrumentation(self.STAGES)
+        self.packet_log = instrumentation.LogSampler(self.logger, 1.0, self.PACKET_LOG_BURST)
+        self.profiler = None
+        self.metrics = metrics_store.MetricsStore(self.METRICS_CAPACITY)
+        self.packet_in_totals = {}  # dpid -> packet-ins counted at the last metrics sample
+        self.installs_seen = {}  # dpid -> FlowMods completed at the last metrics sample
+        wsgi = kwargs.get('wsgi')
+        if wsgi is not None:
+            wsgi.register(metrics_store.MetricsController, {'store': self.metrics})
+        self.class_totals = {}  # dpid -> (packets, bytes, time) of the last aggregate round
+        self.poller = stats_scheduler.PollScheduler(self.STATS_PERIOD, self.STATS_MIN_PERIOD,
+                                                    self.STATS_MAX_PERIOD,
+                                                    self.MAX_OUTSTANDING_STATS)
+        self.rules = qos_rules.RuleLoader(self.RULES_FILE)
+        self.logger.info("Loaded %d classification rules from %s",
+                         self.rules.table.rule_count, self.RULES_FILE)
+        table = self.rules.table
+        levels = sorted(table.class_names, key=table.priority_value, reverse=True)
+        self.admission = admission.AdmissionQueue(levels, self.PACKET_IN_RATE,
+                                                  self.PACKET_IN_BURST, self.PACKET_IN_QUEUE)
+        self.meters = meter_control.MeterControl(levels, self.LINK_CAPACITY, self.METER_FLOORS)
+        self.metered = set()  # dpids whose meter features cover every class meter
+        self.packet_in_ready = hub.Semaphore(0)
+        self.workers = [hub.spawn(self._packet_in_worker) for _ in range(self.PACKET_IN_WORKERS)]
+        self.monitor_thread = hub.spawn(self._monitor)
+        self.poll_thread = hub.spawn(self._poll)
+        self.metrics_thread = hub.spawn(self._collect)
+        if self.WARM_RESTART:
+            self.load_snapshot()
+            self.snapshot_thread = hub.spawn(self._snapshot)
+
+    def start(self):
+        super(EnhancedTrafficController, self).start()
+        self.sync_threads = self.sync.start()
+        if self.PROFILE:
+            try:
+                self.profiler = instrumentation.Profiler(self.PROFILE)
+            except (ImportError, ValueError) as e:
+                self.logger.error("Profiling disabled: %s", e)
+
+    def stop(self):
+        if self.WARM_RESTART:
+            self.save_snapshot()
+        if self.profiler is not None:
+            self.profiler.stop(self.PROFILE_OUT)
+            self.logger.info("Wrote %s profile to %s", self.PROFILE, self.PROFILE_OUT)
+            self.profiler = None
+        self.sync.close()
+        for thread in self.sync_threads:
+            hub.kill(thread)
+        super(EnhancedTrafficController, self).stop()
+
+    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
+    def switch_features_handler(self, ev):
+        datapath = ev.msg.datapath
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if self.METERS:
+            # Flows only refer to the class meters once the switch says it has them.
+            self.metered.discard(datapath.id)
+            self.meters.remove(datapath.id)
+            datapath.send_msg(parser.OFPMeterFeaturesStatsRequest(datapath, 0))
+        if self.PROACTIVE:
+            self.install_qos_pipeline(datapath)
+            if self.WARM_RESTART:
+                self.read_back_flows(datapath)
+            return
+        match = parser.OFPMatch()
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+                                          ofproto.OFPCML_NO_BUFFER)]
+        self.add_flow(datapath, 0, match, actions)
+        self.logger.info(f"Switch {datapath.id}: Installed table-miss flow")
+        if self.WARM_RESTART:
+            self.read_back_flows(datapath)
+
+    def add_table_flow(self, datapath, table_id, priority, match, inst, idle_timeout=0,
+                       cookie=0):
+        parser = datapath.ofproto_parser
+        flags = datapath.ofproto.OFPFF_SEND_FLOW_REM if idle_timeout else 0
+        mod = parser.OFPFlowMod(datapath=datapath, table_id=table_id, cookie=cookie,
+                                priority=priority, match=match, flags=flags,
+                                instructions=inst, idle_timeout=idle_timeout)
+        self.writer_for(datapath).send(mod)
+
+    def install_qos_pipeline(self, datapath):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        table = self.rules.table
+        goto_src = parser.OFPInstructionGotoTable(self.SRC_TABLE)
+
+        # Table 0: pick the queue from the traffic type, then continue to L2.
+        entries = table.openflow_entries()
+        for priority, fields, name in entries:
+            match = parser.OFPMatch(eth_type=fast_parser.ETH_TYPE_IP, **fields)
+            inst = self.meter_instructions(datapath, name) + [
+                parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS,
+                                             [parser.OFPActionSetQueue(table.queue(name))]),
+                goto_src]
+            self.add_table_flow(datapath, self.QOS_TABLE, priority, match, inst,
+                                cookie=table.cookie(name))
+        inst = self.meter_instructions(datapath, table.default) + [
+            parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS,
+                                         [parser.OFPActionSetQueue(table.queue(table.default))]),
+            goto_src]
+        self.add_table_flow(datapath, self.QOS_TABLE, 0, parser.OFPMatch(), inst,
+                            cookie=table.cookie(table.default))
+
+        # Tables 1 and 2: unknown sources or destinations go to the controller.
+        to_controller = [parser.OFPInstructionActions(
+            ofproto.OFPIT_APPLY_ACTIONS,
+            [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)])]
+        self.add_table_flow(datapath, self.SRC_TABLE, 0, parser.OFPMatch(), to_controller)
+        self.add_table_flow(datapath, self.DST_TABLE, 0, parser.OFPMatch(), to_controller)
+        self.logger.info(f"Switch {datapath.id}: Installed QoS pipeline with {len(entries)} classification entries")
+
+    def reinstall_qos_table(self, datapath):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        mod = parser.OFPFlowMod(datapath=datapath, table_id=self.QOS_TABLE,
+                                command=ofproto.OFPFC_DELETE,
+                                out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+                                match=parser.OFPMatch())
+        self.writer_for(datapath).send(mod)
+        self.install_qos_pipeline(datapath)
+
+    def learn_host(self, datapath, in_port, mac):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionGotoTable(self.DST_TABLE)]
+        self.add_table_flow(datapath, self.SRC_TABLE, 1,
+                            parser.OFPMatch(in_port=in_port, eth_src=mac), inst,
+                            idle_timeout=self.FLOW_IDLE_TIMEOUT)
+        # Output goes into the action set so it runs after the queue from table 0.
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS,
+                                             [parser.OFPActionOutput(in_port)])]
+        self.add_table_flow(datapath, self.DST_TABLE, 1,
+                            parser.OFPMatch(eth_dst=mac), inst,
+                            idle_timeout=self.FLOW_IDLE_TIMEOUT)
+
+    def meter_instructions(self, datapath, name):
+        if datapath.id not in self.metered:
+            return []
+        # OVS wants the meter instruction ahead of the others.
+        return [datapath.ofproto_parser.OFPInstructionMeter(self.rules.table.meter_id(name))]
+
+    def send_meter_mods(self, datapath):
+        ofproto = datapath.ofproto
+        for name, rate, new in self.meters.changes(datapath.id):
+            self.send_meter_mod(datapath, name, rate,
+                                ofproto.OFPMC_ADD if new else ofproto.OFPMC_MODIFY)
+
+    def send_meter_mod(self, datapath, name, rate, command):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        meter_id = self.rules.table.meter_id(name)
+        kbps = max(1, int(rate / 1000))
+        band = parser.OFPMeterBandDrop(rate=kbps, burst_size=max(1, int(kbps * self.METER_BURST)))
+        mod = parser.OFPMeterMod(datapath, command=command,
+                                 flags=ofproto.OFPMF_KBPS | ofproto.OFPMF_BURST,
+                                 meter_id=meter_id, bands=[band])
+        self.writer_for(datapath).send(mod)
+        self.logger.info("DPID %s meter %s (%s) set to %d kbps", datapath.id, meter_id, name, kbps)
+
+    @set_ev_cls(ofp_event.EventOFPMeterFeaturesStatsReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def meter_features_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        ofproto = datapath.ofproto
+        meter_ids = len(self.rules.table.class_names)
+        if not self.METERS or datapath.id in self.metered:
+            return
+        if not any(f.max_meter >= meter_ids and f.band_types & (1 << ofproto.OFPMBT_DROP)
+                   for f in ev.msg.body):
+            self.logger.warning("Switch %s has no room for %d drop meters, classes are not policed",
+                                datapath.id, meter_ids)
+            return
+        self.metered.add(datapath.id)
+        self.send_meter_mods(datapath)
+        if self.PROACTIVE:
+            # Table 0 went in without meters while the reply was outstanding.
+            self.reinstall_qos_table(datapath)
+
+    def meters_rejected(self, datapath):
+        """Stop metering a switch that turned a meter or meter instruction down."""
+        if datapath.id not in self.metered:
+            return
+        self.metered.discard(datapath.id)
+        self.meters.remove(datapath.id)
+        self.logger.warning("Switch %s rejected a meter, classes are no longer policed",
+                            datapath.id)
+        if self.PROACTIVE:
+            self.reinstall_qos_table(datapath)
+
+    def meter_exists(self, datapath, data):
+        """Resend a meter ADD as MODIFY; `data` is the start of the rejected request.
+
+        A switch that reconnects still has its meters, while this controller
+        starts over with ADD for every class.
+        """
+        ofproto = datapath.ofproto
+        if len(data) < ofproto.OFP_HEADER_SIZE + struct.calcsize(ofproto.OFP_METER_MOD_PACK_STR):
+            return
+        command, _, meter_id = struct.unpack_from(ofproto.OFP_METER_MOD_PACK_STR, data,
+                                                  ofproto.OFP_HEADER_SIZE)
+        table = self.rules.table
+        if command != ofproto.OFPMC_ADD or not 0 < meter_id <= len(table.class_names):
+            return
+        name = table.class_names[meter_id - 1]
+        rate = self.meters.installed.get(datapath.id, {}).get(name)
+        if rate is not None:
+            self.send_meter_mod(datapath, name, rate, ofproto.OFPMC_MODIFY)
+
+    def publish_host(self, dpid, in_port, mac):
+        # The first switch to see a MAC is normally its edge switch; later
+        # sightings elsewhere arrive over trunk ports and are not published.
+        location = self.sync.mac_location(mac)
+        if location is None or location[0] == dpid:
+            self.sync.set_mac(mac, dpid, in_port)
+            self.sync.flush()
+
+    def holds_mac(self, mac, dpid, port):
+        # A published host stays shared while it is still learned where it was
+        # published; packet-ins that do not move it do not publish it again.
+        ports = self.mac_to_port.get(dpid)
+        return ports is not None and ports.get(state_sync.mac_str(mac)) == port
+
+    def writer_for(self, datapath):
+        writer = self.writers.get(datapath.id)
+        if writer is None or writer.datapath is not datapath:
+            writer = flow_writer.FlowWriter(datapath, self.WRITE_WINDOW, self.WRITE_BATCH)
+            self.writers[datapath.id] = writer
+        return writer
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def barrier_reply_handler(self, ev):
+        if self.executor.on_barrier_reply(ev.msg.datapath, ev.msg):
+            return
+        writer = self.writers.get(ev.msg.datapath.id)
+        if writer is not None:
+            writer.on_barrier_reply(ev.msg.xid)
+
+    def log_writer_stats(self):
+        for dpid, writer in self.writers.items():
+            latency = writer.latency_percentiles()
+            if latency:
+                self.logger.info("DPID %s flow install p50=%.2fms p90=%.2fms p99=%.2fms, %.1f msgs/write",
+                                 dpid, latency[50] * 1e3, latency[90] * 1e3,
+                                 latency[99] * 1e3, writer.messages_per_write())
+
+    def begin_setup(self, key):
+        """Return False if an identical flow setup is already in flight."""
+        if not self.SETUP_TTL:
+            return True
+        now = time.monotonic()
+        expiry = self.pending_setups.get(key)
+        if expiry is not None and expiry > now:
+            self.suppressed_setups += 1
+            return False
+        self.pending_setups[key] = now + self.SETUP_TTL
+        return True
+
+    def expire_setups(self):
+        now = time.monotonic()
+        expired = [key for key, expiry in self.pending_setups.items() if expiry <= now]
+        for key in expired:
+            del self.pending_setups[key]
+        if self.suppressed_setups:
+            self.logger.info("Suppressed %d duplicate flow setups, %d in flight",
+                             self.suppressed_setups, len(self.pending_setups))
+
+    def expire_tables(self):
+        self.hosts.expire()
+        expired = self.flow_priorities.expire()
+        for ports in self.mac_to_port.values():
+            ports.expire()
+        if expired or self.flow_priorities.evictions:
+            self.logger.info("Flow priorities: %d tracked, %d expired, %d evicted",
+                             len(self.flow_priorities), expired,
+                             self.flow_priorities.evictions)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        msg = ev.msg
+        if self.executor.on_flow_removed(msg.datapath, msg):
+            return
+        dpid = msg.datapath.id
+        match = msg.match
+        if self.PROACTIVE:
+            # A source entry timing out means the host went quiet on that port.
+            if msg.table_id == self.SRC_TABLE:
+                ports = self.mac_to_port.get(dpid)
+                src = match.get('eth_src')
+                if ports is not None and ports.get(src) == match.get('in_port'):
+                    ports.pop(src)
+            return
+        flow_key = flow_store.flow_key(dpid, match.get('eth_src'), match.get('eth_dst'),
+                                       match.get('in_port'))
+        self.flow_priorities.pop(flow_key)
+        self.elephants.forget(dpid, flow_key)
+
+    def priority_value(self, priority_str):
+        return self.rules.table.priority_value(priority_str)
+
+    def add_flow(self, datapath, priority, match, actions,
+                 buffer_id=None, idle_timeout=0, hard_timeout=0):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if isinstance(priority, str):
+            priority_val = self.priority_value(priority)
+            # The class rides along in the cookie so stats need no lookups.
+            cookie = self.rules.table.cookie(priority)
+        else:
+            priority_val = priority
+            cookie = 0
+
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                             actions)]
+        if isinstance(priority, str):
+            inst = self.meter_instructions(datapath, priority) + inst
+        # Ask for FlowRemoved so expired flows can be dropped from flow_priorities.
+        flags = ofproto.OFPFF_SEND_FLOW_REM
+        try:
+            if buffer_id:
+                mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
+                                        cookie=cookie, priority=priority_val, match=match,
+                                        instructions=inst, idle_timeout=idle_timeout,
+                                        hard_timeout=hard_timeout, flags=flags)
+            else:
+                mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie,
+                                        priority=priority_val, match=match, instructions=inst,
+                                        idle_timeout=idle_timeout, hard_timeout=hard_timeout,
+                                        flags=flags)
+            self.writer_for(datapath).send(mod)
+            dpid = datapath.id
+            src = match.get('eth_src')
+            dst = match.get('eth_dst')
+            in_port = match.get('in_port')
+            flow_key = flow_store.flow_key(dpid, src, dst, in_port)
+            self.flow_priorities[flow_key] = priority_val
+            self.packet_log.log(logging.DEBUG, "Flow queued on DPID %s with priority %s",
+                                dpid, priority_val)
+        except Exception as e:
+            self.logger.error(f"Failed to add flow: {e}")
+
+    def parse_packet(self, data):
+        if self.FAST_PATH:
+            headers = fast_parser.parse_headers(data)
+            if headers is not None:
+                return headers
+        return fast_parser.headers_from_packet(packet.Packet(data))
+
+    def classify_priority(self, pkt):
+        return self.classify_headers(fast_parser.headers_from_packet(pkt))
+
+    def classify_headers(self, headers):
+        return self.rules.table.classify(headers)
+
+    def priority_to_queue(self, priority):
+        return self.rules.table.queue(priority)
+
+    def reload_rules(self):
+        try:
+            if self.rules.reload_if_changed():
+                self.logger.info("Reloaded %d classification rules",
+                                 self.rules.table.rule_count)
+                if self.PROACTIVE:
+                    for dp in self.datapaths.values():
+                        self.reinstall_qos_table(dp)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error(f"Keeping previous rules, failed to reload {self.RULES_FILE}: {e}")
+
+    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    def packet_in_handler(self, ev):
+        msg = ev.msg
+        if not self.executor.should_handle(msg.datapath):
+            return  # the other controller owns this switch for now
+        dpid = msg.datapath.id
+        stats = self.stats
+        clock = stats.clock
+        start = clock()
+        headers = self.parse_packet(msg.data)
+        parsed = clock()
+        stats.record('parse', parsed - start)
+        if headers.ethertype == fast_parser.ETH_TYPE_LLDP:
+            return
+        priority = self.classify_headers(headers)
+        stats.record('classify', clock() - parsed)
+        stats.count(dpid, priority)
+        if not self.ADMISSION:
+            self.handle_packet_in(msg, headers, priority)
+            return
+        idle = not self.events.qsize() and not len(self.admission)
+        # Only shed while packet-ins are piling up, and never ARP or broadcasts,
+        # without which hosts cannot find each other.
+        shed = not idle and headers.ethertype != fast_parser.ETH_TYPE_ARP and \
+            headers.eth_dst != fast_parser.ETH_BROADCAST
+        if not self.admission.admit(dpid, priority, shed):
+            return  # LOW packet-in over the switch's rate while backed up, shed
+        elif idle:
+            # Nothing else is waiting, so there is nothing to reorder.
+            self.handle_packet_in(msg, headers, priority)
+        elif self.admission.push(priority, (msg, headers, priority)):
+            self.packet_in_ready.release()
+
+    def _packet_in_worker(self):
+        while True:
+            self.packet_in_ready.acquire()
+            item = self.admission.pop()
+            if item is not None:
+                try:
+                    self.handle_packet_in(*item)
+                except Exception:
+                    self.logger.exception("Packet-in handling failed")
+            # Let the event loop classify newer, possibly more urgent, packet-ins.
+            hub.sleep(0)
+
+    def log_instrumentation(self):
+        summary = self.stats.summary()
+        if not summary:
+            return
+        self.logger.info("Packet-in stages, count p50/p99/max us: %s", ', '.join(
+            "%s %d %.0f/%.0f/%.0f" % (name, n, p50 * 1e6, p99 * 1e6, worst * 1e6)
+            for name, (n, p50, p99, worst) in summary.items()))
+        self.logger.info("Packet-ins by class: %s", self.stats.class_totals())
+        self.stats.reset()
+
+    def log_admission_stats(self):
+        if any(self.admission.shed.values()):
+            self.logger.info("Packet-in admission: admitted %s, shed %s, queued %d",
+                             self.admission.admitted, self.admission.shed, len(self.admission))
+
+    def handle_packet_in(self, msg, headers, priority):
+        stats = self.stats
+        clock = stats.clock
+        start = clock()
+        datapath = msg.datapath
+        dpid = datapath.id
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        in_port = msg.match['in_port']
+        dst = headers.eth_dst
+        src = headers.eth_src
+
+        # Learn MAC address per datapath
+        ports = self.mac_to_port.get(dpid)
+        if ports is None:
+            ports = self.mac_table(dpid)
+        if ports.get(src) != in_port:
+            self.publish_host(dpid, in_port, src)
+        ports[src] = in_port
+        if not self.topology.is_link_port(dpid, in_port):
+            self.hosts.learn(src, dpid, in_port)
+
+        route = None
+        if self.PATH_INSTALL and not self.PROACTIVE:
+            route = self.route(dpid, dst)
+        if route is not None:
+            out_port = route[1][0]
+        else:
+            out_port = ports.get(dst, ofproto.OFPP_FLOOD)
+
+        queue_id = self.priority_to_queue(priority)
+        learned = clock()
+        stats.record('learn', learned - start)
+
+        self.packet_log.log(logging.DEBUG, "DPID %s Packet from %s to %s Priority=%s Queue=%s",
+                            dpid, src, dst, priority, queue_id)
+
+        actions = [parser.OFPActionSetQueue(queue_id),
+                   parser.OFPActionOutput(out_port)]
+
+        # Packets that arrive before the first FlowMod lands only get a PacketOut.
+        installed = False
+        if self.PROACTIVE:
+            if msg.table_id == self.SRC_TABLE and self.begin_setup((dpid, in_port, src, None)):
+                self.learn_host(datapath, in_port, src)
+                installed = True
+        elif route is not None:
+            if self.begin_setup((dpid, in_port, src, dst)):
+                self.install_path(datapath, in_port, src, dst, priority, queue_id, route)
+                installed = True
+        elif out_port != ofproto.OFPP_FLOOD and self.begin_setup((dpid, in_port, src, dst)):
+            match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
+            self.add_flow(datapath, priority, match, actions,
+                          buffer_id=msg.buffer_id, idle_timeout=self.FLOW_IDLE_TIMEOUT)
+            installed = True
+        sent = clock()
+        if installed:
+            stats.record('flow_mod', sent - learned)
+        data = None
+        if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+            data = msg.data
+        out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
+                                  in_port=in_port, actions=actions, data=data)
+        # Flushes any FlowMod queued above in the same write as the PacketOut.
+        self.writer_for(datapath).send(out, flush=True)
+        stats.record('packet_out', clock() - sent)
+
+    def mac_table(self, dpid):
+        ports = self.mac_to_port.get(dpid)
+        if ports is None:
+            ports = self.mac_to_port[dpid] = flow_store.BoundedStore(self.MAC_TABLE_CAP,
+                                                                     self.MAC_AGING)
+        return ports
+
+    def route(self, dpid, dst):
+        """Return (switches, output ports) from dpid to dst's edge port.
+
+        None if dst has not been seen on an edge port, the switches are not
+        connected, or a switch on the way is not connected to this controller.
+        """
+        location = self.hosts.get(dst)
+        if location is None:
+            return None
+        path = self.topology.path(dpid, location[0])
+        if path is None or any(hop not in self.datapaths for hop in path[1:]):
+            return None
+        out_ports = [self.topology.port(hop, nxt) for hop, nxt in zip(path, path[1:])]
+        out_ports.append(location[1])
+        return path, out_ports
+
+    def install_path(self, datapath, in_port, src, dst, priority, queue_id, route):
+        """Install src -> dst on every switch of `route`.
+
+        Downstream switches are programmed first and flushed right away, so
+        their entries are in place before the packet gets there. The first
+        hop's FlowMod goes out with the PacketOut.
+        """
+        path, out_ports = route
+        for i in range(len(path) - 1, -1, -1):
+            if i == 0:
+                hop_dp, hop_in = datapath, in_port
+            else:
+                hop_dp, hop_in = self.datapaths[path[i]], self.topology.port(path[i], path[i - 1])
+            parser = hop_dp.ofproto_parser
+            match = parser.OFPMatch(in_port=hop_in, eth_dst=dst, eth_src=src)
+            actions = [parser.OFPActionSetQueue(queue_id), parser.OFPActionOutput(out_ports[i])]
+            self.add_flow(hop_dp, priority, match, actions, idle_timeout=self.FLOW_IDLE_TIMEOUT)
+            if i:
+                self.writer_for(hop_dp).flush()
+
+    @set_ev_cls(topo_event.EventLinkAdd)
+    def link_add_handler(self, ev):
+        src, dst = ev.link.src, ev.link.dst
+        self.topology.add_link(src.dpid, src.port_no, dst.dpid, dst.port_no)
+        self.hosts.forget_port(src.dpid, src.port_no)
+        self.hosts.forget_port(dst.dpid, dst.port_no)
+
+    @set_ev_cls(topo_event.EventLinkDelete)
+    def link_delete_handler(self, ev):
+        src, dst = ev.link.src, ev.link.dst
+        self.topology.remove_link(src.dpid, src.port_no, dst.dpid, dst.port_no)
+
+    @set_ev_cls(topo_event.EventSwitchLeave)
+    def switch_leave_handler(self, ev):
+        self.topology.remove_switch(ev.switch.dp.id)
+        self.hosts.forget_switch(ev.switch.dp.id)
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, CONFIG_DISPATCHER, DEAD_DISPATCHER])
+    def _state_change_handler(self, ev):
+        datapath = ev.datapath
+        if ev.state == MAIN_DISPATCHER:
+            if datapath.id not in self.datapaths:
+                self.logger.info("Register datapath: %s", datapath.id)
+                self.datapaths[datapath.id] = datapath
+                self.poller.add(datapath.id)
+                # A switch the other controller is connected to already stays its own.
+                if self.sync.owner(datapath.id) is None:
+                    self.sync.set_owner(datapath.id, self.NODE_ID)
+                    self.sync.flush()
+                self.assign_role(datapath)
+        elif ev.state in (CONFIG_DISPATCHER, DEAD_DISPATCHER):
+            if ev.state == DEAD_DISPATCHER and self.datapaths.get(datapath.id) is not datapath:
+                return  # never registered, or an old connection closing after a reconnect
+            if datapath.id in self.datapaths:
+                del self.datapaths[datapath.id]
+                # Peers would otherwise plan with a switch that is no longer here.
+                self.sync.retract_load(datapath.id)
+                self.sync.retract_owner(datapath.id, self.NODE_ID)
+                self.sync.flush()
+            self.writers.pop(datapath.id, None)
+            self.poller.remove(datapath.id)
+            self.admission.remove(datapath.id)
+            self.meters.remove(datapath.id)
+            self.metered.discard(datapath.id)
+            self.elephants.remove(datapath.id)
+            self.flow_dumps.pop(datapath.id, None)
+            self.installs_seen.pop(datapath.id, None)
+            self.reconciling.pop(datapath.id, None)
+            self.reconciled.pop(datapath.id, None)
+
+    @set_ev_cls(ofp_event.EventOFPRoleReply, MAIN_DISPATCHER)
+    def role_reply_handler(self, ev):
+        self.executor.on_role_reply(ev.msg.datapath, ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def error_msg_handler(self, ev):
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        if self.executor.on_error(msg.datapath, msg):
+            self.logger.warning("Role handover of switch %s failed: error type %d code %d",
+                                msg.datapath.id, msg.type, msg.code)
+        elif msg.type == ofproto.OFPET_METER_MOD_FAILED and msg.code == ofproto.OFPMMFC_METER_EXISTS:
+            self.meter_exists(msg.datapath, msg.data)
+        elif msg.type == ofproto.OFPET_METER_MOD_FAILED or (
+                msg.type == ofproto.OFPET_BAD_INSTRUCTION and
+                msg.code in (ofproto.OFPBIC_UNSUP_INST, ofproto.OFPBIC_UNKNOWN_INST)):
+            # Reactive flows the switch refused come back as packet-ins and
+            # are set up again without a meter.
+            self.meters_rejected(msg.datapath)
+
+    def sync_update(self, kind, key, record):
+        if kind == 'handover':
+            self.executor.on_message(key, *record, datapath=self.datapaths.get(key))
+        elif kind == 'owner' and key in self.datapaths:
+            if record is None:
+                # The owner let go of the switch or went away, and we are still connected.
+                self.sync.set_owner(key, self.NODE_ID)
+                self.sync.flush()
+            self.assign_role(self.datapaths[key])
+
+    def assign_role(self, datapath):
+        """MASTER of the switches this controller owns, SLAVE of the others'."""
+        owner = self.sync.owner(datapath.id)
+        self.executor.assign_role(datapath, owner is None or owner == self.NODE_ID)
+
+    def send_handover(self, dpid, handover_id, src, dst, message, generation):
+        self.sync.send_handover(dpid, handover_id, src, dst, message, generation)
+        self.sync.flush()
+
+    def handover_done(self, handover):
+        owner = handover.dst if handover.ok else handover.src
+        self.sync.set_owner(handover.dpid, owner)
+        self.sync.flush()
+        self.logger.info("Handover of switch %s from controller %s to %s %s",
+                         handover.dpid, handover.src, handover.dst,
+                         "done" if handover.ok else "failed")
+
+    def _monitor(self):
+        while True:
+            self.executor.expire()
+            # Settles two controllers that claimed a switch at the same time.
+            for datapath in list(self.datapaths.values()):
+                self.assign_role(datapath)
+            self.reload_rules()
+            self.log_writer_stats()
+            self.log_admission_stats()
+            self.log_instrumentation()
+            self.expire_setups()
+            self.expire_tables()
+            hub.sleep(self.STATS_PERIOD)
+
+    def _collect(self):
+        last = time.monotonic()
+        while True:
+            hub.sleep(self.METRICS_PERIOD)
+            now = time.monotonic()
+            self.record_metrics(now - last)
+            last = now
+
+    def record_metrics(self, elapsed):
+        totals = {}
+        for (dpid, _), n in self.stats.counters.items():
+            totals[dpid] = totals.get(dpid, 0) + n
+        for dpid, total in totals.items():
+            last = self.packet_in_totals.get(dpid)
+            if last is not None and elapsed > 0:
+                self.metrics.record('packet_in_rate', dpid, (total - last) / elapsed)
+        self.packet_in_totals = totals
+        for dpid, writer in self.writers.items():
+            new = writer.completed - self.installs_seen.get(dpid, 0)
+            self.installs_seen[dpid] = writer.completed
+            if new > 0:
+                recent = sorted(list(writer.latencies)[-new:])
+                self.metrics.record('install_p50_ms', dpid, recent[len(recent) // 2] * 1e3)
+                self.metrics.record('install_p99_ms', dpid,
+                                    recent[int(len(recent) * 0.99)] * 1e3)
+
+    def _snapshot(self):
+        while True:
+            hub.sleep(self.SNAPSHOT_PERIOD)
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        state = {
+            'node': self.NODE_ID,
+            'macs': [[dpid, snapshot.pack_store(ports, state_sync.mac_bytes)]
+                     for dpid, ports in self.mac_to_port.items()],
+            'flows': snapshot.pack_store(self.flow_priorities, flow_store.key_to_bytes),
+        }
+        try:
+            size = snapshot.save(self.SNAPSHOT_FILE, state)
+        except OSError as e:
+            self.logger.error(f"Failed to write snapshot {self.SNAPSHOT_FILE}: {e}")
+            return
+        self.logger.debug("Wrote %d byte snapshot to %s", size, self.SNAPSHOT_FILE)
+
+    def load_snapshot(self):
+        try:
+            state = snapshot.load(self.SNAPSHOT_FILE)
+            if state is None:
+                return
+            age = state['saved']
+            macs = 0
+            for dpid, packed in state['macs']:
+                macs += snapshot.unpack_store(self.mac_table(dpid), packed, 6,
+                                              state_sync.mac_str, age)
+            flows = snapshot.unpack_store(self.flow_priorities, state['flows'],
+                                          flow_store.KEY_BYTES, flow_store.key_from_bytes, age)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.error(f"Starting without learned state, cannot restore {self.SNAPSHOT_FILE}: {e}")
+            self.mac_to_port = {}
+            self.flow_priorities = flow_store.BoundedStore(self.FLOW_TABLE_CAP, self.FLOW_TTL)
+            return
+        for key in self.flow_priorities.entries:
+            self.restored_flows.setdefault(flow_store.key_dpid(key), set()).add(key)
+        self.logger.info("Restored %d MACs and %d flows from a snapshot taken %.0fs ago",
+                         macs, flows, age)
+
+    def read_back_flows(self, datapath):
+        """Ask a connecting switch for its flow table, to reconcile with what was restored."""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        # The table-miss and pipeline FlowMods go first, so the dump includes them.
+        self.writer_for(datapath).flush()
+        req = parser.OFPFlowStatsRequest(datapath, 0, ofproto.OFPTT_ALL, ofproto.OFPP_ANY,
+                                         ofproto.OFPG_ANY, 0, 0, parser.OFPMatch())
+        self.reconciling[datapath.id] = datapath.set_xid(req)
+        self.reconciled[datapath.id] = set()
+        datapath.send_msg(req)
+
+    def reconcile(self, msg):
+        """Take what a switch's installed flows say over the restored state.
+
+        Source MACs are learned on their in_port and destinations on their
+        output port. Flows missing from flow_priorities are tracked again,
+        and restored ones the switch no longer has are dropped.
+        """
+        datapath = msg.datapath
+        dpid = datapath.id
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        ports = self.mac_table(dpid)
+        seen = self.reconciled[dpid]
+        for stat in msg.body:
+            match = stat.match
+            src = match.get('eth_src')
+            dst = match.get('eth_dst')
+            in_port = match.get('in_port')
+            if src is not None and in_port is not None:
+                ports[src] = in_port
+            if dst is not None:
+                for instruction in stat.instructions:
+                    for action in getattr(instruction, 'actions', ()):
+                        if (isinstance(action, parser.OFPActionOutput) and
+                                action.port <= ofproto.OFPP_MAX):
+                            ports[dst] = action.port
+            if not self.PROACTIVE and stat.priority and None not in (src, dst, in_port):
+                key = flow_store.flow_key(dpid, src, dst, in_port)
+                seen.add(key)
+                if key not in self.flow_priorities:
+                    self.flow_priorities[key] = stat.priority
+        if msg.flags & ofproto.OFPMPF_REPLY_MORE:
+            return
+        del self.reconciling[dpid]
+        del self.reconciled[dpid]
+        stale = self.restored_flows.pop(dpid, set()) - seen
+        for key in stale:
+            self.flow_priorities.pop(key)
+        self.logger.info("DPID %s reconciled: %d flows installed, %d restored flows gone, "
+                         "%d MACs known", dpid, len(seen), len(stale), len(ports))
+
+    def _poll(self):
+        while True:
+            for dpid in self.poller.due():
+                datapath = self.datapaths.get(dpid)
+                if datapath is None:
+                    self.poller.remove(dpid)
+                else:
+                    self.request_stats(datapath)
+            hub.sleep(self.poller.sleep_time())
+
+    def request_stats(self, datapath):
+        self.logger.debug("Requesting stats from datapath %s", datapath.id)
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        # Every packet crosses the QoS table once; the L2 tables would double count.
+        table_id = self.QOS_TABLE if self.PROACTIVE else ofproto.OFPTT_ALL
+        table = self.rules.table
+        pending = self.class_stats_pending[datapath.id] = {}
+        self.class_stats[datapath.id] = {}
+        for name in table.class_names:
+            cookie, cookie_mask = table.class_cookie(name)
+            req = parser.OFPAggregateStatsRequest(datapath, 0, table_id, ofproto.OFPP_ANY,
+                                                  ofproto.OFPG_ANY, cookie, cookie_mask,
+                                                  parser.OFPMatch())
+            pending[datapath.set_xid(req)] = name
+            datapath.send_msg(req)
+        # Proactive flows are per class, not per flow, so there is nothing to demote.
+        if self.HEAVY_HITTERS and not self.PROACTIVE:
+            # Demoted flows are in DEMOTE_CLASS now and are dumped to see if they cooled down.
+            dumps = self.flow_dumps[datapath.id] = []
+            for cookie, cookie_mask in (table.class_cookie(self.HEAVY_CLASS),
+                                        table.demoted_cookie(self.DEMOTE_CLASS)):
+                req = parser.OFPFlowStatsRequest(datapath, 0, ofproto.OFPTT_ALL,
+                                                 ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+                                                 cookie, cookie_mask, parser.OFPMatch())
+                dumps.append(datapath.set_xid(req))
+                datapath.send_msg(req)
+            self.elephants.begin(datapath.id)
+
+    @set_ev_cls(ofp_event.EventOFPAggregateStatsReply, MAIN_DISPATCHER)
+    def aggregate_stats_reply_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        pending = self.class_stats_pending.get(dpid)
+        if not pending or msg.xid not in pending:
+            return
+        name = pending.pop(msg.xid)
+        stats = self.class_stats[dpid]
+        stats[name] = (msg.body.packet_count, msg.body.byte_count, msg.body.flow_count)
+        if pending:
+            return
+        table = self.rules.table
+        total_load = 0
+        for name, (packets, _, _) in stats.items():
+            total_load += packets * table.class_weight(name)
+        self.load_stats[dpid] = total_load
+        self.logger.info(f"DPID {dpid} Load: {total_load}")
+        pps = self.publish_load(dpid, stats)
+        self.poller.done(dpid, pps)
+        self.metrics.record('load', dpid, total_load)
+        if pps is not None:
+            self.metrics.record('pps', dpid, pps)
+        # Per-queue packets of the flows still installed, via the class -> queue map.
+        for name, (packets, _, _) in stats.items():
+            self.metrics.record('queue_packets', '%s/%s' % (dpid, table.queue(name)), packets)
+        if dpid in self.metered and self.meters.update(dpid, dict((n, s[1]) for n, s in stats.items())):
+            self.send_meter_mods(msg.datapath)
+
+    def publish_load(self, dpid, stats):
+        """Share the switch's packet/byte rates; returns the packet rate or None."""
+        packets = sum(s[0] for s in stats.values())
+        nbytes = sum(s[1] for s in stats.values())
+        now = time.monotonic()
+        last = self.class_totals.get(dpid)
+        self.class_totals[dpid] = (packets, nbytes, now)
+        # Counters drop when flows expire; skip that round rather than report a negative rate.
+        if last is None or now <= last[2] or packets < last[0] or nbytes < last[1]:
+            return None
+        elapsed = now - last[2]
+        pps = (packets - last[0]) / elapsed
+        self.sync.set_load(dpid, pps, (nbytes - last[1]) / elapsed)
+        self.sync.flush()
+        return pps
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        if msg.xid in self.flow_dumps.get(dpid, ()):
+            self.track_elephants(msg)
+            return
+        if dpid in self.reconciling and self.reconciling[dpid] == msg.xid:
+            self.reconcile(msg)
+            return
+        cookie_weight = qos_rules.cookie_weight
+        total_load = self.partial_loads.pop(dpid, 0)
+        for stat in msg.body:
+            total_load += stat.packet_count * cookie_weight(stat.cookie)
+        if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            self.partial_loads[dpid] = total_load
+            return
+        self.load_stats[dpid] = total_load
+        self.poller.done(dpid)
+        self.logger.info(f"DPID {dpid} Load: {total_load}")
+
+    def track_elephants(self, msg):
+        datapath = msg.datapath
+        dpid = datapath.id
+        observe = self.elephants.observe
+        flow_key = flow_store.flow_key
+        for stat in msg.body:
+            match = stat.match
+            key = flow_key(dpid, match.get('eth_src'), match.get('eth_dst'), match.get('in_port'))
+            observe(dpid, key, stat.byte_count, stat)
+        if msg.flags & datapath.ofproto.OFPMPF_REPLY_MORE:
+            return
+        dumps = self.flow_dumps[dpid]
+        dumps.remove(msg.xid)
+        if dumps:
+            return
+        del self.flow_dumps[dpid]
+        demote, promote = self.elephants.finish(dpid)
+        for _, stat in demote:
+            self.requeue(datapath, stat, self.DEMOTE_CLASS, True)
+        for _, stat in promote:
+            self.requeue(datapath, stat, self.HEAVY_CLASS, False)
+
+    def requeue(self, datapath, stat, name, demoted):
+        """Rewrite a flow from a stats reply to use class `name`'s queue and meter.
+
+        The cookie is changed to class `name` as well, so the class byte
+        counts and the meters sized from them follow the flow. MODIFY cannot
+        change a cookie, so the flow is replaced with an ADD.
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        table = self.rules.table
+        queue_id = table.queue(name)
+        inst = []
+        for instruction in stat.instructions:
+            if isinstance(instruction, parser.OFPInstructionMeter):
+                inst.extend(self.meter_instructions(datapath, name))
+            elif isinstance(instruction, parser.OFPInstructionActions):
+                actions = [parser.OFPActionSetQueue(queue_id)
+                           if isinstance(a, parser.OFPActionSetQueue) else a
+                           for a in instruction.actions]
+                inst.append(parser.OFPInstructionActions(instruction.type, actions))
+            else:
+                inst.append(instruction)
+        cookie = table.cookie(name) | (qos_rules.COOKIE_DEMOTED if demoted else 0)
+        mod = parser.OFPFlowMod(datapath=datapath, table_id=stat.table_id, cookie=cookie,
+                                command=ofproto.OFPFC_ADD, priority=stat.priority,
+                                match=stat.match, instructions=inst,
+                                idle_timeout=stat.idle_timeout, hard_timeout=stat.hard_timeout,
+                                flags=ofproto.OFPFF_SEND_FLOW_REM)
+        self.writer_for(datapath).send(mod)
+        self.logger.info("DPID %s %s flow %s -> %s to queue %s", datapath.id,
+                         'demoted' if demoted else 'promoted', stat.match.get('eth_src'),
+                         stat.match.get('eth_dst'), queue_id)
+
+if __name__ == "__main__":
+    from ryu.cmd import manager
+    manager.main()
@@ -0,0 +1,90 @@
+import socket
+import struct
+from collections import namedtuple
+
+from ryu.lib.packet import ethernet, ipv4, tcp, udp
+
+ETH_TYPE_IP = 0x0800
+ETH_TYPE_ARP = 0x0806
+ETH_TYPE_LLDP = 0x88cc
+ETH_BROADCAST = 'ff:ff:ff:ff:ff:ff'
+VLAN_TYPES = (0x8100, 0x88a8)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+# Only the fields the controller actually needs from a packet-in. IPv4
+# addresses are kept as integers so they can be used for prefix lookups.
+Headers = namedtuple('Headers', ['eth_dst', 'eth_src', 'ethertype', 'ip_proto',
+                                 'ip_src', 'ip_dst', 'dscp', 'src_port', 'dst_port'])
+
+_ipv4_hdr = struct.Struct('!BB6xBB2x4s4s')
+_ports = struct.Struct('!HH')
+
+
+def parse_headers(data):
+    """Decode Ethernet/VLAN, IPv4 and TCP/UDP ports from raw packet bytes.
+
+    Returns None when the frame is truncated or malformed so the caller can
+    fall back to the full Ryu parser.
+    """
+    mv = memoryview(data)
+    size = len(mv)
+    if size < 14:
+        return None
+    ethertype = (mv[12] << 8) | mv[13]
+    offset = 14
+    while ethertype in VLAN_TYPES:
+        if size < offset + 4:
+            return None
+        ethertype = (mv[offset + 2] << 8) | mv[offset + 3]
+        offset += 4
+    eth_dst = mv[0:6].hex(':')
+    eth_src = mv[6:12].hex(':')
+    if ethertype != ETH_TYPE_IP:
+        return Headers(eth_dst, eth_src, ethertype, None, None, None, 0, None, None)
+
+    if size < offset + 20:
+        return None
+    ver_ihl, tos, _, proto, src, dst = _ipv4_hdr.unpack_from(mv, offset)
+    ihl = (ver_ihl & 0x0f) * 4
+    if ver_ihl >> 4 != 4 or ihl < 20:
+        return None
+    ip_src = int.from_bytes(src, 'big')
+    ip_dst = int.from_bytes(dst, 'big')
+    dscp = tos >> 2
+
+    src_port = dst_port = None
+    frag_offset = ((mv[offset + 6] & 0x1f) << 8) | mv[offset + 7]
+    if proto in (IPPROTO_TCP, IPPROTO_UDP) and frag_offset == 0:
+        l4 = offset + ihl
+        if size < l4 + 4:
+            return None
+        src_port, dst_port = _ports.unpack_from(mv, l4)
+    return Headers(eth_dst, eth_src, ethertype, proto, ip_src, ip_dst, dscp,
+                   src_port, dst_port)
+
+
+def _ip_to_int(addr):
+    return struct.unpack('!I', socket.inet_aton(addr))[0]
+
+
+def headers_from_packet(pkt):
+    """Build the same Headers record from a fully parsed Ryu packet."""
+    eth = pkt.get_protocol(ethernet.ethernet)
+    ip_pkt = pkt.get_protocol(ipv4.ipv4)
+    if not ip_pkt:
+        return Headers(eth.dst, eth.src, eth.ethertype, None, None, None, 0,
+                       None, None)
+    src_port = dst_port = None
+    if ip_pkt.proto == IPPROTO_TCP:
+        l4 = pkt.get_protocol(tcp.tcp)
+    elif ip_pkt.proto == IPPROTO_UDP:
+        l4 = pkt.get_protocol(udp.udp)
+    else:
+        l4 = None
+    if l4:
+        src_port, dst_port = l4.src_port, l4.dst_port
+    return Headers(eth.dst, eth.src, ETH_TYPE_IP, ip_pkt.proto,
+                   _ip_to_int(ip_pkt.src), _ip_to_int(ip_pkt.dst),
+                   ip_pkt.tos >> 2, src_port, dst_port)
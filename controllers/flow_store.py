@@ -0,0 +1,107 @@
+import time
+
+VALUE_BITS = 32
+VALUE_MASK = (1 << VALUE_BITS) - 1
+KEY_BYTES = 24  # flow_key() is at most 64 + 48 + 48 + 32 bits
+
+
+def mac_to_int(mac):
+    return int(mac.replace(':', ''), 16) if mac else 0
+
+
+def flow_key(dpid, src, dst, in_port):
+    """Pack (dpid, eth_src, eth_dst, in_port) into a single integer."""
+    key = (dpid or 0) << 48 | mac_to_int(src)
+    key = key << 48 | mac_to_int(dst)
+    return key << 32 | (in_port or 0)
+
+
+def key_dpid(key):
+    return key >> 128
+
+
+def key_to_bytes(key):
+    return key.to_bytes(KEY_BYTES, 'big')
+
+
+def key_from_bytes(raw):
+    return int.from_bytes(raw, 'big')
+
+
+class BoundedStore(object):
+    """Dict-like map with a size cap and a TTL fallback.
+
+    Values must fit in VALUE_BITS bits; each entry is stored as one integer
+    holding the write time (whole seconds) above the value. Entries are kept
+    in write order, so the oldest entry is always first and both TTL expiry
+    and LRU eviction only look at the front of the dict.
+    """
+    __slots__ = ('entries', 'max_entries', 'ttl', 'clock', 'evictions', 'expirations')
+
+    def __init__(self, max_entries, ttl, clock=time.monotonic):
+        self.entries = {}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __setitem__(self, key, value):
+        entries = self.entries
+        entries.pop(key, None)
+        entries[key] = int(self.clock()) << VALUE_BITS | value
+        if len(entries) > self.max_entries:
+            del entries[next(iter(entries))]
+            self.evictions += 1
+
+    def __getitem__(self, key):
+        return self.entries[key] & VALUE_MASK
+
+    def get(self, key, default=None):
+        packed = self.entries.get(key)
+        return default if packed is None else packed & VALUE_MASK
+
+    def pop(self, key, default=None):
+        packed = self.entries.pop(key, None)
+        return default if packed is None else packed & VALUE_MASK
+
+    def expire(self):
+        """Drop entries not written for `ttl` seconds; returns how many."""
+        cutoff = int(self.clock()) - self.ttl
+        expired = []
+        for key, packed in self.entries.items():
+            if packed >> VALUE_BITS > cutoff:
+                break
+            expired.append(key)
+        for key in expired:
+            del self.entries[key]
+        self.expirations += len(expired)
+        return len(expired)
+
+    def dump(self):
+        """(keys, values, ages in seconds), oldest first."""
+        now = int(self.clock())
+        packed = list(self.entries.values())
+        return (list(self.entries), [p & VALUE_MASK for p in packed],
+                [now - (p >> VALUE_BITS) for p in packed])
+
+    def restore(self, keys, values, ages):
+        """Add entries from dump(), e.g. of another process, to an empty store.
+
+        Entries at least `ttl` seconds old are left out.
+        """
+        now = int(self.clock())
+        entries = self.entries
+        for key, value, age in zip(keys, values, ages):
+            if age < self.ttl:
+                entries.pop(key, None)
+                entries[key] = max(now - age, 0) << VALUE_BITS | value
+        while len(entries) > self.max_entries:
+            del entries[next(iter(entries))]
+            self.evictions += 1
@@ -0,0 +1,100 @@
+import collections
+import time
+
+from ryu.lib import hub
+
+
+class FlowWriter(object):
+    """Per-datapath send queue that batches FlowMods behind a barrier.
+
+    Messages queued with send() are held for up to `window` seconds or until
+    `max_batch` messages are waiting, then written to the switch in a single
+    socket write; batches carrying FlowMods end with an OFPBarrierRequest.
+    When the matching barrier reply arrives every message in the batch is
+    known to be applied, so the install latency is recorded and the batch
+    callbacks are fired.
+    """
+
+    def __init__(self, datapath, window=0.005, max_batch=64, samples=4096):
+        self.datapath = datapath
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []          # messages waiting for the next flush
+        self.pending_times = []    # enqueue time of each pending FlowMod
+        self.pending_callbacks = []
+        self.generation = 0        # bumped on flush so stale timers are ignored
+        self.timer_armed = False
+        self.inflight = {}         # barrier xid -> (enqueue times, callbacks)
+        self.latencies = collections.deque(maxlen=samples)
+        self.writes = 0
+        self.messages = 0
+        self.completed = 0         # FlowMods confirmed by a barrier reply
+
+    def send(self, msg, callback=None, flush=False):
+        self.pending.append(msg)
+        if isinstance(msg, self.datapath.ofproto_parser.OFPFlowMod):
+            self.pending_times.append(time.monotonic())
+        if callback is not None:
+            self.pending_callbacks.append(callback)
+        if flush or len(self.pending) >= self.max_batch:
+            self.flush()
+        elif not self.timer_armed:
+            self.timer_armed = True
+            hub.spawn_after(self.window, self._on_timer, self.generation)
+
+    def _on_timer(self, generation):
+        if generation == self.generation:
+            self.flush()
+
+    def flush(self):
+        self.generation += 1
+        self.timer_armed = False
+        if not self.pending:
+            return
+        datapath = self.datapath
+        msgs = self.pending
+        # A batch of PacketOuts alone needs no completion tracking.
+        if self.pending_times or self.pending_callbacks:
+            barrier = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+            msgs.append(barrier)
+        else:
+            barrier = None
+        bufs = []
+        for msg in msgs:
+            if msg.xid is None:
+                datapath.set_xid(msg)
+            msg.serialize()
+            bufs.append(msg.buf)
+        if barrier is not None:
+            self.inflight[barrier.xid] = (self.pending_times, self.pending_callbacks)
+        self.pending = []
+        self.pending_times = []
+        self.pending_callbacks = []
+        self.writes += 1
+        self.messages += len(msgs)
+        datapath.send(b''.join(bufs))
+
+    def on_barrier_reply(self, xid):
+        """Complete the batch fenced by barrier `xid`; False if it is not ours."""
+        batch = self.inflight.pop(xid, None)
+        if batch is None:
+            return False
+        times, callbacks = batch
+        now = time.monotonic()
+        self.latencies.extend(now - t for t in times)
+        self.completed += len(times)
+        for callback in callbacks:
+            callback(self.datapath)
+        return True
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        """Return {percentile: seconds} over the recent install latencies."""
+        if not self.latencies:
+            return {}
+        ordered = sorted(self.latencies)
+        last = len(ordered) - 1
+        return dict((p, ordered[min(last, int(round(p / 100.0 * last)))])
+                    for p in percentiles)
+
+    def messages_per_write(self):
+        return float(self.messages) / self.writes if self.writes else 0.0
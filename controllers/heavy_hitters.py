@@ -0,0 +1,140 @@
+import heapq
+
+
+class SpaceSaving(object):
+    """Weighted Space-Saving summary (Metwally et al.) with `k` counters.
+
+    Every key whose true weight exceeds total / k is guaranteed to hold a
+    counter. A counter's count overestimates the key's weight by at most
+    its error, which is the count of the counter it replaced. The smallest
+    counter is found through a heap with lazy deletion; heap entries go
+    stale when a count grows and are skipped when popped.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.counters = {}  # key -> [count, error, payload]
+        self.heap = []      # (count, seq, key), possibly stale
+        self.seq = 0
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counters)
+
+    def add(self, key, weight, payload=None):
+        self.total += weight
+        counters = self.counters
+        counter = counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+            counter[2] = payload
+        elif len(counters) < self.k:
+            counter = counters[key] = [weight, 0, payload]
+        else:
+            heap = self.heap
+            while True:
+                count, _, victim = heapq.heappop(heap)
+                old = counters.get(victim)
+                if old is not None and old[0] == count:
+                    break
+            del counters[victim]
+            counter = counters[key] = [count + weight, count, payload]
+        self.seq += 1
+        heapq.heappush(self.heap, (counter[0], self.seq, key))
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(c[0], i, key) for i, (key, c) in enumerate(counters.items())]
+            heapq.heapify(self.heap)
+
+    def top(self, n=None):
+        """[(key, count, error, payload)] by decreasing count."""
+        items = sorted(self.counters.items(), key=lambda item: -item[1][0])
+        return [(key, c[0], c[1], c[2]) for key, c in items[:n]]
+
+    def heavy(self, threshold):
+        """Keys whose weight is certainly at least `threshold`."""
+        return [entry for entry in self.top() if entry[1] - entry[2] >= threshold]
+
+
+class ElephantDetector(object):
+    """Finds flows taking more than a share of a switch's bytes per round.
+
+    A round is one flow stats dump of a datapath. Per-flow byte deltas
+    against the previous dump are fed into a SpaceSaving summary, so memory
+    per round is bounded by `counters` no matter how many flows the switch
+    holds. A flow is demoted once its guaranteed share of the round's bytes
+    reaches `demote_share`, and promoted again when its share drops below
+    `promote_share`. A demoted flow missing from the dump is gone from the
+    switch and is just forgotten. The previous byte counter
+    of up to `max_flows` flows is kept to take deltas.
+    """
+
+    def __init__(self, counters=1000, demote_share=0.2, promote_share=0.05,
+                 max_flows=200000):
+        self.counters = counters
+        self.demote_share = demote_share
+        self.promote_share = promote_share
+        self.max_flows = max_flows
+        self.last = {}      # flow key -> byte count at the previous dump, oldest first
+        self.rounds = {}    # dpid -> (SpaceSaving, {demoted flow key: (bytes, payload) this round})
+        self.demoted = {}   # dpid -> {demoted flow key: payload when it was demoted}
+        self.demotions = 0
+        self.promotions = 0
+
+    def remove(self, dpid):
+        self.rounds.pop(dpid, None)
+        self.demoted.pop(dpid, None)
+
+    def forget(self, dpid, key):
+        """Drop a flow that was removed from the switch."""
+        self.last.pop(key, None)
+        demoted = self.demoted.get(dpid)
+        if demoted is not None:
+            demoted.pop(key, None)
+
+    def begin(self, dpid):
+        self.rounds[dpid] = (SpaceSaving(self.counters), {})
+
+    def observe(self, dpid, key, byte_count, payload=None):
+        last = self.last
+        previous = last.pop(key, 0)
+        last[key] = byte_count
+        if len(last) > self.max_flows:
+            del last[next(iter(last))]
+        current = self.rounds.get(dpid)
+        if current is None:
+            return
+        # A counter below the last one means the flow was reinstalled.
+        delta = byte_count - previous if byte_count >= previous else byte_count
+        summary, demoted_bytes = current
+        if key in self.demoted.get(dpid, ()):
+            demoted_bytes[key] = (delta, payload)
+            summary.total += delta
+        elif delta:
+            summary.add(key, delta, payload)
+
+    def finish(self, dpid):
+        """End the round; returns the [(key, payload)] to demote and to promote.
+
+        Promoted flows come with their payload from this round.
+        """
+        current = self.rounds.pop(dpid, None)
+        if current is None:
+            return [], []
+        summary, demoted_bytes = current
+        demoted = self.demoted.setdefault(dpid, {})
+        total = summary.total
+        promote = [(key, payload) for key, (nbytes, payload) in demoted_bytes.items()
+                   if nbytes < self.promote_share * total]
+        for key in list(demoted):
+            if key not in demoted_bytes:
+                del demoted[key]
+        for key, _ in promote:
+            del demoted[key]
+        demote = []
+        if total:
+            for key, _, _, payload in summary.heavy(self.demote_share * total):
+                demoted[key] = payload
+                demote.append((key, payload))
+        self.demotions += len(demote)
+        self.promotions += len(promote)
+        return demote, promote
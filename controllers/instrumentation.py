@@ -0,0 +1,167 @@
+"""Low-overhead measurements for the packet-in path.
+
+Instrumentation keeps one Histogram per handler stage and plain counters
+per (dpid, class). LogSampler rate-limits per-packet log lines, so nothing
+is formatted while the level is disabled or the budget is used up. Profiler
+wraps cProfile or pyinstrument for the SDN_PROFILE switch.
+"""
+import collections
+import math
+import time
+
+
+class Histogram(object):
+    """Log-linear buckets in the style of HdrHistogram.
+
+    Every power of two between `lowest` and `highest` is split into
+    `sub_buckets` equal buckets, so a percentile is off by at most
+    1/sub_buckets relative. Values outside the range go to the first or
+    last bucket; `max` is exact.
+    """
+    __slots__ = ('sub_buckets', 'min_exp', 'max_exp', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, lowest=1e-6, highest=10.0, sub_buckets=16):
+        self.sub_buckets = sub_buckets
+        self.min_exp = math.frexp(lowest)[1]
+        self.max_exp = math.frexp(highest)[1]
+        self.counts = [0] * ((self.max_exp - self.min_exp + 1) * sub_buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        mantissa, exp = math.frexp(value)
+        if value <= 0 or exp < self.min_exp:
+            index = 0
+        elif exp > self.max_exp:
+            index = len(self.counts) - 1
+        else:
+            sub = self.sub_buckets
+            index = (exp - self.min_exp) * sub + int((mantissa - 0.5) * 2 * sub)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def upper_bound(self, index):
+        sub = self.sub_buckets
+        return math.ldexp(0.5 + (index % sub + 1) / (2.0 * sub), index // sub + self.min_exp)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * p / 100.0)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class Instrumentation(object):
+    """Per-stage latency histograms plus packet counters per (dpid, class)."""
+
+    def __init__(self, stages, clock=time.perf_counter):
+        self.stages = collections.OrderedDict((name, Histogram()) for name in stages)
+        self.counters = {}  # (dpid, class) -> packet-ins
+        self.clock = clock
+
+    def record(self, stage, seconds):
+        self.stages[stage].record(seconds)
+
+    def count(self, dpid, name):
+        key = (dpid, name)
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    def class_totals(self):
+        totals = {}
+        for (_, name), n in self.counters.items():
+            totals[name] = totals.get(name, 0) + n
+        return totals
+
+    def summary(self):
+        """{stage: (count, p50, p99, max)} in seconds, for stages that saw samples."""
+        return collections.OrderedDict(
+            (name, (h.count, h.percentile(50), h.percentile(99), h.max))
+            for name, h in self.stages.items() if h.count)
+
+    def reset(self):
+        for histogram in self.stages.values():
+            histogram.reset()
+
+
+class LogSampler(object):
+    """Lets at most `burst` records through per `interval` seconds.
+
+    Arguments are passed on unformatted, and a disabled level costs one
+    isEnabledFor() call. The number of dropped records is reported with the
+    first record of the next interval.
+    """
+
+    def __init__(self, logger, interval=1.0, burst=10, clock=time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        self.window_end = 0.0
+        self.emitted = 0
+        self.suppressed = 0
+
+    def log(self, level, msg, *args):
+        logger = self.logger
+        if not logger.isEnabledFor(level):
+            return
+        now = self.clock()
+        if now >= self.window_end:
+            self.window_end = now + self.interval
+            self.emitted = 0
+            if self.suppressed:
+                logger.log(level, "%d similar log records suppressed", self.suppressed)
+                self.suppressed = 0
+        if self.emitted >= self.burst:
+            self.suppressed += 1
+            return
+        self.emitted += 1
+        logger.log(level, msg, *args)
+
+
+class Profiler(object):
+    """Runs cProfile or pyinstrument until stop() writes the results.
+
+    pyinstrument is optional; ImportError is raised if it is asked for but
+    not installed, ValueError for an unknown kind.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        if kind == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif kind == 'pyinstrument':
+            import pyinstrument
+            self.profiler = pyinstrument.Profiler()
+            self.profiler.start()
+        else:
+            raise ValueError("Unknown profiler %r, use cprofile or pyinstrument" % kind)
+
+    def stop(self, path):
+        """Stop profiling and write to `path`: pstats data or an HTML report."""
+        if self.kind == 'cprofile':
+            self.profiler.disable()
+            self.profiler.dump_stats(path)
+        else:
+            self.profiler.stop()
+            with open(path, 'w') as f:
+                f.write(self.profiler.output_html())
@@ -0,0 +1,117 @@
+import numpy as np
+
+MIN_INTERVAL = 1.0  # seconds, floor for a flow's sampling interval
+
+
+class LoadEstimator(object):
+    """Packet and byte rates per datapath from cumulative flow counters.
+
+    Flow stats replies are collected until the final multipart part arrives.
+    Each flow's counters are then diffed against the previous reply using
+    duration_sec/nsec, the per-flow rates are summed per datapath and smoothed
+    with an EWMA. Smoothed rates live in NumPy arrays indexed by slot so
+    thresholding across many datapaths is vectorized.
+    """
+
+    def __init__(self, alpha=0.3, capacity=64):
+        self.alpha = alpha
+        self.slots = {}        # dpid -> slot index
+        self.free = []         # released slots ready for reuse
+        self.dpids = np.zeros(capacity, dtype=np.uint64)
+        self.pps = np.zeros(capacity)
+        self.bps = np.zeros(capacity)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.seeded = np.zeros(capacity, dtype=bool)
+        self.parts = {}        # dpid -> stats collected from REPLY_MORE parts
+        self.counters = {}     # dpid -> {flow id: (packets, bytes, duration)}
+
+    def _slot(self, dpid):
+        slot = self.slots.get(dpid)
+        if slot is not None:
+            return slot
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.slots)
+            if slot == len(self.active):
+                self._grow()
+        self.slots[dpid] = slot
+        self.dpids[slot] = dpid
+        self.pps[slot] = self.bps[slot] = 0.0
+        self.active[slot] = True
+        self.seeded[slot] = False
+        return slot
+
+    def _grow(self):
+        size = len(self.active) * 2
+        for name in ('dpids', 'pps', 'bps', 'active', 'seeded'):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def remove(self, dpid):
+        slot = self.slots.pop(dpid, None)
+        self.parts.pop(dpid, None)
+        self.counters.pop(dpid, None)
+        if slot is not None:
+            self.active[slot] = False
+            self.free.append(slot)
+
+    def add_reply(self, dpid, body, more):
+        """Feed one reply part; returns (pps, bps) once the reply is complete."""
+        if more:
+            self.parts.setdefault(dpid, []).extend(body)
+            return None
+        stats = self.parts.pop(dpid, [])
+        stats.extend(body)
+        return self._update(dpid, stats)
+
+    def _update(self, dpid, stats):
+        previous = self.counters.get(dpid, {})
+        current = {}
+        pkt_rate = byte_rate = 0.0
+        for stat in stats:
+            duration = stat.duration_sec + stat.duration_nsec * 1e-9
+            flow_id = (stat.table_id, stat.priority, stat.cookie, tuple(stat.match.items()))
+            old = previous.get(flow_id)
+            if old is None or duration < old[2]:
+                # New (or re-installed) flow: its whole lifetime is the interval.
+                packets, nbytes, interval = stat.packet_count, stat.byte_count, duration
+            else:
+                packets = stat.packet_count - old[0]
+                nbytes = stat.byte_count - old[1]
+                interval = duration - old[2]
+            interval = max(interval, MIN_INTERVAL)
+            pkt_rate += packets / interval
+            byte_rate += nbytes / interval
+            current[flow_id] = (stat.packet_count, stat.byte_count, duration)
+        self.counters[dpid] = current
+
+        slot = self._slot(dpid)
+        if self.seeded[slot]:
+            a = self.alpha
+            self.pps[slot] = a * pkt_rate + (1 - a) * self.pps[slot]
+            self.bps[slot] = a * byte_rate + (1 - a) * self.bps[slot]
+        else:
+            self.pps[slot] = pkt_rate
+            self.bps[slot] = byte_rate
+            self.seeded[slot] = True
+        return self.pps[slot], self.bps[slot]
+
+    def loads(self, metric='pps'):
+        """(dpids, loads) arrays for datapaths with at least one sample."""
+        mask = self.active & self.seeded
+        return self.dpids[mask], getattr(self, metric)[mask]
+
+    def mean(self, metric='pps'):
+        _, values = self.loads(metric)
+        return float(values.mean()) if len(values) else None
+
+    def above(self, threshold, metric='pps'):
+        dpids, values = self.loads(metric)
+        return [int(d) for d in dpids[values > threshold]]
+
+    def as_dict(self, metric='pps'):
+        dpids, values = self.loads(metric)
+        return dict(zip((int(d) for d in dpids), (float(v) for v in values)))
@@ -0,0 +1,82 @@
+import time
+
+
+class MeterControl(object):
+    """Per-class meter rates recomputed from measured demand.
+
+    `levels` lists class names from most to least urgent. Demand per class
+    is the smoothed byte rate between two stats rounds of a switch. The most
+    urgent class may use the whole `capacity`; every other class gets what
+    is left after the more urgent classes' demand (times `headroom`), but
+    never less than its floor. So LOW runs at line rate while HIGH and
+    MEDIUM are quiet and is squeezed towards its floor as they pick up. A
+    rise in demand is applied at once, a drop is smoothed unless the class
+    went idle. A new rate is only reported when it moved by more than
+    `min_change`, to keep MeterMods off the control channel while demand is
+    stable.
+
+    Rates are in bits per second. Meters are per switch, so demand is the
+    sum over all of the switch's ports.
+    """
+
+    def __init__(self, levels, capacity, floors=None, headroom=1.2, min_change=0.1,
+                 smoothing=0.5, clock=time.monotonic):
+        self.levels = list(levels)
+        self.capacity = capacity
+        self.floors = floors or {}
+        self.headroom = headroom
+        self.min_change = min_change
+        self.smoothing = smoothing
+        self.clock = clock
+        self.last = {}       # dpid -> ({class: bytes}, time) of the previous round
+        self.demand = {}     # dpid -> {class: smoothed bits per second}
+        self.installed = {}  # dpid -> {class: rate the switch's meter was last set to}
+
+    def remove(self, dpid):
+        self.last.pop(dpid, None)
+        self.demand.pop(dpid, None)
+        self.installed.pop(dpid, None)
+
+    def update(self, dpid, class_bytes):
+        """Record cumulative byte counters per class; False if no rate was derived."""
+        now = self.clock()
+        last = self.last.get(dpid)
+        self.last[dpid] = (dict(class_bytes), now)
+        if last is None or now <= last[1]:
+            return False
+        elapsed = now - last[1]
+        demand = self.demand.setdefault(dpid, {})
+        for name, nbytes in class_bytes.items():
+            delta = nbytes - last[0].get(name, 0)
+            # Counters drop when flows expire; keep the previous estimate then.
+            if delta < 0:
+                continue
+            rate = delta * 8 / elapsed
+            previous = demand.get(name)
+            # Rising or stopped demand is taken as is, falling demand is smoothed.
+            if previous is None or rate >= previous or rate == 0:
+                demand[name] = rate
+            else:
+                demand[name] = self.smoothing * rate + (1 - self.smoothing) * previous
+        return True
+
+    def rates(self, dpid):
+        demand = self.demand.get(dpid, {})
+        rates = {}
+        used = 0.0
+        for name in self.levels:
+            rates[name] = max(self.floors.get(name, 0), self.capacity - used)
+            used += min(demand.get(name, 0.0) * self.headroom, self.capacity)
+        return rates
+
+    def changes(self, dpid):
+        """Return [(class, rate, new meter)] to send, and remember them as installed."""
+        installed = self.installed.setdefault(dpid, {})
+        out = []
+        for name, rate in self.rates(dpid).items():
+            old = installed.get(name)
+            if old is not None and abs(rate - old) <= self.min_change * old:
+                continue
+            installed[name] = rate
+            out.append((name, rate, old is None))
+        return out
@@ -0,0 +1,136 @@
+"""Fixed-size in-memory time series and the REST endpoint that serves them.
+
+Every series is a NumPy ring of (sequence, time, value) samples, so memory
+is capacity * 24 bytes per series whatever the uptime, and the number of
+series is capped too. Samples get a store-wide sequence number that clients
+pass back as `since` to fetch only what is new.
+
+    GET /metrics?since=<cursor>&step=<seconds>&metric=<name>[,<name>...]
+
+returns {"cursor": N, "series": {metric: {key: {"t": [...], "v": [...]}}}}.
+With `step`, samples are averaged into buckets of that many seconds.
+"""
+import collections
+import math
+import time
+
+import numpy as np
+
+from ryu.app.wsgi import ControllerBase, Response, route
+
+
+class Series(object):
+    __slots__ = ('seqs', 'times', 'values', 'head', 'size')
+
+    def __init__(self, capacity):
+        self.seqs = np.zeros(capacity, np.int64)
+        self.times = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.head = 0  # next slot to write
+        self.size = 0
+
+    def append(self, seq, t, value):
+        i = self.head
+        self.seqs[i] = seq
+        self.times[i] = t
+        self.values[i] = value
+        self.head = (i + 1) % len(self.seqs)
+        if self.size < len(self.seqs):
+            self.size += 1
+
+    def since(self, seq):
+        """(times, values) of the samples after sequence number `seq`, oldest first."""
+        if self.size < len(self.seqs):
+            parts = ((0, self.size),)
+        else:
+            parts = ((self.head, len(self.seqs)), (0, self.head))
+        times = []
+        values = []
+        # Each part is sorted by sequence, so only the new tail gets copied.
+        for lo, hi in parts:
+            start = lo + np.searchsorted(self.seqs[lo:hi], seq, side='right')
+            if start < hi:
+                times.append(self.times[start:hi])
+                values.append(self.values[start:hi])
+        if len(times) == 1:
+            return times[0], values[0]
+        if not times:
+            return self.times[:0], self.values[:0]
+        return np.concatenate(times), np.concatenate(values)
+
+
+def downsample(times, values, step):
+    """Average samples into buckets of `step` seconds, stamped with the bucket start."""
+    if not (math.isfinite(step) and step > 0):
+        raise ValueError("step must be a positive number of seconds, got %r" % step)
+    if not len(times):
+        return times, values
+    buckets = np.floor(times / step)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    sums = np.add.reduceat(values, starts)
+    counts = np.diff(np.r_[starts, len(values)])
+    return buckets[starts] * step, sums / counts
+
+
+class MetricsStore(object):
+    def __init__(self, capacity=3600, max_series=4096, clock=time.time):
+        self.capacity = capacity
+        self.max_series = max_series
+        self.clock = clock
+        self.series = collections.OrderedDict()  # (metric, key) -> Series, least recent first
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.series)
+
+    def record(self, metric, key, value, t=None):
+        self.seq += 1
+        name = (metric, str(key))
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = Series(self.capacity)
+            if len(self.series) > self.max_series:
+                self.series.popitem(last=False)
+        else:
+            self.series.move_to_end(name)
+        series.append(self.seq, self.clock() if t is None else t, value)
+
+    def query(self, since=0, step=None, metrics=None):
+        out = {}
+        for (metric, key), series in self.series.items():
+            if metrics and metric not in metrics:
+                continue
+            times, values = series.since(since)
+            if not len(times):
+                continue
+            if step is not None:
+                times, values = downsample(times, values, step)
+            out.setdefault(metric, {})[key] = {'t': times.tolist(), 'v': values.tolist()}
+        return {'cursor': self.seq, 'series': out}
+
+    def nbytes(self):
+        return sum(s.seqs.nbytes + s.times.nbytes + s.values.nbytes
+                   for s in self.series.values())
+
+
+class MetricsController(ControllerBase):
+    """Serves a MetricsStore passed in as data['store'] through Ryu's WSGI server."""
+
+    def __init__(self, req, link, data, **config):
+        super(MetricsController, self).__init__(req, link, data, **config)
+        self.store = data['store']
+
+    @route('metrics', '/metrics', methods=['GET'])
+    def get_metrics(self, req, **kwargs):
+        try:
+            since = int(req.params.get('since', 0))
+            step = req.params.get('step')
+            step = None if step is None else float(step)
+        except ValueError:
+            return Response(status=400, text="since must be an integer, step a number")
+        if step is not None and not (math.isfinite(step) and step > 0):
+            return Response(status=400, text="step must be a positive number of seconds")
+        metrics = req.params.get('metric')
+        metrics = set(metrics.split(',')) if metrics else None
+        return Response(content_type='application/json', charset='utf-8',
+                        json=self.store.query(since, step, metrics))
@@ -0,0 +1,370 @@
+import collections
+import time
+
+MARKER_TAG = 0x4d48 << 48          # cookie bits 63..48 of handover marker flows
+MARKER_MASK = 0xffff << 48
+MARKER_ETH_TYPE = 0x88b5           # IEEE local experimental ethertype, matches nothing real
+MAX_GENERATION = (1 << 64) - 1
+COOKIE_EXACT = (1 << 64) - 1
+
+EQUAL = 'equal'        # new controller asked for EQUAL, waiting for the reply
+WAIT = 'wait'          # old side of a remote handover, waiting for MSG_FENCE
+FENCE = 'fence'        # marker flow and barrier sent on the old channel
+MASTER = 'master'      # new controller asked for MASTER
+RELEASE = 'release'    # handover done, old controller being set to SLAVE
+ABORT = 'abort'        # failed, new controller being set back to SLAVE
+CHECK = 'check'        # old side timed out, asking the switch for its current role
+
+# Messages between the old and the new side when they run in different
+# controller processes, sent through the `send` callback.
+MSG_TAKE_OVER = 1      # to dst: start taking the switch over from src
+MSG_FENCE = 2          # to src: EQUAL granted, send the marker and a barrier
+MSG_FENCED = 3         # to dst: the barrier behind the marker was answered
+MSG_RELEASE = 4        # to src: dst is MASTER with the given generation
+MSG_ABORT = 5          # to src: the handover failed, keep handling packet-ins
+MSG_REFUSE = 6         # to dst: src cannot fence the switch, give up
+TO_SRC = (MSG_FENCE, MSG_RELEASE, MSG_ABORT)
+
+
+class Handover(object):
+    __slots__ = ('dpid', 'id', 'old', 'new', 'src', 'dst', 'started', 'state', 'generation',
+                 'cookie', 'barrier_xid', 'fenced', 'old_marked', 'new_marked', 'ok', 'latency')
+
+    def __init__(self, dpid, handover_id, old, new, src, dst, started):
+        self.dpid = dpid
+        self.id = handover_id
+        self.old = old          # datapath handle of the current owner, None in another process
+        self.new = new          # datapath handle of the controller taking over, ditto
+        self.src = src
+        self.dst = dst
+        self.started = started
+        self.state = EQUAL if new is not None else WAIT
+        self.generation = None
+        # Both processes derive the same marker cookie from the handover.
+        self.cookie = MARKER_TAG | ((dst or 0) & 0xffff) << 32 | handover_id
+        self.barrier_xid = None
+        self.fenced = False
+        self.old_marked = False
+        self.new_marked = False
+        self.ok = False         # the switch ended up with the new controller as MASTER
+        self.latency = None     # decision to MASTER reply, measured on the new side
+
+
+class MigrationExecutor(object):
+    """Hands a switch over between two controller channels with role requests.
+
+    1. The new channel asks for EQUAL, so it also starts receiving packet-ins
+       but ignores them; the reply carries the switch's generation_id.
+    2. The old channel adds and deletes a marker flow with SEND_FLOW_REM,
+       followed by a barrier. The switch sends the marker's FlowRemoved to
+       both channels at the same point of their message streams: the old
+       channel handles packet-ins up to its marker, the new one from its
+       marker on, so each packet-in is handled exactly once.
+    3. Once the barrier is answered and the new channel has seen the marker,
+       it asks for MASTER with generation_id + 1, which makes the switch
+       demote the old owner. The old channel is then set to SLAVE as well.
+
+    The time from the migration decision to the MASTER reply is recorded.
+    Messages for both channels are fed in through the on_* methods.
+
+    When the two channels belong to different controller processes, each
+    process runs its own side: the executor of the new controller does the
+    role requests, the one of the old controller the marker and barrier, and
+    they pass MSG_* messages through `send` (state_sync carries them) that
+    the other side feeds to on_message(). An old side that hears nothing
+    within `timeout` asks the switch for its role, so a lost message cannot
+    keep it from handling packet-ins: if the switch made it SLAVE the new
+    controller took over, otherwise it is still in charge.
+
+    Outside a handover, assign_role() keeps the owner's channel MASTER and
+    every other channel SLAVE, so the switch sends packet-ins to one
+    controller only.
+    """
+
+    def __init__(self, timeout=5.0, samples=1024, callback=None, clock=time.monotonic,
+                 node_id=0, send=None):
+        self.timeout = timeout
+        self.callback = callback   # called with the Handover when it ends
+        self.clock = clock
+        self.node_id = node_id
+        self.send = send           # send(dpid, handover id, src, dst, message, generation)
+        self.handovers = {}        # dpid -> Handover
+        self.requests = {}         # (id(channel), xid) -> Handover
+        self.markers = {}          # marker cookie -> Handover
+        self.roles = {}            # dpid -> (id(channel), xid, role) of a pending assign_role
+        # Handover ids, and with them marker cookies, are unique per node.
+        self.next_id = (node_id & 0xff) << 24
+        self.latencies = collections.deque(maxlen=samples)
+        self.completed = 0
+        self.failed = 0
+
+    def busy(self, dpid):
+        return dpid in self.handovers
+
+    def start(self, old, new, src=None, dst=None, started=None, handover_id=None):
+        """Begin moving a switch from channel `old` to `new`; False if one is running.
+
+        One of the channels is None when it belongs to controller `src` or
+        `dst` in another process. Without `new`, dst is asked to take over
+        and this side waits for its MSG_FENCE.
+        """
+        dpid = (new if new is not None else old).id
+        if dpid in self.handovers:
+            return False
+        if handover_id is None:
+            handover_id = self._next_id()
+        h = Handover(dpid, handover_id, old, new, src, dst,
+                     self.clock() if started is None else started)
+        self.handovers[dpid] = h
+        self.markers[h.cookie] = h
+        if new is None:
+            self._send(dpid, handover_id, src, dst, MSG_TAKE_OVER)
+        else:
+            self._role_request(h, new, new.ofproto.OFPCR_ROLE_EQUAL, 0)
+        return True
+
+    def assign_role(self, datapath, master):
+        """Make `datapath` MASTER or SLAVE of its switch; False while a handover runs.
+
+        The switch is asked for its role first, and the reply's generation_id
+        makes the role request that follows, if any, current.
+        """
+        if datapath.id in self.handovers:
+            return False
+        ofproto = datapath.ofproto
+        role = ofproto.OFPCR_ROLE_MASTER if master else ofproto.OFPCR_ROLE_SLAVE
+        req = datapath.ofproto_parser.OFPRoleRequest(datapath, ofproto.OFPCR_ROLE_NOCHANGE, 0)
+        datapath.set_xid(req)
+        self.roles[datapath.id] = (id(datapath), req.xid, role)
+        datapath.send_msg(req)
+        return True
+
+    def request(self, dpid, src, dst):
+        """Ask controller dst in another process to take switch dpid over from src."""
+        self._send(dpid, self._next_id(), src, dst, MSG_TAKE_OVER)
+
+    def _next_id(self):
+        handover_id = self.next_id
+        self.next_id = (self.next_id & ~0xffffff) | ((self.next_id + 1) & 0xffffff)
+        return handover_id
+
+    def on_message(self, dpid, handover_id, src, dst, message, generation, datapath):
+        """Apply a message from the other side; `datapath` is this process's channel to dpid.
+
+        Returns False for messages meant for another controller.
+        """
+        if (src if message in TO_SRC else dst) != self.node_id:
+            return False
+        h = self.handovers.get(dpid)
+        if message == MSG_TAKE_OVER:
+            if datapath is None or not self.start(None, datapath, src, dst,
+                                                  handover_id=handover_id):
+                self._send(dpid, handover_id, src, dst, MSG_ABORT)
+        elif message == MSG_FENCE:
+            if h is None and datapath is not None:
+                h = Handover(dpid, handover_id, datapath, None, src, dst, self.clock())
+                self.handovers[dpid] = h
+                self.markers[h.cookie] = h
+            if h is None or h.id != handover_id or h.new is not None or h.state != WAIT:
+                self._send(dpid, handover_id, src, dst, MSG_REFUSE)
+                return True
+            h.generation = generation
+            self._fence(h)
+        elif h is None or h.id != handover_id:
+            return True  # a handover that already ended
+        elif message == MSG_FENCED:
+            h.fenced = True
+            self._promote(h)
+        elif message == MSG_RELEASE:
+            h.ok = True
+            h.generation = generation
+            h.state = RELEASE
+            self._role_request(h, h.old, h.old.ofproto.OFPCR_ROLE_SLAVE, generation)
+        elif message == MSG_ABORT:
+            self.failed += 1
+            h.old_marked = False
+            self._finish(h)
+        elif message == MSG_REFUSE and h.state not in (RELEASE, ABORT):
+            self._abort(h)
+        return True
+
+    def _send(self, dpid, handover_id, src, dst, message, generation=0):
+        if self.send is not None:
+            self.send(dpid, handover_id, src, dst, message, generation)
+
+    def should_handle(self, datapath):
+        """False for packet-ins the other channel of a running handover owns."""
+        h = self.handovers.get(datapath.id)
+        if h is None:
+            return True
+        if datapath is h.old:
+            return not h.old_marked
+        if datapath is h.new:
+            return h.new_marked and h.state != ABORT
+        return True
+
+    def _role_request(self, h, datapath, role, generation):
+        req = datapath.ofproto_parser.OFPRoleRequest(datapath, role, generation)
+        datapath.set_xid(req)
+        self.requests[(id(datapath), req.xid)] = h
+        datapath.send_msg(req)
+
+    def _fence(self, h):
+        datapath = h.old
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(eth_type=MARKER_ETH_TYPE)
+        add = parser.OFPFlowMod(datapath=datapath, cookie=h.cookie, priority=0, match=match,
+                                flags=ofproto.OFPFF_SEND_FLOW_REM, instructions=[])
+        delete = parser.OFPFlowMod(datapath=datapath, cookie=h.cookie,
+                                   cookie_mask=COOKIE_EXACT, priority=0, match=match,
+                                   command=ofproto.OFPFC_DELETE_STRICT,
+                                   out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY)
+        barrier = parser.OFPBarrierRequest(datapath)
+        bufs = []
+        for msg in (add, delete, barrier):
+            datapath.set_xid(msg)
+            msg.serialize()
+            bufs.append(msg.buf)
+        h.barrier_xid = barrier.xid
+        self.requests[(id(datapath), barrier.xid)] = h
+        h.state = FENCE
+        datapath.send(b''.join(bufs))
+
+    def _promote(self, h):
+        if h.state == FENCE and h.fenced and h.new_marked and h.new is not None:
+            h.state = MASTER
+            self._role_request(h, h.new, h.new.ofproto.OFPCR_ROLE_MASTER,
+                               (h.generation + 1) & MAX_GENERATION)
+
+    def on_role_reply(self, datapath, msg):
+        assigned = self.roles.get(datapath.id)
+        if assigned is not None and assigned[:2] == (id(datapath), msg.xid):
+            del self.roles[datapath.id]
+            role = assigned[2]
+            if msg.role != role and datapath.id not in self.handovers:
+                datapath.send_msg(datapath.ofproto_parser.OFPRoleRequest(
+                    datapath, role, msg.generation_id))
+            return True
+        h = self.requests.pop((id(datapath), msg.xid), None)
+        if h is None:
+            return False
+        ofproto = datapath.ofproto
+        if h.state == EQUAL:
+            h.generation = msg.generation_id
+            if h.old is None:
+                h.state = FENCE
+                self._send(h.dpid, h.id, h.src, h.dst, MSG_FENCE, h.generation)
+            else:
+                self._fence(h)
+        elif h.state == MASTER:
+            if msg.role != ofproto.OFPCR_ROLE_MASTER:
+                self._abort(h)
+                return True
+            h.ok = True
+            h.latency = self.clock() - h.started
+            self.latencies.append(h.latency)
+            self.completed += 1
+            h.state = RELEASE
+            generation = (h.generation + 1) & MAX_GENERATION
+            if h.old is None:
+                self._send(h.dpid, h.id, h.src, h.dst, MSG_RELEASE, generation)
+                self._finish(h)
+            else:
+                self._role_request(h, h.old, ofproto.OFPCR_ROLE_SLAVE, generation)
+        elif h.state == CHECK:
+            # The switch demoted us, so the new side got MASTER but its MSG_RELEASE was lost.
+            h.ok = msg.role == ofproto.OFPCR_ROLE_SLAVE
+            if not h.ok:
+                self.failed += 1
+                h.old_marked = False
+            self._finish(h)
+        elif h.state in (RELEASE, ABORT):
+            self._finish(h)
+        return True
+
+    def on_barrier_reply(self, datapath, msg):
+        h = self.requests.get((id(datapath), msg.xid))
+        if h is None or msg.xid != h.barrier_xid or datapath is not h.old:
+            return False
+        del self.requests[(id(datapath), msg.xid)]
+        h.fenced = True
+        if h.new is None:
+            self._send(h.dpid, h.id, h.src, h.dst, MSG_FENCED, h.generation)
+        else:
+            self._promote(h)
+        return True
+
+    def on_flow_removed(self, datapath, msg):
+        """Consume marker FlowRemoved messages; False for ordinary flows."""
+        if msg.cookie & MARKER_MASK != MARKER_TAG:
+            return False
+        h = self.markers.get(msg.cookie)
+        if h is None:
+            return True
+        if datapath is h.old:
+            h.old_marked = True
+        elif datapath is h.new:
+            h.new_marked = True
+        self._promote(h)
+        return True
+
+    def on_error(self, datapath, msg):
+        h = self.requests.pop((id(datapath), msg.xid), None)
+        if h is None:
+            return False
+        if h.state in (RELEASE, ABORT, CHECK):
+            self._finish(h)
+        else:
+            self._abort(h)
+        return True
+
+    def _abort(self, h):
+        """Give the switch back to the old channel and demote the new one."""
+        self.failed += 1
+        h.old_marked = False
+        h.state = ABORT
+        if h.new is None:
+            self._send(h.dpid, h.id, h.src, h.dst, MSG_REFUSE)
+            self._finish(h)
+            return
+        if h.old is None:
+            self._send(h.dpid, h.id, h.src, h.dst, MSG_ABORT)
+        generation = 0 if h.generation is None else (h.generation + 1) & MAX_GENERATION
+        self._role_request(h, h.new, h.new.ofproto.OFPCR_ROLE_SLAVE, generation)
+
+    def _finish(self, h):
+        self.handovers.pop(h.dpid, None)
+        self.markers.pop(h.cookie, None)
+        for key in [k for k, v in self.requests.items() if v is h]:
+            del self.requests[key]
+        if self.callback is not None:
+            self.callback(h)
+
+    def expire(self):
+        """Abort handovers stuck for longer than `timeout`; returns how many."""
+        cutoff = self.clock() - self.timeout
+        stuck = [h for h in self.handovers.values() if h.started < cutoff]
+        for h in stuck:
+            if h.state in (RELEASE, ABORT, CHECK):
+                if h.state == CHECK:
+                    self.failed += 1
+                    h.old_marked = False
+                self._finish(h)
+            elif h.new is None:
+                h.state = CHECK
+                self._role_request(h, h.old, h.old.ofproto.OFPCR_ROLE_NOCHANGE, 0)
+                h.started = self.clock()
+            else:
+                self._abort(h)
+                h.started = self.clock()  # give the SLAVE request its own timeout
+        return len(stuck)
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        """Return {percentile: seconds} over the recent handover latencies."""
+        if not self.latencies:
+            return {}
+        ordered = sorted(self.latencies)
+        last = len(ordered) - 1
+        return dict((p, ordered[min(last, int(round(p / 100.0 * last)))])
+                    for p in percentiles)
@@ -0,0 +1,78 @@
+import bisect
+import heapq
+
+
+def plan_migrations(switch_loads, assignment, capacities, movable,
+                    max_moves=16, target=0.0):
+    """Plan switch moves that minimise the maximum controller utilisation.
+
+    switch_loads maps switch -> load, assignment maps switch -> controller and
+    capacities maps controller -> relative capacity (utilisation is load /
+    capacity). Only switches in `movable` may be moved. Each step takes the
+    most utilised controller, moves the switch that best equalises it with
+    the least utilised one (largest fitting switch first, as in LPT) and
+    stops after `max_moves` moves, once the peak is at or below `target`, or
+    when no move lowers the peak any further.
+
+    Returns a list of (switch, from_controller, to_controller).
+    """
+    load = dict((c, 0.0) for c in capacities)
+    candidates = dict((c, []) for c in capacities)  # sorted (load, switch)
+    for sw, ctrl in assignment.items():
+        if ctrl not in load:
+            continue
+        sw_load = switch_loads.get(sw, 0.0)
+        load[ctrl] += sw_load
+        if sw in movable and sw_load > 0:
+            candidates[ctrl].append((sw_load, sw))
+    for items in candidates.values():
+        items.sort()
+
+    def util(c):
+        return load[c] / capacities[c]
+
+    # Lazy heaps: stale entries are skipped by comparing against util().
+    high = [(-util(c), c) for c in capacities]
+    low = [(util(c), c) for c in capacities]
+    heapq.heapify(high)
+    heapq.heapify(low)
+
+    moves = []
+    while len(moves) < max_moves and high and low:
+        neg_u, src = high[0]
+        if -neg_u != util(src):
+            heapq.heappop(high)
+            continue
+        u_dst, dst = low[0]
+        if u_dst != util(dst):
+            heapq.heappop(low)
+            continue
+        if src == dst:
+            break
+        peak = -neg_u
+        if peak <= target:
+            break
+        cap_src, cap_dst = capacities[src], capacities[dst]
+        # Load to shift so both controllers end at the same utilisation.
+        ideal = (load[src] * cap_dst - load[dst] * cap_src) / (cap_src + cap_dst)
+        items = candidates[src]
+        i = bisect.bisect_left(items, (ideal,))
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(items):
+                sw_load = items[j][0]
+                new_peak = max((load[src] - sw_load) / cap_src,
+                               (load[dst] + sw_load) / cap_dst)
+                if best is None or new_peak < best[0]:
+                    best = (new_peak, j)
+        if best is None or best[0] >= peak:
+            break
+        sw_load, sw = items.pop(best[1])
+        load[src] -= sw_load
+        load[dst] += sw_load
+        moves.append((sw, src, dst))
+        heapq.heappush(high, (-util(src), src))
+        heapq.heappush(high, (-util(dst), dst))
+        heapq.heappush(low, (util(src), src))
+        heapq.heappush(low, (util(dst), dst))
+    return moves
@@ -0,0 +1,126 @@
+import collections
+import time
+
+
+class HostTable(object):
+    """Controller-wide MAC -> (dpid, port) index with aging.
+
+    Entries are kept in the order they were last seen, so expiry only looks
+    at the front of the dict, like flow_store.BoundedStore.
+    """
+
+    def __init__(self, max_entries=50000, ttl=300, clock=time.monotonic):
+        self.entries = {}       # mac -> (dpid, port, last seen)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.moves = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def learn(self, mac, dpid, port):
+        entries = self.entries
+        old = entries.pop(mac, None)
+        if old is not None and (old[0], old[1]) != (dpid, port):
+            self.moves += 1
+        entries[mac] = (dpid, port, self.clock())
+        if len(entries) > self.max_entries:
+            del entries[next(iter(entries))]
+
+    def get(self, mac):
+        entry = self.entries.get(mac)
+        return None if entry is None else entry[:2]
+
+    def forget_port(self, dpid, port):
+        """Drop hosts learned on a port that turned out to be a switch link."""
+        for mac in [m for m, e in self.entries.items() if e[0] == dpid and e[1] == port]:
+            del self.entries[mac]
+
+    def forget_switch(self, dpid):
+        for mac in [m for m, e in self.entries.items() if e[0] == dpid]:
+            del self.entries[mac]
+
+    def expire(self):
+        cutoff = self.clock() - self.ttl
+        expired = []
+        for mac, entry in self.entries.items():
+            if entry[2] > cutoff:
+                break
+            expired.append(mac)
+        for mac in expired:
+            del self.entries[mac]
+        return len(expired)
+
+
+class Topology(object):
+    """Switch graph with an all-pairs next-hop table.
+
+    links[a][b] is the port on switch a that leads to switch b. The next-hop
+    table is rebuilt lazily after a change with one BFS per destination, so
+    every switch forwards along a shortest path and paths towards the same
+    destination form a tree.
+    """
+
+    def __init__(self):
+        self.links = {}          # dpid -> {neighbour dpid: local port}
+        self.link_ports = set()  # (dpid, port) pairs facing another switch
+        self.next_hop = {}       # dst dpid -> {dpid: neighbour towards dst}
+        self.dirty = False
+
+    def add_link(self, src, src_port, dst, dst_port):
+        self.links.setdefault(src, {})[dst] = src_port
+        self.links.setdefault(dst, {})[src] = dst_port
+        self.link_ports.add((src, src_port))
+        self.link_ports.add((dst, dst_port))
+        self.dirty = True
+
+    def remove_link(self, src, src_port, dst, dst_port):
+        for a, b, port in ((src, dst, src_port), (dst, src, dst_port)):
+            if self.links.get(a, {}).get(b) == port:
+                del self.links[a][b]
+            self.link_ports.discard((a, port))
+        self.dirty = True
+
+    def remove_switch(self, dpid):
+        for other, port in self.links.pop(dpid, {}).items():
+            back = self.links.get(other, {}).pop(dpid, None)
+            self.link_ports.discard((other, back))
+            self.link_ports.discard((dpid, port))
+        self.dirty = True
+
+    def is_link_port(self, dpid, port):
+        return (dpid, port) in self.link_ports
+
+    def rebuild(self):
+        next_hop = {}
+        for dst in self.links:
+            parents = {dst: None}
+            queue = collections.deque([dst])
+            while queue:
+                node = queue.popleft()
+                for neighbour in self.links.get(node, ()):
+                    if neighbour not in parents:
+                        parents[neighbour] = node
+                        queue.append(neighbour)
+            del parents[dst]
+            next_hop[dst] = parents
+        self.next_hop = next_hop
+        self.dirty = False
+
+    def path(self, src, dst):
+        """Switches from src to dst inclusive, or None if dst is unreachable."""
+        if src == dst:
+            return [src]
+        if self.dirty:
+            self.rebuild()
+        hops = self.next_hop.get(dst)
+        if hops is None or src not in hops:
+            return None
+        path = [src]
+        while path[-1] != dst:
+            path.append(hops[path[-1]])
+        return path
+
+    def port(self, dpid, neighbour):
+        return self.links[dpid][neighbour]
@@ -0,0 +1,325 @@
+"""Data-driven traffic classification rules.
+
+Rules are loaded from a JSON file and compiled into lookup structures so the
+cost of classifying a packet does not grow with the number of rules. Each
+rule uses one selector and maps it to a traffic class. A proto is part of a
+dst_port selector or a selector of its own; other combinations are rejected,
+as each lookup structure only matches on one field:
+
+    {"proto": "tcp", "dst_port": [80, 443], "class": "HIGH"}
+    {"proto": "udp", "dst_port": "5683-5684", "class": "MEDIUM"}
+    {"dscp": 46, "class": "HIGH"}
+    {"dst": "10.0.0.0/24", "class": "MEDIUM"}
+    {"proto": "icmp", "class": "MEDIUM"}
+
+Lookups are tried from most to least specific: exact (proto, port), port
+range, DSCP, destination subnet, source subnet, protocol default and finally
+the table default. Within one selector kind the first rule in the file wins.
+On the switch, port rules that openflow_entries() cannot render fall through
+to the protocol default entry, if the protocol has one.
+"""
+import json
+import os
+import socket
+import struct
+
+PROTOCOLS = {'icmp': 1, 'tcp': 6, 'udp': 17}
+PORT_FIELDS = {6: 'tcp_dst', 17: 'udp_dst'}
+PORT_SPACE = 65536
+MAX_EXPANDED_PORTS = 1024  # per range, when rendered as OpenFlow entries
+SELECTORS = ('dst_port', 'dscp', 'dst', 'src')  # besides proto
+
+# FlowMod cookie layout for flows installed by the QoS controller:
+#   bits 63..48  COOKIE_TAG, marks the flow as ours
+#   bit  24      COOKIE_DEMOTED, elephant flow moved to a lower class, which the
+#                class, weight and queue bits then describe
+#   bits 23..16  stats weight of the class
+#   bits 15..8   class code (index in the class table + 1)
+#   bits  7..0   queue id
+COOKIE_TAG = 0x5153
+COOKIE_TAG_MASK = 0xffff << 48
+COOKIE_CLASS_MASK = COOKIE_TAG_MASK | 0xff00
+COOKIE_DEMOTED = 1 << 24
+
+
+def cookie_weight(cookie):
+    """Stats weight carried in a flow cookie; 1 for flows that are not ours."""
+    if cookie >> 48 != COOKIE_TAG:
+        return 1
+    return (cookie >> 16) & 0xff or 1
+
+
+def cookie_queue(cookie):
+    return cookie & 0xff if cookie >> 48 == COOKIE_TAG else None
+
+# OpenFlow priority bands mirroring the lookup order used by classify().
+_BAND_EXACT = 700
+_BAND_RANGE = 600
+_BAND_DSCP = 500
+_BAND_DST = 400
+_BAND_SRC = 300
+_BAND_PROTO = 200
+
+
+class PrefixTrie(object):
+    """Binary trie over IPv4 addresses with longest-prefix match."""
+
+    def __init__(self):
+        self.root = [None, None, None]  # child0, child1, value
+        self.size = 0
+
+    def insert(self, network, prefix_len, value):
+        node = self.root
+        for bit in range(31, 31 - prefix_len, -1):
+            branch = (network >> bit) & 1
+            if node[branch] is None:
+                node[branch] = [None, None, None]
+            node = node[branch]
+        if node[2] is None:
+            node[2] = value
+            self.size += 1
+
+    def lookup(self, addr):
+        node = self.root
+        best = node[2]
+        bit = 31
+        while node is not None:
+            if node[2] is not None:
+                best = node[2]
+            if bit < 0:
+                break
+            node = node[(addr >> bit) & 1]
+            bit -= 1
+        return best
+
+
+def _parse_proto(value):
+    if isinstance(value, int):
+        return value
+    try:
+        return PROTOCOLS[value.lower()]
+    except KeyError:
+        raise ValueError("Unknown protocol %r" % value)
+
+
+def _parse_ports(value):
+    """Return a list of (lo, hi) ranges from an int, "lo-hi" string or list."""
+    items = value if isinstance(value, list) else [value]
+    ranges = []
+    for item in items:
+        if isinstance(item, str) and '-' in item:
+            lo, hi = (int(p) for p in item.split('-', 1))
+        else:
+            lo = hi = int(item)
+        if not 0 <= lo <= hi < PORT_SPACE:
+            raise ValueError("Invalid port range %r" % item)
+        ranges.append((lo, hi))
+    return ranges
+
+
+def _parse_subnet(value):
+    addr, _, plen = value.partition('/')
+    prefix_len = int(plen) if plen else 32
+    if not 0 <= prefix_len <= 32:
+        raise ValueError("Invalid prefix length in %r" % value)
+    network = struct.unpack('!I', socket.inet_aton(addr))[0]
+    mask = (0xffffffff << (32 - prefix_len)) & 0xffffffff
+    return network & mask, prefix_len
+
+
+class RuleTable(object):
+    """Compiled classification table plus the per-class QoS settings."""
+
+    def __init__(self, config):
+        classes = config.get('classes')
+        if not classes:
+            raise ValueError("Rule file defines no traffic classes")
+        self.classes = {}
+        for name, settings in classes.items():
+            self.classes[name] = (int(settings['priority']),
+                                  int(settings['queue']),
+                                  int(settings.get('weight', 1)))
+        self.class_names = list(self.classes)
+        self.default = config.get('default', self.class_names[-1])
+        if self.default not in self.classes:
+            raise ValueError("Unknown default class %r" % self.default)
+
+        self.exact = {}         # (proto, port) -> class
+        self.port_ranges = {}   # proto -> bytearray of class index + 1
+        self.dscp = {}          # dscp -> class
+        self.dst_subnets = PrefixTrie()
+        self.src_subnets = PrefixTrie()
+        self.proto_default = {}  # proto -> class
+        self.range_rules = []    # (proto, lo, hi, class) in file order
+        self.subnet_rules = []   # (field, network, prefix_len, class)
+        self.rule_count = 0
+
+        pending_ranges = {}
+        for rule in config.get('rules', []):
+            self._compile_rule(rule, pending_ranges)
+        for proto, ranges in pending_ranges.items():
+            table = bytearray(PORT_SPACE)
+            # Paint in reverse so the first rule covering a port wins.
+            for lo, hi, index in reversed(ranges):
+                table[lo:hi + 1] = bytes((index + 1,)) * (hi - lo + 1)
+            self.port_ranges[proto] = table
+
+    def _compile_rule(self, rule, pending_ranges):
+        name = rule.get('class')
+        if name not in self.classes:
+            raise ValueError("Rule %r references unknown class" % rule)
+        proto = _parse_proto(rule['proto']) if 'proto' in rule else None
+        selectors = [key for key in SELECTORS if key in rule]
+        if len(selectors) > 1 or (proto is not None and selectors and selectors != ['dst_port']):
+            used = (['proto'] if proto is not None else []) + selectors
+            raise ValueError("Rule %r combines %s, only one selector is supported"
+                             % (rule, '+'.join(used)))
+        if 'dst_port' in rule:
+            if proto is None:
+                raise ValueError("Port rule %r needs a proto" % rule)
+            for lo, hi in _parse_ports(rule['dst_port']):
+                if lo == hi:
+                    self.exact.setdefault((proto, lo), name)
+                else:
+                    pending_ranges.setdefault(proto, []).append(
+                        (lo, hi, self.class_names.index(name)))
+                    self.range_rules.append((proto, lo, hi, name))
+        elif 'dscp' in rule:
+            values = rule['dscp'] if isinstance(rule['dscp'], list) else [rule['dscp']]
+            for value in values:
+                self.dscp.setdefault(int(value), name)
+        elif 'dst' in rule:
+            network, prefix_len = _parse_subnet(rule['dst'])
+            self.dst_subnets.insert(network, prefix_len, value=name)
+            self.subnet_rules.append(('ipv4_dst', network, prefix_len, name))
+        elif 'src' in rule:
+            network, prefix_len = _parse_subnet(rule['src'])
+            self.src_subnets.insert(network, prefix_len, value=name)
+            self.subnet_rules.append(('ipv4_src', network, prefix_len, name))
+        elif proto is not None:
+            self.proto_default.setdefault(proto, name)
+        else:
+            raise ValueError("Rule %r has no selector" % rule)
+        self.rule_count += 1
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def classify(self, headers):
+        proto = headers.ip_proto
+        if proto is None:
+            return self.default
+        port = headers.dst_port
+        if port is not None:
+            name = self.exact.get((proto, port))
+            if name is not None:
+                return name
+            table = self.port_ranges.get(proto)
+            if table is not None and table[port]:
+                return self.class_names[table[port] - 1]
+        if self.dscp:
+            name = self.dscp.get(headers.dscp)
+            if name is not None:
+                return name
+        if self.dst_subnets.size:
+            name = self.dst_subnets.lookup(headers.ip_dst)
+            if name is not None:
+                return name
+        if self.src_subnets.size:
+            name = self.src_subnets.lookup(headers.ip_src)
+            if name is not None:
+                return name
+        return self.proto_default.get(proto, self.default)
+
+    def openflow_entries(self):
+        """Render the table as (flow priority, match fields, class) tuples.
+
+        Matches are meant for an IPv4 (eth_type 0x0800) classification table.
+        Port ranges wider than MAX_EXPANDED_PORTS and port rules on protocols
+        without an OXM port field get no entry, so their packets match the
+        protocol default entry (band _BAND_PROTO) when there is one, and the
+        table default otherwise.
+        """
+        entries = []
+        for (proto, port), name in self.exact.items():
+            if proto in PORT_FIELDS:
+                entries.append((_BAND_EXACT, {'ip_proto': proto, PORT_FIELDS[proto]: port}, name))
+        seen = set(self.exact)
+        for proto, lo, hi, name in self.range_rules:
+            if proto not in PORT_FIELDS or hi - lo >= MAX_EXPANDED_PORTS:
+                continue
+            for port in range(lo, hi + 1):
+                if (proto, port) not in seen:
+                    seen.add((proto, port))
+                    entries.append((_BAND_RANGE, {'ip_proto': proto, PORT_FIELDS[proto]: port}, name))
+        for dscp, name in self.dscp.items():
+            entries.append((_BAND_DSCP, {'ip_dscp': dscp}, name))
+        for field, network, prefix_len, name in self.subnet_rules:
+            if (field, network, prefix_len) in seen:
+                continue
+            seen.add((field, network, prefix_len))
+            band = _BAND_DST if field == 'ipv4_dst' else _BAND_SRC
+            mask = (0xffffffff << (32 - prefix_len)) & 0xffffffff
+            entries.append((band + prefix_len,
+                            {field: (socket.inet_ntoa(struct.pack('!I', network)),
+                                     socket.inet_ntoa(struct.pack('!I', mask)))},
+                            name))
+        for proto, name in self.proto_default.items():
+            entries.append((_BAND_PROTO, {'ip_proto': proto}, name))
+        return entries
+
+    def priority_value(self, name):
+        return self.classes.get(name, self.classes[self.default])[0]
+
+    def queue(self, name):
+        return self.classes.get(name, self.classes[self.default])[1]
+
+    def class_weight(self, name):
+        return self.classes.get(name, self.classes[self.default])[2]
+
+    def cookie(self, name):
+        """Cookie encoding class `name`, its weight and its queue."""
+        if name not in self.classes:
+            name = self.default
+        _, queue_id, weight = self.classes[name]
+        code = self.class_names.index(name) + 1
+        return COOKIE_TAG << 48 | (weight & 0xff) << 16 | code << 8 | (queue_id & 0xff)
+
+    def meter_id(self, name):
+        """OpenFlow meter id of class `name`; the class code of its cookie."""
+        if name not in self.classes:
+            name = self.default
+        return self.class_names.index(name) + 1
+
+    def class_cookie(self, name):
+        """(cookie, cookie_mask) selecting every flow of class `name`."""
+        return self.cookie(name) & COOKIE_CLASS_MASK, COOKIE_CLASS_MASK
+
+    def demoted_cookie(self, name):
+        """(cookie, cookie_mask) selecting the flows demoted into class `name`."""
+        return (self.cookie(name) & COOKIE_CLASS_MASK | COOKIE_DEMOTED,
+                COOKIE_CLASS_MASK | COOKIE_DEMOTED)
+
+
+class RuleLoader(object):
+    """Keeps a RuleTable in sync with its file, reloading on mtime change."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        self.table = RuleTable.from_file(path)
+
+    def reload_if_changed(self):
+        """Return True when a new table was loaded.
+
+        A file that fails to parse raises and leaves the current table active.
+        """
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self.mtime:
+            return False
+        self.table = RuleTable.from_file(self.path)
+        # Only now, so a file that failed to parse is tried again next time.
+        self.mtime = mtime
+        return True
@@ -0,0 +1,71 @@
+"""Compact snapshots of controller state for warm restarts.
+
+A snapshot is one msgpack map. It is written to a temporary file that is
+renamed over the previous snapshot, so a crash while writing leaves the
+last good one in place. A BoundedStore is packed as three byte strings:
+its keys at a fixed size each, then its values and the ages of the entries
+as little-endian uint32. A learned MAC takes 14 bytes and a tracked flow
+32. Ages rather than write times are kept, because the stores run on the
+monotonic clock, which means nothing to the next process.
+"""
+import os
+import time
+
+import msgpack
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def save(path, state):
+    """Write the msgpack-able dict `state` to `path`; returns the size in bytes."""
+    data = msgpack.packb(dict(state, version=FORMAT_VERSION, saved=time.time()),
+                         use_bin_type=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(data)
+
+
+def load(path):
+    """The state saved at `path`, or None if there is no snapshot.
+
+    `saved` is replaced by the seconds since it was written. Raises
+    ValueError for a file that is not a snapshot of this format version.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        state = msgpack.unpackb(data, raw=False)
+    except ValueError as e:
+        raise ValueError("%s is not a readable snapshot: %s" % (path, e))
+    if not isinstance(state, dict) or state.get('version') != FORMAT_VERSION:
+        raise ValueError("%s is not a version %d snapshot" % (path, FORMAT_VERSION))
+    state['saved'] = max(0.0, time.time() - state['saved'])
+    return state
+
+
+def pack_store(store, key_to_bytes):
+    """[keys, values, ages] of a BoundedStore; key_to_bytes gives every key the same size."""
+    keys, values, ages = store.dump()
+    return [b''.join(key_to_bytes(k) for k in keys),
+            np.array(values, '<u4').tobytes(), np.array(ages, '<u4').tobytes()]
+
+
+def unpack_store(store, packed, key_size, key_from_bytes, downtime=0):
+    """Restore pack_store() output into an empty store; entries age by `downtime` seconds."""
+    keys, values, ages = packed
+    values = np.frombuffer(values, '<u4')
+    ages = np.frombuffer(ages, '<u4').astype(np.int64) + int(downtime)
+    if len(keys) != key_size * len(values) or len(ages) != len(values):
+        raise ValueError("snapshot store has %d bytes of keys for %d values"
+                         % (len(keys), len(values)))
+    store.restore([key_from_bytes(keys[i:i + key_size]) for i in range(0, len(keys), key_size)],
+                  values.tolist(), ages.tolist())
+    return len(values)
@@ -0,0 +1,332 @@
+import os
+import socket
+import struct
+import time
+
+from ryu.lib import hub
+
+MAGIC = b'SY'
+FORMAT_VERSION = 2
+# magic, format version, sender node, datagram seq, #loads, #owners, #macs, #handovers
+HEADER = struct.Struct('!2sBHIHHHH')
+LOAD = struct.Struct('!QIHff')     # dpid, version, origin, pps, bps
+OWNER = struct.Struct('!QIHQ')     # dpid, version, origin, controller
+MAC = struct.Struct('!6sIHQI')     # mac, version, origin, dpid, port
+# Values of a retracted record: no load, no owner, no location.
+TOMBSTONES = {'load': (-1.0, -1.0), 'owner': (0,), 'mac': (0, 0)}
+HANDOVER = struct.Struct('!QIHHBQ')  # dpid, handover id, src, dst, message, generation
+MAX_DATAGRAM = 8192
+MAX_VERSION = (1 << 32) - 1
+
+
+def mac_bytes(mac):
+    return bytes.fromhex(mac.replace(':', ''))
+
+
+def mac_str(raw):
+    return ':'.join('%02x' % b for b in raw)
+
+
+class StateSync(object):
+    """Gossip of switch loads, ownership and MAC locations between controllers.
+
+    Every record carries a Lamport version and the id of the node that wrote
+    it; a record replaces the stored one only if (version, origin) is newer,
+    so deltas can arrive in any order or twice. Local changes are queued as
+    dirty and sent as fixed-size struct records in as few datagrams as fit
+    under MAX_DATAGRAM. A periodic full sync, in which every node repeats
+    the records it wrote, repairs lost datagrams.
+
+    Records are removed with a tombstone, a newer version carrying the
+    TOMBSTONES values, which the listener sees as a record of None. A record
+    that its origin has neither written nor repeated for `ttl` seconds
+    expires the same way, so the state of a node that died goes away; this
+    node's own loads and owners stay until retracted, and its own MAC
+    records as long as holds_mac(mac bytes, dpid, port) is true. Tombstones
+    expire after `ttl` too, by when every copy of what they replaced has.
+
+    Handover messages between the two controllers of a switch migration are
+    not state: they are sent once with the next flush, never merged or
+    repeated, and handed to the listener as they arrive.
+
+    `bind` and `peers` are (host, port) tuples for UDP or filesystem paths
+    for Unix datagram sockets. Nothing is bound until start().
+    """
+
+    def __init__(self, node_id, bind, peers, full_sync_period=30.0, listener=None, ttl=None,
+                 clock=time.monotonic, holds_mac=None):
+        self.node_id = node_id
+        self.bind = bind
+        self.peers = list(peers)
+        self.full_sync_period = full_sync_period
+        self.ttl = 3 * full_sync_period if ttl is None else ttl
+        self.clock = clock
+        self.listener = listener   # called as listener(kind, key, record) on remote updates
+        self.holds_mac = holds_mac
+        self.sock = None
+        self.version = 0
+        self.seq = 0
+        self.loads = {}            # dpid -> (version, origin, pps, bps)
+        self.owners = {}           # dpid -> (version, origin, controller)
+        self.macs = {}             # mac bytes -> (version, origin, dpid, port)
+        self.written = {'load': {}, 'owner': {}, 'mac': {}}  # kind -> key -> time last written
+        self.dirty_loads = set()
+        self.dirty_owners = set()
+        self.dirty_macs = set()
+        self.handovers = []        # (dpid, handover id, src, dst, message, generation) to send
+        self.peer_seq = {}         # node -> last datagram seq received
+        self.sent_bytes = 0
+        self.sent_datagrams = 0
+        self.received_datagrams = 0
+        self.applied = 0
+        self.stale = 0
+        self.gaps = 0
+        self.expired = 0
+        self.send_errors = 0
+
+    def start(self):
+        family = socket.AF_UNIX if isinstance(self.bind, str) else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        if family == socket.AF_UNIX and os.path.exists(self.bind):
+            os.unlink(self.bind)
+        self.sock.bind(self.bind)
+        self.full_sync()
+        return [hub.spawn(self._recv_loop), hub.spawn(self._full_sync_loop)]
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _tick(self, seen=0):
+        self.version = (max(self.version, seen) + 1) & MAX_VERSION
+        return self.version
+
+    # Local writes
+
+    def set_load(self, dpid, pps, bps):
+        self.loads[dpid] = (self._tick(), self.node_id, pps, bps)
+        self.written['load'][dpid] = self.clock()
+        self.dirty_loads.add(dpid)
+
+    def set_owner(self, dpid, controller):
+        current = self.owners.get(dpid)
+        if current is not None and current[2] == controller:
+            return
+        self.owners[dpid] = (self._tick(), self.node_id, controller)
+        self.written['owner'][dpid] = self.clock()
+        self.dirty_owners.add(dpid)
+
+    def set_mac(self, mac, dpid, port):
+        raw = mac_bytes(mac)
+        current = self.macs.get(raw)
+        if current is not None and current[2] == dpid and current[3] == port:
+            if current[1] == self.node_id:
+                self.written['mac'][raw] = self.clock()  # seen again, keep it from expiring
+            return
+        self.macs[raw] = (self._tick(), self.node_id, dpid, port)
+        self.written['mac'][raw] = self.clock()
+        self.dirty_macs.add(raw)
+
+    def retract_load(self, dpid):
+        """Withdraw the load of dpid if this node reported it."""
+        current = self.loads.get(dpid)
+        if current is not None and current[1] == self.node_id and current[2] >= 0:
+            self.loads[dpid] = (self._tick(), self.node_id) + TOMBSTONES['load']
+            self.written['load'][dpid] = self.clock()
+            self.dirty_loads.add(dpid)
+
+    def retract_owner(self, dpid, controller):
+        """Withdraw the owner record of dpid if it still names `controller`."""
+        if self.owner(dpid) == controller:
+            self.owners[dpid] = (self._tick(), self.node_id) + TOMBSTONES['owner']
+            self.written['owner'][dpid] = self.clock()
+            self.dirty_owners.add(dpid)
+
+    def send_handover(self, dpid, handover_id, src, dst, message, generation=0):
+        """Queue a migration_executor message for the controllers of a handover."""
+        self.handovers.append((dpid, handover_id, src, dst, message, generation))
+
+    # Queries
+
+    def peer_loads(self, metric='pps'):
+        """dpid -> load for switches whose load another node reports."""
+        index = 2 if metric == 'pps' else 3
+        return dict((dpid, rec[index]) for dpid, rec in self.loads.items()
+                    if rec[1] != self.node_id and rec[2] >= 0)
+
+    def owner(self, dpid):
+        rec = self.owners.get(dpid)
+        return None if rec is None or not rec[2] else rec[2]
+
+    def mac_location(self, mac):
+        rec = self.macs.get(mac_bytes(mac))
+        return None if rec is None or not rec[2] else (rec[2], rec[3])
+
+    def expire(self):
+        """Drop records and tombstones past their ttl; returns how many."""
+        now = self.clock()
+        cutoff = now - self.ttl
+        expired = 0
+        for kind, table, dirty in (('load', self.loads, self.dirty_loads),
+                                   ('owner', self.owners, self.dirty_owners),
+                                   ('mac', self.macs, self.dirty_macs)):
+            written = self.written[kind]
+            tombstone = TOMBSTONES[kind]
+            for key in [k for k, t in written.items() if t < cutoff]:
+                rec = table[key]
+                dead = rec[2:] == tombstone
+                if not dead and rec[1] == self.node_id:
+                    if kind != 'mac':
+                        continue  # ours until retracted
+                    if self.holds_mac is not None and self.holds_mac(key, rec[2], rec[3]):
+                        written[key] = now  # host still there, ask again in a ttl
+                        continue
+                del table[key]
+                del written[key]
+                dirty.discard(key)
+                expired += 1
+                if not dead and self.listener is not None:
+                    self.listener(kind, key, None)
+        self.expired += expired
+        return expired
+
+    # Wire format
+
+    def encode(self, loads, owners, macs, handovers=()):
+        """Pack the given keys and handover messages into datagrams of at most MAX_DATAGRAM bytes."""
+        datagrams = []
+        counts = [0, 0, 0, 0]
+        body = []
+        size = HEADER.size
+
+        def close():
+            self.seq = (self.seq + 1) & 0xffffffff
+            header = HEADER.pack(MAGIC, FORMAT_VERSION, self.node_id, self.seq, *counts)
+            datagrams.append(header + b''.join(body))
+
+        for kind, (fmt, keys, table) in enumerate(((LOAD, loads, self.loads),
+                                                  (OWNER, owners, self.owners),
+                                                  (MAC, macs, self.macs))):
+            for key in keys:
+                rec = table.get(key)
+                if rec is None:
+                    continue
+                if size + fmt.size > MAX_DATAGRAM:
+                    close()
+                    counts = [0, 0, 0, 0]
+                    body = []
+                    size = HEADER.size
+                body.append(fmt.pack(key, *rec))
+                counts[kind] += 1
+                size += fmt.size
+        for message in handovers:
+            if size + HANDOVER.size > MAX_DATAGRAM:
+                close()
+                counts = [0, 0, 0, 0]
+                body = []
+                size = HEADER.size
+            body.append(HANDOVER.pack(*message))
+            counts[3] += 1
+            size += HANDOVER.size
+        if body:
+            close()
+        return datagrams
+
+    def decode(self, data):
+        """Apply one datagram; returns the number of records that were newer."""
+        if len(data) < HEADER.size:
+            return 0
+        magic, fmt_version, sender, seq, n_loads, n_owners, n_macs, n_handovers = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or fmt_version != FORMAT_VERSION or sender == self.node_id:
+            return 0
+        if HEADER.size + n_loads * LOAD.size + n_owners * OWNER.size + n_macs * MAC.size + \
+                n_handovers * HANDOVER.size > len(data):
+            return 0
+        last = self.peer_seq.get(sender)
+        if last is not None and (seq - last) & 0xffffffff > 1:
+            self.gaps += 1
+        self.peer_seq[sender] = seq
+        self.received_datagrams += 1
+        applied = 0
+        offset = HEADER.size
+        for kind, fmt, count, table in (('load', LOAD, n_loads, self.loads),
+                                        ('owner', OWNER, n_owners, self.owners),
+                                        ('mac', MAC, n_macs, self.macs)):
+            written = self.written[kind]
+            tombstone = TOMBSTONES[kind]
+            now = self.clock()
+            for fields in fmt.iter_unpack(data[offset:offset + count * fmt.size]):
+                key, rec = fields[0], fields[1:]
+                current = table.get(key)
+                if current is not None and (current[0], current[1]) >= (rec[0], rec[1]):
+                    if (current[0], current[1]) == (rec[0], rec[1]):
+                        written[key] = now  # repeated by its origin, still alive
+                    self.stale += 1
+                    continue
+                table[key] = rec
+                written[key] = now
+                self._tick(rec[0])
+                applied += 1
+                if self.listener is not None:
+                    self.listener(kind, key, None if rec[2:] == tombstone else rec)
+            offset += count * fmt.size
+        if self.listener is not None:
+            for fields in HANDOVER.iter_unpack(data[offset:offset + n_handovers * HANDOVER.size]):
+                self.listener('handover', fields[0], fields[1:])
+        self.applied += applied
+        return applied
+
+    # Transport
+
+    def flush(self):
+        """Send queued local changes to every peer."""
+        if self.sock is None or not (self.dirty_loads or self.dirty_owners or self.dirty_macs or
+                                     self.handovers):
+            return 0
+        datagrams = self.encode(self.dirty_loads, self.dirty_owners, self.dirty_macs,
+                                self.handovers)
+        self.dirty_loads = set()
+        self.dirty_owners = set()
+        self.dirty_macs = set()
+        self.handovers = []
+        return self._send(datagrams)
+
+    def full_sync(self):
+        if self.sock is None:
+            return 0
+        node = self.node_id
+        return self._send(self.encode([k for k, rec in self.loads.items() if rec[1] == node],
+                                      [k for k, rec in self.owners.items() if rec[1] == node],
+                                      [k for k, rec in self.macs.items() if rec[1] == node]))
+
+    def _send(self, datagrams):
+        sent = 0
+        for data in datagrams:
+            for peer in self.peers:
+                try:
+                    self.sock.sendto(data, peer)
+                except OSError:
+                    self.send_errors += 1  # peer not up yet, the full sync catches up
+                    continue
+                sent += len(data)
+                self.sent_datagrams += 1
+        self.sent_bytes += sent
+        return sent
+
+    def _recv_loop(self):
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(65535)
+            except OSError:
+                if self.sock is None:
+                    return
+                continue
+            self.decode(data)
+
+    def _full_sync_loop(self):
+        while self.sock is not None:
+            hub.sleep(self.full_sync_period)
+            self.expire()
+            self.full_sync()
@@ -0,0 +1,107 @@
+import heapq
+import random
+import time
+
+
+class PollScheduler(object):
+    """Decides when each datapath is polled for stats.
+
+    New datapaths get a random first poll within `period`, so polls are
+    spread over the interval instead of going out together. After each reply
+    the datapath's interval adapts: it halves while the load moves by more
+    than `fast_change` or the switch is marked hot (e.g. its controller is
+    near the migration threshold), grows by half while the load stays within
+    `idle_change`, and otherwise drifts back to `period`. Every poll is
+    jittered by +-`jitter`. At most `max_outstanding` polls wait for a reply;
+    a poll not answered within `reply_timeout` is given up and rescheduled.
+    """
+
+    def __init__(self, period=10.0, min_period=2.0, max_period=60.0, max_outstanding=16,
+                 reply_timeout=5.0, fast_change=0.2, idle_change=0.05, jitter=0.1,
+                 clock=time.monotonic, rnd=None):
+        self.period = period
+        self.min_period = min_period
+        self.max_period = max_period
+        self.max_outstanding = max_outstanding
+        self.reply_timeout = reply_timeout
+        self.fast_change = fast_change
+        self.idle_change = idle_change
+        self.jitter = jitter
+        self.clock = clock
+        self.rnd = rnd or random.Random()
+        self.queue = []          # heap of (due time, dpid)
+        self.due_at = {}         # dpid -> due time of its live queue entry
+        self.intervals = {}      # dpid -> current polling interval
+        self.last_load = {}
+        self.outstanding = {}    # dpid -> time the poll was sent
+        self.polls = 0
+        self.timeouts = 0
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, dpid):
+        if dpid in self.intervals:
+            return
+        self.intervals[dpid] = self.period
+        self._schedule(dpid, self.clock() + self.rnd.uniform(0, self.period))
+
+    def remove(self, dpid):
+        self.intervals.pop(dpid, None)
+        self.due_at.pop(dpid, None)
+        self.last_load.pop(dpid, None)
+        self.outstanding.pop(dpid, None)
+
+    def _schedule(self, dpid, when):
+        self.due_at[dpid] = when
+        heapq.heappush(self.queue, (when, dpid))
+
+    def due(self):
+        """Pop the datapaths to poll now, as many as the outstanding cap allows."""
+        now = self.clock()
+        for dpid, sent in list(self.outstanding.items()):
+            if now - sent > self.reply_timeout:
+                del self.outstanding[dpid]
+                self.timeouts += 1
+                self._schedule(dpid, now + self.intervals[dpid])
+        ready = []
+        queue = self.queue
+        while queue and queue[0][0] <= now and len(self.outstanding) < self.max_outstanding:
+            when, dpid = heapq.heappop(queue)
+            if self.due_at.get(dpid) != when:
+                continue  # removed or rescheduled since
+            del self.due_at[dpid]
+            self.outstanding[dpid] = now
+            ready.append(dpid)
+        self.polls += len(ready)
+        return ready
+
+    def done(self, dpid, load=None, hot=False):
+        """Record the reply to a poll and schedule the next one."""
+        sent = self.outstanding.pop(dpid, None)
+        if sent is None or dpid not in self.intervals:
+            return
+        interval = self.intervals[dpid]
+        last = self.last_load.get(dpid)
+        if load is not None:
+            self.last_load[dpid] = load
+        change = None
+        if load is not None and last is not None:
+            change = abs(load - last) / max(abs(last), 1e-9)
+        if hot or (change is not None and change > self.fast_change):
+            interval = max(self.min_period, interval / 2)
+        elif change is not None and change < self.idle_change:
+            interval = min(self.max_period, interval * 1.5)
+        else:
+            interval = (interval + self.period) / 2
+        self.intervals[dpid] = interval
+        jitter = self.rnd.uniform(1 - self.jitter, 1 + self.jitter)
+        self._schedule(dpid, sent + interval * jitter)
+
+    def sleep_time(self, tick=0.1):
+        """Seconds until the next poll is due, at most `tick` while capped."""
+        if not self.queue:
+            return tick
+        if len(self.outstanding) >= self.max_outstanding:
+            return tick
+        return min(max(self.queue[0][0] - self.clock(), 0.0), self.period)
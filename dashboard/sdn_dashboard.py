@@ -1,103 +1,185 @@
-import streamlit as st
-import re
-import pandas as pd
-
-def read_file(filename):
-    try:
-        with open(filename) as f:
-            return f.read()
-    except FileNotFoundError:
-        return None
-
-def parse_flow_table(flow_table_str):
-    entries = []
-    for line in flow_table_str.strip().splitlines():
-        queue_match = re.search(r"set_queue:(\d+)", line)
-        priority_match = re.search(r"priority=(\d+)", line)
-        src_match = re.search(r"dl_src=([\w:]+)", line)
-        dst_match = re.search(r"dl_dst=([\w:]+)", line)
-        in_port_match = re.search(r'in_port="?([\w-]+)"?', line)
-        if queue_match and priority_match and src_match and dst_match and in_port_match:
-            entries.append({
-                "Priority": priority_match.group(1),
-                "In Port": in_port_match.group(1),
-                "Source": src_match.group(1),
-                "Destination": dst_match.group(1),
-                "QoS Queue": queue_match.group(1)
-            })
-    return entries
-
-# Page title and layout
-st.set_page_config(page_title="SDN IoT Gateway", layout="wide")
-st.title("SDN IoT Gateway")
-
-# Performance Metrics Section
-st.header("Performance Metrics")
-
-# Read iperf and ping output from files
-iperf_text = read_file("iperf.txt")
-ping_text = read_file("ping.txt")
-
-# Parse throughput from iperf output
-throughput_line = None
-if iperf_text:
-    for line in iperf_text.splitlines():
-        if 'Mbits/sec' in line:
-            throughput_line = line.strip()
-            break
-
-# Parse packet loss and latency via regex on ping line
-packet_loss_val = None
-latency_val = None
-if ping_text:
-    for line in ping_text.splitlines():
-        if "Packet Loss =" in line:
-            packet_loss_line = line.strip()
-            loss_match = re.search(r"Packet Loss = ([\d\.]+)%", packet_loss_line)
-            latency_match = re.search(r"Average Latency = ([\d\.]+) ms", packet_loss_line)
-            if loss_match:
-                packet_loss_val = loss_match.group(1)
-            if latency_match:
-                latency_val = latency_match.group(1)
-
-# Display Throughput
-if throughput_line:
-    try:
-        throughput_val = throughput_line.split()[-2]
-        st.metric("Throughput (Mbits/sec)", throughput_val)
-    except Exception:
-        st.info("Throughput data format issue")
-else:
-    st.info("Throughput data not available yet.")
-
-# Display Packet Loss
-if packet_loss_val is not None:
-    st.metric("Packet Loss (%)", packet_loss_val)
-else:
-    st.info("Packet loss data not available yet.")
-
-# Display Average Latency
-if latency_val is not None:
-    st.metric("Average Latency (ms)", latency_val)
-else:
-    st.info("Latency data not available yet.")
-
-# Flow Table summary section
-st.header("Flow Table Summary")
-for switch in ["s1", "s2", "s3"]:
-    st.subheader(f"Switch {switch.upper()}")
-    flow_text = read_file(f"flows_{switch}.txt")
-    if flow_text:
-        flow_entries = parse_flow_table(flow_text)
-        if flow_entries:
-            df = pd.DataFrame(flow_entries)
-            st.table(df)
-            st.caption(f"Total parsed flows: {len(flow_entries)}")
-        else:
-            if switch == "s2":
-                st.info("Switch s2 currently operates mostly with default flow rules; no detailed flow entries detected.")
-            else:
-                st.info(f"No detailed flow entries found for switch {switch}.")
-    else:
-        st.info(f"Flow data for switch {switch} is not available yet.")
-
+import streamlit as st
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "topology"))
+import flow_dump
+
+# Live metrics from enhanced_traffic_controller (ryu-manager --wsapi-port)
+METRICS_URL = os.environ.get("SDN_METRICS_URL", "http://127.0.0.1:8080/metrics")
+HISTORY_STEP = 10  # seconds per point when the history is first loaded
+MAX_POINTS = 3600  # points kept per series in the browser session
+REFRESH_SECONDS = 2
+MAX_TABLE_ROWS = 200  # flow rows shown as a static table
+
+def read_file(filename):
+    try:
+        with open(filename) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+@st.cache_resource
+def flow_dump_reader(filename):
+    return flow_dump.FlowDumpReader(filename)
+
+@st.cache_data(max_entries=3)  # the latest dump of each switch
+def load_flow_table(filename, mtime):
+    # A new mtime only parses the lines appended since the last one
+    reader = flow_dump_reader(filename)
+    reader.update()
+    return reader.table.to_frame()
+
+def flow_table_summary(frame):
+    qos = frame[(frame["queue"] >= 0) & (frame["in_port"] != "")
+                & (frame["dl_src"] != "") & (frame["dl_dst"] != "")]
+    return qos[["priority", "in_port", "dl_src", "dl_dst", "queue", "n_packets", "n_bytes"]].rename(
+        columns={"priority": "Priority", "in_port": "In Port", "dl_src": "Source",
+                 "dl_dst": "Destination", "queue": "QoS Queue", "n_packets": "Packets",
+                 "n_bytes": "Bytes"})
+
+def fetch_metrics(since, step=None):
+    url = f"{METRICS_URL}?since={since}"
+    if step:
+        url += f"&step={step}"
+    try:
+        with urllib.request.urlopen(url, timeout=2) as resp:
+            return json.load(resp)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+def merge_metrics(metrics, update):
+    for metric, series in update["series"].items():
+        for key, points in series.items():
+            times, values = metrics.setdefault(metric, {}).setdefault(key, ([], []))
+            times.extend(points["t"])
+            values.extend(points["v"])
+            del times[:-MAX_POINTS]
+            del values[:-MAX_POINTS]
+
+def series_label(key):
+    # "1" is switch s1, "1/2" is queue 2 on s1
+    dpid, _, queue = key.partition("/")
+    return f"s{dpid} q{queue}" if queue else f"s{dpid}"
+
+def metric_frame(metrics, metric):
+    columns = {}
+    for key, (times, values) in sorted(metrics.get(metric, {}).items()):
+        columns[series_label(key)] = pd.Series(values, index=pd.to_datetime(times, unit="s"))
+    return pd.DataFrame(columns) if columns else None
+
+# Page title and layout
+st.set_page_config(page_title="SDN IoT Gateway", layout="wide")
+st.title("SDN IoT Gateway")
+
+# Performance Metrics Section
+st.header("Performance Metrics")
+
+# Read iperf and ping output from files
+iperf_text = read_file("iperf.txt")
+ping_text = read_file("ping.txt")
+
+# Parse throughput from iperf output
+throughput_line = None
+if iperf_text:
+    for line in iperf_text.splitlines():
+        if 'Mbits/sec' in line:
+            throughput_line = line.strip()
+            break
+
+# Parse packet loss and latency via regex on ping line
+packet_loss_val = None
+latency_val = None
+if ping_text:
+    for line in ping_text.splitlines():
+        if "Packet Loss =" in line:
+            packet_loss_line = line.strip()
+            loss_match = re.search(r"Packet Loss = ([\d\.]+)%", packet_loss_line)
+            latency_match = re.search(r"Average Latency = ([\d\.]+) ms", packet_loss_line)
+            if loss_match:
+                packet_loss_val = loss_match.group(1)
+            if latency_match:
+                latency_val = latency_match.group(1)
+
+# Display Throughput
+if throughput_line:
+    try:
+        throughput_val = throughput_line.split()[-2]
+        st.metric("Throughput (Mbits/sec)", throughput_val)
+    except Exception:
+        st.info("Throughput data format issue")
+else:
+    st.info("Throughput data not available yet.")
+
+# Display Packet Loss
+if packet_loss_val is not None:
+    st.metric("Packet Loss (%)", packet_loss_val)
+else:
+    st.info("Packet loss data not available yet.")
+
+# Display Average Latency
+if latency_val is not None:
+    st.metric("Average Latency (ms)", latency_val)
+else:
+    st.info("Latency data not available yet.")
+
+# Live metrics: the first run loads downsampled history, later runs only the new samples
+st.header("Live Controller Metrics")
+if "metrics_cursor" not in st.session_state:
+    st.session_state.metrics_cursor = None
+    st.session_state.metrics = {}
+cursor = st.session_state.metrics_cursor
+if cursor is None:
+    update = fetch_metrics(0, HISTORY_STEP)
+else:
+    update = fetch_metrics(cursor)
+if update is not None:
+    merge_metrics(st.session_state.metrics, update)
+    st.session_state.metrics_cursor = update["cursor"]
+if update is None and cursor is None:
+    st.info(f"Controller metrics not reachable at {METRICS_URL}.")
+else:
+    charts = [("load", "Switch Load (weighted packets)"),
+              ("packet_in_rate", "Packet-in Rate (per second)"),
+              ("install_p99_ms", "Flow Install Latency p99 (ms)"),
+              ("queue_packets", "Packets per Queue")]
+    for metric, title in charts:
+        frame = metric_frame(st.session_state.metrics, metric)
+        st.subheader(title)
+        if frame is not None:
+            st.line_chart(frame)
+        else:
+            st.info("No samples yet.")
+live = st.checkbox("Auto-refresh live metrics", value=True)
+
+# Flow Table summary section
+st.header("Flow Table Summary")
+for switch in ["s1", "s2", "s3"]:
+    st.subheader(f"Switch {switch.upper()}")
+    filename = f"flows_{switch}.txt"
+    if os.path.exists(filename):
+        flow_entries = flow_table_summary(load_flow_table(filename, os.path.getmtime(filename)))
+        if len(flow_entries):
+            # st.table renders every row; large tables go to the scrolling grid
+            if len(flow_entries) <= MAX_TABLE_ROWS:
+                st.table(flow_entries.reset_index(drop=True))
+            else:
+                st.dataframe(flow_entries.reset_index(drop=True))
+            st.caption(f"Total parsed flows: {len(flow_entries)}")
+        else:
+            if switch == "s2":
+                st.info("Switch s2 currently operates mostly with default flow rules; no detailed flow entries detected.")
+            else:
+                st.info(f"No detailed flow entries found for switch {switch}.")
+    else:
+        st.info(f"Flow data for switch {switch} is not available yet.")
+
+if live:
+    time.sleep(REFRESH_SECONDS)
+    st.experimental_rerun()
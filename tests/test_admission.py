@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_datapath import FakeDatapath, packet_in_event  # noqa: E402
+from proactive_bench import build, host_mac  # noqa: E402
+
+from ryu.lib.packet import arp, ethernet, packet  # noqa: E402
+
+import enhanced_traffic_controller  # noqa: E402
+
+BURST = 5
+
+
+class Controller(enhanced_traffic_controller.EnhancedTrafficController):
+    WARM_RESTART = False
+    PACKET_IN_RATE = 0.001
+    PACKET_IN_BURST = BURST
+
+
+def arp_request(src, dst):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet('ff:ff:ff:ff:ff:ff', host_mac(src), 0x0806))
+    pkt.add_protocol(arp.arp(src_mac=host_mac(src), dst_mac='00:00:00:00:00:00',
+                             src_ip='10.0.0.%d' % src, dst_ip='10.0.0.%d' % dst))
+    pkt.serialize()
+    return pkt.data
+
+
+def send(app, dp, data, times):
+    for _ in range(times):
+        app.packet_in_handler(packet_in_event(dp, data, 1))
+
+
+def test_idle_controller_sheds_nothing():
+    app = Controller()
+    dp = FakeDatapath(1)
+    low, _ = build(0, 1, 17, 9999)
+    assert app.classify_headers(app.parse_packet(low)) == 'LOW'
+    send(app, dp, low, 4 * BURST)
+    assert app.admission.shed['LOW'] == 0
+    assert app.admission.admitted['LOW'] == 4 * BURST
+
+
+def test_backed_up_controller_sheds_low_but_not_arp():
+    app = Controller()
+    dp = FakeDatapath(1)
+    app.events.put(None)  # an event still waiting for the loop
+    low, _ = build(0, 1, 17, 9999)
+    send(app, dp, low, 4 * BURST)
+    assert app.admission.shed['LOW'] == 3 * BURST
+    request = arp_request(0, 1)
+    assert app.classify_headers(app.parse_packet(request)) == 'LOW'
+    send(app, dp, request, BURST)
+    assert app.admission.shed['LOW'] == 3 * BURST
+    assert len(app.admission) == 2 * BURST
@@ -0,0 +1,153 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_datapath import FakeDatapath, meter_features_event  # noqa: E402
+
+import enhanced_traffic_controller  # noqa: E402
+import qos_rules  # noqa: E402
+
+MICE = 10
+MOUSE_RATE = 1000000  # bits/s
+ELEPHANT_RATE = 50000000
+INTERVAL = 10
+
+
+class Controller(enhanced_traffic_controller.EnhancedTrafficController):
+    WARM_RESTART = False
+
+
+class Switch(object):
+    """Flow table of one switch: answers stats requests and applies FlowMods."""
+
+    def __init__(self, app, dp):
+        self.app = app
+        self.dp = dp
+        self.flows = {}  # (match, priority) -> [cookie, bytes, bits/s, instructions, match]
+        self.now = 0.0
+        app.meters.clock = lambda: self.now
+        app.meter_features_reply_handler(meter_features_event(dp))
+        app.writer_for(dp).flush()
+
+    def install(self, i, rate):
+        dp, table = self.dp, self.app.rules.table
+        parser = dp.ofproto_parser
+        match = parser.OFPMatch(in_port=1, eth_dst='02:00:00:00:01:01',
+                                eth_src='02:00:00:00:00:%02x' % i)
+        inst = self.app.meter_instructions(dp, 'MEDIUM') + [parser.OFPInstructionActions(
+            dp.ofproto.OFPIT_APPLY_ACTIONS,
+            [parser.OFPActionSetQueue(table.queue('MEDIUM')), parser.OFPActionOutput(2)])]
+        key = (str(match), table.priority_value('MEDIUM'))
+        self.flows[key] = [table.cookie('MEDIUM'), 0, rate, inst, match]
+        return key
+
+    def selected(self, req):
+        for (_, priority), (cookie, nbytes, _, inst, match) in self.flows.items():
+            if cookie & req.cookie_mask == req.cookie & req.cookie_mask:
+                yield priority, cookie, nbytes, inst, match
+
+    def round(self):
+        dp = self.dp
+        ofproto, parser = dp.ofproto, dp.ofproto_parser
+        self.now += INTERVAL
+        for flow in self.flows.values():
+            flow[1] += flow[2] * INTERVAL // 8
+        mark = len(dp.sent)
+        self.app.request_stats(dp)
+        for req in dp.sent[mark:]:
+            if isinstance(req, parser.OFPAggregateStatsRequest):
+                flows = list(self.selected(req))
+                body = parser.OFPAggregateStats(packet_count=sum(f[2] for f in flows) // 1000,
+                                                byte_count=sum(f[2] for f in flows),
+                                                flow_count=len(flows))
+                reply = parser.OFPAggregateStatsReply(dp, body=body)
+                handler = self.app.aggregate_stats_reply_handler
+            else:
+                body = [parser.OFPFlowStats(table_id=0, duration_sec=1, duration_nsec=0,
+                                            priority=priority, idle_timeout=30, hard_timeout=0,
+                                            flags=0, cookie=cookie, packet_count=nbytes // 1000,
+                                            byte_count=nbytes, match=match, instructions=inst)
+                        for priority, cookie, nbytes, inst, match in self.selected(req)]
+                reply = parser.OFPFlowStatsReply(dp, body=body, flags=0)
+                handler = self.app.flow_stats_reply_handler
+            reply.xid = req.xid
+            handler(SimpleNamespace(msg=reply))
+        mark = len(dp.sent)
+        self.app.writer_for(dp).flush()
+        mods = [m for m in dp.sent[mark:] if isinstance(m, parser.OFPFlowMod)]
+        for mod in mods:
+            assert mod.command == ofproto.OFPFC_ADD
+            # An ADD over the same match and priority replaces the entry; its
+            # counters carry over unless OFPFF_RESET_COUNTS is set.
+            assert not mod.flags & ofproto.OFPFF_RESET_COUNTS
+            flow = self.flows[(str(mod.match), mod.priority)]
+            flow[0], flow[3] = mod.cookie, mod.instructions
+        return mods
+
+
+def test_demoted_elephant_leaves_medium_demand():
+    app = Controller()
+    dp = FakeDatapath(1)
+    switch = Switch(app, dp)
+    table = app.rules.table
+    elephant = switch.flows[switch.install(0, MOUSE_RATE)]
+    for i in range(1, MICE + 1):
+        switch.install(i, MOUSE_RATE)
+    switch.round()
+    assert not elephant[0] & qos_rules.COOKIE_DEMOTED
+
+    # Demand is measured before the dump, so this round's LOW meter still
+    # has the elephant in MEDIUM.
+    elephant[2] = ELEPHANT_RATE
+    switch.round()
+    medium = MICE * MOUSE_RATE
+    squeezed = app.LINK_CAPACITY - 1.2 * (medium + ELEPHANT_RATE)
+    assert abs(app.meters.installed[dp.id]['LOW'] - squeezed) < 0.01 * squeezed
+    cookie, _, _, inst, _ = elephant
+    assert cookie & qos_rules.COOKIE_DEMOTED
+    assert cookie & qos_rules.COOKIE_CLASS_MASK == table.class_cookie('LOW')[0]
+    assert inst[0].meter_id == table.meter_id('LOW')
+
+    for _ in range(12):
+        switch.round()
+    demand = app.meters.demand[dp.id]
+    assert abs(demand['MEDIUM'] - medium) < 0.01 * medium
+    assert abs(demand['LOW'] - ELEPHANT_RATE) < 0.01 * ELEPHANT_RATE
+    # LOW gets what MEDIUM leaves without the elephant, and the elephant
+    # stays demoted.
+    low = app.LINK_CAPACITY - 1.2 * medium
+    assert abs(app.meters.installed[dp.id]['LOW'] - low) < 0.1 * low
+    assert elephant[0] & qos_rules.COOKIE_DEMOTED
+
+
+def test_cooled_down_elephant_promoted():
+    app = Controller()
+    dp = FakeDatapath(1)
+    switch = Switch(app, dp)
+    table = app.rules.table
+    elephant = switch.flows[switch.install(0, ELEPHANT_RATE)]
+    for i in range(1, MICE + 1):
+        switch.install(i, MOUSE_RATE)
+    switch.round()
+    assert elephant[0] & qos_rules.COOKIE_DEMOTED
+    elephant[2] = MOUSE_RATE // 100
+    switch.round()
+    cookie, _, _, inst, _ = elephant
+    assert cookie == table.cookie('MEDIUM')
+    assert inst[0].meter_id == table.meter_id('MEDIUM')
+
+
+def test_demoted_flow_gone_not_reinstalled():
+    app = Controller()
+    dp = FakeDatapath(1)
+    switch = Switch(app, dp)
+    key = switch.install(0, ELEPHANT_RATE)
+    for i in range(1, MICE + 1):
+        switch.install(i, MOUSE_RATE)
+    switch.round()
+    assert switch.flows[key][0] & qos_rules.COOKIE_DEMOTED
+    del switch.flows[key]  # idled out
+    assert not switch.round()
+    assert not app.elephants.demoted[dp.id]
@@ -0,0 +1,86 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_datapath import FakeDatapath, meter_features_event, packet_in_event  # noqa: E402
+from proactive_bench import build  # noqa: E402
+
+import enhanced_traffic_controller  # noqa: E402
+
+
+class Controller(enhanced_traffic_controller.EnhancedTrafficController):
+    WARM_RESTART = False
+    ADMISSION = False
+
+
+class ProactiveController(Controller):
+    PROACTIVE = True
+
+
+def connect(app, features=None):
+    dp = FakeDatapath(1)
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    if features is not None:
+        app.meter_features_reply_handler(features(dp))
+    app.writer_for(dp).flush()
+    return dp
+
+
+def dns_flow(app, dp):
+    for src, dst in ((1, 0), (0, 1)):
+        data, fields = build(src, dst, 17, 53)
+        app.packet_in_handler(packet_in_event(dp, data, fields['in_port']))
+    app.writer_for(dp).flush()
+    return [m for m in dp.sent_of(dp.ofproto_parser.OFPFlowMod) if m.priority][-1]
+
+
+def has_meter(dp, mod):
+    return any(isinstance(i, dp.ofproto_parser.OFPInstructionMeter) for i in mod.instructions)
+
+
+def test_meters_after_features_confirm_them():
+    app = Controller()
+    dp = connect(app, meter_features_event)
+    assert len(dp.sent_of(dp.ofproto_parser.OFPMeterFeaturesStatsRequest)) == 1
+    assert len(dp.sent_of(dp.ofproto_parser.OFPMeterMod)) == len(app.rules.table.class_names)
+    assert has_meter(dp, dns_flow(app, dp))
+
+
+def test_no_meters_until_features_reply():
+    app = Controller()
+    dp = connect(app)
+    assert not dp.sent_of(dp.ofproto_parser.OFPMeterMod)
+    assert not has_meter(dp, dns_flow(app, dp))
+
+
+def test_no_meters_on_switch_without_them():
+    for features in (lambda dp: meter_features_event(dp, max_meter=0),
+                     lambda dp: meter_features_event(dp, band_types=0)):
+        app = Controller()
+        dp = connect(app, features)
+        assert not dp.sent_of(dp.ofproto_parser.OFPMeterMod)
+        assert not has_meter(dp, dns_flow(app, dp))
+
+
+def test_rejected_meter_reinstalls_table_without_meters():
+    app = ProactiveController()
+    dp = connect(app, meter_features_event)
+    ofproto, parser = dp.ofproto, dp.ofproto_parser
+    # Table 0 went in unmetered on connect, and again with meters on the reply.
+    qos = [m for m in dp.sent_of(parser.OFPFlowMod) if m.table_id == app.QOS_TABLE]
+    deletes = [i for i, m in enumerate(qos) if m.command == ofproto.OFPFC_DELETE]
+    assert len(deletes) == 1
+    assert not any(has_meter(dp, m) for m in qos[:deletes[0]])
+    assert all(has_meter(dp, m) for m in qos[deletes[0] + 1:])
+
+    mark = len(dp.sent)
+    error = parser.OFPErrorMsg(dp, type_=ofproto.OFPET_METER_MOD_FAILED,
+                               code=ofproto.OFPMMFC_OUT_OF_METERS, data=b'')
+    app.error_msg_handler(SimpleNamespace(msg=error))
+    app.writer_for(dp).flush()
+    mods = [m for m in dp.sent[mark:] if isinstance(m, parser.OFPFlowMod)]
+    assert mods[0].command == ofproto.OFPFC_DELETE
+    assert mods[1:] and not any(has_meter(dp, m) for m in mods[1:])
+    assert dp.id not in app.metered
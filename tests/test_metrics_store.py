@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from webob import Request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+import metrics_store  # noqa: E402
+
+
+def get(store, query):
+    req = Request.blank('/metrics?' + query)
+    controller = metrics_store.MetricsController(req, None, {'store': store})
+    return controller.get_metrics(req)
+
+
+def test_downsample_averages_buckets():
+    store = metrics_store.MetricsStore(clock=lambda: 0.0)
+    for t in range(6):
+        store.record('load', 1, t, t=float(t))
+    series = store.query(step=2)['series']['load']['1']
+    assert (series['t'], series['v']) == ([0.0, 2.0, 4.0], [0.5, 2.5, 4.5])
+
+
+@pytest.mark.parametrize('step', [0, -1, float('nan'), float('inf')])
+def test_downsample_rejects_bad_step(step):
+    with pytest.raises(ValueError):
+        metrics_store.downsample(np.zeros(0), np.zeros(0), step)
+
+
+@pytest.mark.parametrize('step', ['0', '-5', 'nan', 'inf', '-inf', 'ten'])
+def test_bad_step_is_a_bad_request(step):
+    store = metrics_store.MetricsStore()
+    store.record('load', 1, 1.0)
+    assert get(store, 'step=' + step).status_int == 400
+
+
+def test_step_query():
+    store = metrics_store.MetricsStore(clock=lambda: 0.0)
+    store.record('load', 1, 1.0)
+    resp = get(store, 'step=0.5&metric=load')
+    assert resp.status_int == 200
+    assert resp.json['series']['load']['1'] == {'t': [0.0], 'v': [1.0]}
@@ -0,0 +1,110 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_datapath import FakeDatapath  # noqa: E402
+
+from ryu.controller.handler import MAIN_DISPATCHER  # noqa: E402
+
+import decision_controller  # noqa: E402
+import enhanced_traffic_controller  # noqa: E402
+
+PEER = 1
+
+
+class Controller(decision_controller.DecisionController):
+    WARM_RESTART = False
+
+
+class TrafficController(enhanced_traffic_controller.EnhancedTrafficController):
+    WARM_RESTART = False
+
+
+def controller(switches):
+    """switches: dpid -> (owner, load, connected to this controller)."""
+    app = Controller()
+    app.threshold = 1.0
+    for dpid, (owner, load, connected) in switches.items():
+        app.switch_to_controller[dpid] = owner
+        app.switch_priority[dpid] = 'LOW'
+        app.sync.loads[dpid] = (1, PEER, float(load), 0.0)
+        if connected:
+            app.register_channel(dpid, app.NODE_ID, FakeDatapath(dpid))
+    app.controllers.update((app.NODE_ID, PEER))
+    return app
+
+
+def test_unreachable_switch_left_out_of_the_plan():
+    # The best single move is switch 10, which only the peer can reach.
+    app = controller({1: (Controller.NODE_ID, 0, True), 10: (PEER, 5, False),
+                      11: (PEER, 4, True), 12: (PEER, 1, True)})
+    app.migrate_switches()
+    assert app.switch_to_controller == {1: app.NODE_ID, 10: PEER,
+                                        11: app.NODE_ID, 12: app.NODE_ID}
+    assert set(app.last_migrated) == {10, 11, 12}
+
+
+def test_unreachable_switch_cools_down():
+    app = controller({1: (Controller.NODE_ID, 0, True), 10: (PEER, 5, False),
+                      13: (PEER, 3, False)})
+    app.migrate_switches()
+    assert app.switch_to_controller[13] == PEER
+    migrated = app.last_migrated[13]
+    # Not planned, and so not warned about, again until the cooldown is over.
+    app.migrate_switches()
+    assert app.last_migrated[13] == migrated
+
+
+def connect(app, dpid=1):
+    dp = FakeDatapath(dpid)
+    app._state_change_handler(SimpleNamespace(datapath=dp, state=MAIN_DISPATCHER))
+    return dp
+
+
+def answer_role(app, dp, role, generation):
+    """Reply to the last role request with the switch's current role; returns what follows."""
+    parser = dp.ofproto_parser
+    req = [m for m in dp.sent if isinstance(m, parser.OFPRoleRequest)][-1]
+    assert req.role == dp.ofproto.OFPCR_ROLE_NOCHANGE
+    reply = parser.OFPRoleReply(dp, role=role, generation_id=generation)
+    reply.xid = req.xid
+    mark = len(dp.sent)
+    app.executor.on_role_reply(dp, reply)
+    return [m for m in dp.sent[mark:] if isinstance(m, parser.OFPRoleRequest)]
+
+
+def test_non_owner_connects_as_slave():
+    app = TrafficController()
+    app.sync.owners[1] = (1, Controller.NODE_ID, Controller.NODE_ID)
+    dp = connect(app)
+    ofproto = dp.ofproto
+    follow = answer_role(app, dp, ofproto.OFPCR_ROLE_EQUAL, 7)
+    assert [(r.role, r.generation_id) for r in follow] == [(ofproto.OFPCR_ROLE_SLAVE, 7)]
+    assert app.sync.owner(1) == Controller.NODE_ID
+
+
+def test_first_controller_connects_as_master():
+    app = Controller()
+    dp = connect(app)
+    ofproto = dp.ofproto
+    follow = answer_role(app, dp, ofproto.OFPCR_ROLE_EQUAL, 0)
+    assert [r.role for r in follow] == [ofproto.OFPCR_ROLE_MASTER]
+    assert app.sync.owner(1) == app.NODE_ID
+    # Nothing to change the next time the role is checked.
+    app.executor.assign_role(dp, True)
+    assert not answer_role(app, dp, ofproto.OFPCR_ROLE_MASTER, 0)
+
+
+def test_slave_takes_over_a_released_switch():
+    app = TrafficController()
+    app.sync.owners[1] = (1, Controller.NODE_ID, Controller.NODE_ID)
+    dp = connect(app)
+    ofproto = dp.ofproto
+    answer_role(app, dp, ofproto.OFPCR_ROLE_EQUAL, 3)
+    del app.sync.owners[1]
+    app.sync_update('owner', 1, None)  # the owner disconnected from the switch
+    assert app.sync.owner(1) == app.NODE_ID
+    follow = answer_role(app, dp, ofproto.OFPCR_ROLE_SLAVE, 3)
+    assert [(r.role, r.generation_id) for r in follow] == [(ofproto.OFPCR_ROLE_MASTER, 3)]
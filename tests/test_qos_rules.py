@@ -0,0 +1,92 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controllers'))
+
+import qos_rules  # noqa: E402
+from fast_parser import Headers  # noqa: E402
+
+CLASSES = {
+    'HIGH': {'priority': 30, 'queue': 1, 'weight': 3},
+    'MEDIUM': {'priority': 20, 'queue': 2, 'weight': 2},
+    'LOW': {'priority': 10, 'queue': 3, 'weight': 1},
+}
+
+
+def table(*rules):
+    return qos_rules.RuleTable({'classes': CLASSES, 'default': 'LOW', 'rules': list(rules)})
+
+
+def headers(proto, dst='10.0.0.2', port=None, dscp=0):
+    ip = lambda a: int.from_bytes(bytes(int(b) for b in a.split('.')), 'big')  # noqa: E731
+    return Headers('00:00:00:00:00:01', '00:00:00:00:00:02', 0x0800,
+                   proto, ip('10.0.0.1'), ip(dst), dscp, 40000, port)
+
+
+def test_single_selectors():
+    rules = table({'proto': 'tcp', 'dst_port': 80, 'class': 'HIGH'},
+                  {'dscp': 46, 'class': 'HIGH'},
+                  {'dst': '10.1.0.0/16', 'class': 'MEDIUM'},
+                  {'proto': 'udp', 'class': 'MEDIUM'})
+    assert rules.classify(headers(6, port=80)) == 'HIGH'
+    assert rules.classify(headers(6, port=81, dscp=46)) == 'HIGH'
+    assert rules.classify(headers(6, dst='10.1.2.3', port=81)) == 'MEDIUM'
+    assert rules.classify(headers(17, port=81)) == 'MEDIUM'
+    assert rules.classify(headers(6, port=81)) == 'LOW'
+
+
+def test_port_and_subnet_rejected():
+    # Compiled as a port rule alone, this would match the port in any subnet.
+    with pytest.raises(ValueError, match='proto\\+dst_port\\+dst'):
+        table({'proto': 'tcp', 'dst_port': 502, 'dst': '10.0.5.0/24', 'class': 'HIGH'})
+
+
+def test_proto_and_dscp_rejected():
+    # Compiled as a DSCP rule alone, this would drop the proto.
+    with pytest.raises(ValueError, match='proto\\+dscp'):
+        table({'proto': 'udp', 'dscp': 46, 'class': 'HIGH'})
+
+
+@pytest.mark.parametrize('rule', [
+    {'dscp': 46, 'dst': '10.0.0.0/8', 'class': 'HIGH'},
+    {'proto': 'tcp', 'src': '10.0.0.0/8', 'class': 'HIGH'},
+    {'dst': '10.0.0.0/8', 'src': '10.0.0.0/8', 'class': 'HIGH'},
+])
+def test_other_combinations_rejected(rule):
+    with pytest.raises(ValueError):
+        table(rule)
+
+
+def test_reload_keeps_table_on_combined_rule(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text('{"classes": {"LOW": {"priority": 10, "queue": 3}}, "rules": []}')
+    loader = qos_rules.RuleLoader(str(path))
+    current = loader.table
+    path.write_text('{"classes": {"LOW": {"priority": 10, "queue": 3}}, '
+                    '"rules": [{"proto": "tcp", "dscp": 10, "class": "LOW"}]}')
+    os.utime(str(path), (loader.mtime + 1, loader.mtime + 1))
+    with pytest.raises(ValueError):
+        loader.reload_if_changed()
+    assert loader.table is current
+
+
+def test_reload_retries_file_that_failed_to_parse(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text('{"classes": {"LOW": {"priority": 10, "queue": 3}}, "rules": []}')
+    loader = qos_rules.RuleLoader(str(path))
+    mtime = loader.mtime + 1
+    # Caught half written: the same mtime must be tried again once it is complete.
+    path.write_text('{"classes": {"LOW": {"priority": 10, "queue": 3}}, "rules": [')
+    os.utime(str(path), (mtime, mtime))
+    with pytest.raises(ValueError):
+        loader.reload_if_changed()
+    with pytest.raises(ValueError):
+        loader.reload_if_changed()
+    path.write_text('{"classes": {"LOW": {"priority": 10, "queue": 3}}, '
+                    '"rules": [{"proto": "udp", "class": "LOW"}]}')
+    os.utime(str(path), (mtime, mtime))
+    assert loader.reload_if_changed()
+    assert loader.table.rule_count == 1
+    assert not loader.reload_if_changed()
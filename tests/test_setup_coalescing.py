@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_datapath import FakeDatapath, packet_in_event  # noqa: E402
+from proactive_bench import build  # noqa: E402
+
+import enhanced_traffic_controller  # noqa: E402
+
+FLOWS = 20
+BURST = 10
+
+
+class Controller(enhanced_traffic_controller.EnhancedTrafficController):
+    WARM_RESTART = False
+    ADMISSION = False
+    SETUP_TTL = 0.2
+
+
+def send(app, dp, src, dst):
+    data, fields = build(src, dst, 6, 5001)
+    app.packet_in_handler(packet_in_event(dp, data, fields['in_port']))
+
+
+def sent(dp, cls, mark):
+    return [m for m in dp.sent[mark:] if isinstance(m, cls)]
+
+
+def test_burst_installs_one_flow_per_key():
+    app = Controller()
+    dp = FakeDatapath(1)
+    parser = dp.ofproto_parser
+    app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp)))
+    app.writer_for(dp).flush()
+    mark = len(dp.sent)
+    for i in range(FLOWS):
+        a, b = 2 * i, 2 * i + 1
+        send(app, dp, b, a)  # flooded, teaches the controller where b is
+        # Every packet of the a -> b burst misses until the flow is in.
+        for _ in range(BURST):
+            send(app, dp, a, b)
+    app.writer_for(dp).flush()
+
+    mods = sent(dp, parser.OFPFlowMod, mark)
+    keys = set((m.match['in_port'], m.match['eth_src'], m.match['eth_dst']) for m in mods)
+    assert len(mods) == len(keys) == FLOWS
+    assert len(sent(dp, parser.OFPPacketOut, mark)) == FLOWS * (BURST + 1)
+    assert app.suppressed_setups == FLOWS * (BURST - 1)
+
+    # Once SETUP_TTL is over, a packet-in that still misses sets the flow up again.
+    time.sleep(Controller.SETUP_TTL * 1.5)
+    mark = len(dp.sent)
+    send(app, dp, 0, 1)
+    app.writer_for(dp).flush()
+    assert len(sent(dp, parser.OFPFlowMod, mark)) == 1
+    assert app.suppressed_setups == FLOWS * (BURST - 1)
+
+
+def test_no_coalescing_without_setup_ttl():
+    app = Controller()
+    app.SETUP_TTL = 0
+    dp = FakeDatapath(1)
+    send(app, dp, 1, 0)
+    for _ in range(BURST):
+        send(app, dp, 0, 1)
+    app.writer_for(dp).flush()
+    assert len(dp.sent_of(dp.ofproto_parser.OFPFlowMod)) == BURST
+    assert app.suppressed_setups == 0
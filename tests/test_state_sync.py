@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_datapath import FakeDatapath, packet_in_event  # noqa: E402
+from proactive_bench import build, host_mac  # noqa: E402
+
+import enhanced_traffic_controller  # noqa: E402
+
+
+class Controller(enhanced_traffic_controller.EnhancedTrafficController):
+    WARM_RESTART = False
+    ADMISSION = False
+
+
+def controller():
+    app = Controller()
+    now = [0.0]
+    app.sync.clock = lambda: now[0]
+    edge, core = FakeDatapath(1), FakeDatapath(2)
+    for dp in (edge, core):
+        app.mac_table(dp.id).clock = lambda: now[0]
+    return app, now, edge, core
+
+
+def send(app, dp, in_port):
+    data, _ = build(0, 1, 6, 80)
+    app.packet_in_handler(packet_in_event(dp, data, in_port))
+
+
+def test_host_stays_published_while_it_sends():
+    app, now, edge, core = controller()
+    send(app, edge, 1)
+    assert app.sync.mac_location(host_mac(0)) == (1, 1)
+    while now[0] < 3 * app.sync.ttl:
+        now[0] += 10
+        send(app, edge, 1)
+        app.sync.expire()
+    assert app.sync.mac_location(host_mac(0)) == (1, 1)
+    # Seen over the core switch's uplink, which must not become its location.
+    send(app, core, 7)
+    assert app.sync.mac_location(host_mac(0)) == (1, 1)
+
+
+def test_host_expires_once_forgotten():
+    app, now, edge, _ = controller()
+    send(app, edge, 1)
+    now[0] += app.MAC_AGING + 1
+    app.expire_tables()
+    app.sync.expire()
+    assert app.sync.mac_location(host_mac(0)) is None
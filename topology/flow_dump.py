@@ -0,0 +1,204 @@
+"""Streaming parser for `ovs-ofctl dump-flows` output.
+
+One compiled regex for the layout OVS prints runs over a block of lines
+at a time; a block with a line it does not fit, e.g. with fields of newer
+OpenFlow versions, is matched line by line and those lines are split field
+by field instead. Each block is appended to columns: array.array for
+numbers, lists for strings. FlowDumpReader remembers how far into a file
+it has parsed, so a file that only grew is read from that point on. A
+file that shrank or was rewritten is parsed again from the start.
+
+    table = flow_dump.parse(text)
+    table.column('n_bytes'), table.to_frame()
+"""
+import array
+import collections
+import os
+import re
+
+import numpy as np
+
+# Number columns and their value when a line leaves the field out.
+# ovs-ofctl omits priority when it is the default, 32768.
+NUMBERS = collections.OrderedDict([
+    ('cookie', ('Q', 0)), ('duration', ('d', 0.0)), ('table', ('q', 0)),
+    ('n_packets', ('q', 0)), ('n_bytes', ('q', 0)),
+    ('idle_timeout', ('q', 0)), ('hard_timeout', ('q', 0)),
+    ('idle_age', ('q', -1)), ('hard_age', ('q', -1)),
+    ('priority', ('q', 32768)), ('queue', ('q', -1)),
+])
+# String columns; `match` is the whole match, in_port and dl_* included.
+STRINGS = ('in_port', 'dl_src', 'dl_dst', 'match', 'actions')
+COLUMNS = tuple(NUMBERS) + STRINGS
+
+# Flags and entry fields that are neither a column nor part of the match
+IGNORED = frozenset(('send_flow_rem', 'check_overlap', 'reset_counts',
+                     'no_packet_counts', 'no_byte_counts', 'importance'))
+TAIL = 64  # bytes kept to notice that a file was rewritten
+BLOCK = 1 << 23  # characters parsed before they are moved into the columns
+
+# One pass over each line in the layout OVS prints, groups in the order of
+# _FAST_COLUMNS. The match and the actions are captured whole, and their
+# fields are picked out as the repetitions go by, in whatever order. A flow
+# with the default priority and an empty match has "actions=" right after
+# the ", " of the last stat, so that space is not consumed again.
+_LINE = re.compile(
+    r'cookie=0x([0-9a-f]+), duration=([\d.]+)s, table=(\d+), '
+    r'n_packets=(\d+), n_bytes=(\d+), '
+    r'(?:(?:send_flow_rem|check_overlap|reset_counts|no_packet_counts|no_byte_counts) )*'
+    r'(?:idle_timeout=(\d+), )?(?:hard_timeout=(\d+), )?'
+    r'(?:idle_age=(\d+), )?(?:hard_age=(\d+), )?(?:priority=(\d+)(?:,|(?= )))?'
+    r'((?:(?:in_port="?([\w.-]+)"?|dl_src=([\w:]+)|dl_dst=([\w:]+)|[^, \n]+)(?:,|(?= )))*)'
+    r'(?: |(?<=, ))actions=((?:(?:set_queue:(\d+)|[^,\n]+)(?:,|$))*)[ \t\r]*$', re.M)
+_FAST_COLUMNS = ('cookie', 'duration', 'table', 'n_packets', 'n_bytes',
+                 'idle_timeout', 'hard_timeout', 'idle_age', 'hard_age', 'priority',
+                 'match', 'in_port', 'dl_src', 'dl_dst', 'actions', 'queue')
+_MISSING = tuple((name, str(NUMBERS[name][1]) if name in NUMBERS else '')
+                 for name in _FAST_COLUMNS)
+
+
+def _split_line(line):
+    """What _LINE would give for a flow line it does not fit, or None."""
+    head, sep, actions = line.partition(' actions=')
+    if not sep:
+        return None
+    fields = {'actions': actions.rstrip()}
+    match = []
+    # Stats are separated by ", ", flags by a space, match fields by ",".
+    for token in head.replace(' ', ',').split(','):
+        name, eq, value = token.partition('=')
+        if name in NUMBERS:
+            if name == 'cookie':
+                value = value[2:]
+            elif name == 'duration':
+                value = value.rstrip('s')
+            fields[name] = value
+        elif name and name not in IGNORED:
+            if name in ('in_port', 'dl_src', 'dl_dst'):
+                fields[name] = value.strip('"')
+            match.append(token)
+    fields['match'] = ','.join(match)
+    for action in actions.split(','):
+        if action.startswith('set_queue:'):
+            fields['queue'] = action[len('set_queue:'):]
+    return tuple(fields.get(name, missing) for name, missing in _MISSING)
+
+
+class FlowTable(object):
+    """Flow entries stored by column, in the order they were parsed."""
+
+    def __init__(self):
+        self.columns = collections.OrderedDict()
+        for name, (typecode, _) in NUMBERS.items():
+            self.columns[name] = array.array(typecode)
+        for name in STRINGS:
+            self.columns[name] = []
+
+    def __len__(self):
+        return len(self.columns['actions'])
+
+    def extend(self, text):
+        """Append the flow lines of `text`; returns how many there were."""
+        added = 0
+        start = 0
+        while start < len(text):
+            end = text.find('\n', start + BLOCK) + 1 or len(text)
+            added += self._append(self._parse_block(text[start:end]))
+            start = end
+        return added
+
+    def _parse_block(self, text):
+        rows = _LINE.findall(text)
+        if len(rows) == text.count(' actions='):
+            return rows
+        rows = []
+        for line in text.splitlines():
+            m = _LINE.match(line)
+            if m is not None:
+                rows.append(m.groups(''))
+            else:
+                groups = _split_line(line)
+                if groups is not None:
+                    rows.append(groups)
+        return rows
+
+    def _append(self, rows):
+        if not rows:
+            return 0
+        for name, values in zip(_FAST_COLUMNS, zip(*rows)):
+            column = self.columns[name]
+            if name == 'cookie':
+                column.extend([int(v, 16) for v in values])
+            elif name in NUMBERS:
+                # NumPy converts a column of decimal strings far faster than int().
+                typecode, default = NUMBERS[name]
+                if '' in values:
+                    values = [v or str(default) for v in values]
+                column.frombytes(np.array(values, dtype=typecode).tobytes())
+            else:
+                column.extend(values)
+        return len(rows)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def rows(self):
+        """One dict per flow; for printing small tables."""
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
+
+    def to_frame(self):
+        """The table as a pandas DataFrame with one column per field."""
+        import pandas as pd
+        data = collections.OrderedDict()
+        for name, values in self.columns.items():
+            data[name] = np.array(values) if name in NUMBERS else values
+        return pd.DataFrame(data, columns=list(COLUMNS))
+
+
+def parse(text):
+    table = FlowTable()
+    table.extend(text)
+    return table
+
+
+class FlowDumpReader(object):
+    """Keeps a FlowTable in step with a dump file that is appended to."""
+
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        self.table = FlowTable()
+        self.offset = 0  # bytes parsed, always at a line boundary
+        self.tail = b''  # the last bytes parsed
+
+    def update(self):
+        """Parse the lines added since the last call; returns how many flows were added.
+
+        Returns None when the file does not exist. A last line without its
+        newline is left for the next call.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.reset()
+            return None
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if self.offset and (size < self.offset or not self._same_tail(f)):
+                self.reset()
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return 0
+        chunk = data[:end]
+        self.offset += end
+        self.tail = (self.tail + chunk)[-TAIL:]
+        return self.table.extend(chunk.decode('utf-8', 'replace'))
+
+    def _same_tail(self, f):
+        f.seek(self.offset - len(self.tail))
+        return f.read(len(self.tail)) == self.tail
@@ -0,0 +1,376 @@
+"""Generated multi-controller topologies with concurrent traffic measurements.
+
+Builds a linear, tree or fat-tree network of OpenFlow 1.3 switches, splits
+the switches among M remote controllers and runs traffic profiles between
+host pairs. All pairs of a profile run at once in a thread pool. Results
+are written as records: throughput, loss, jitter and RTT percentiles per
+pair, plus flow counts per switch.
+
+  linear    N switches in a row, H hosts on each
+  tree      N switches filled breadth first, `fanout` children each, H hosts per leaf
+  fat-tree  k pods: (k/2)^2 core, k/2 aggregation and k/2 edge switches per pod,
+            H hosts per edge switch (5k^2/4 switches in all)
+
+Controllers listen on consecutive ports from --base-port, like the two
+ryu-manager instances in run_demo.sh. round-robin gives switch i to
+controller i mod M. load gives each controller a share of the expected
+traffic in proportion to its capacity: a switch's load is the number of
+measured pairs whose shortest path crosses it, and the heaviest switches
+are placed first.
+
+A fat tree has loops, so its switches run STP and --settle should allow it
+to converge before traffic starts.
+
+Usage: sudo python3 topo_generator.py --kind fat-tree --k 4 --hosts 2 --controllers 2
+           --assign load [--profiles tcp udp ping] [--out results.json|results.parquet]
+"""
+import argparse
+import collections
+import heapq
+import json
+import os
+import random
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mininet.cli import CLI
+from mininet.log import setLogLevel
+from mininet.net import Mininet
+from mininet.node import OVSSwitch, RemoteController
+from mininet.topo import Topo
+
+import flow_dump
+
+Layout = collections.namedtuple('Layout', 'kind switches links hosts')
+# switches: names in dpid order; links: (switch, switch); hosts: name -> switch
+
+PROFILES = ('tcp', 'udp', 'ping')
+RTT_PERCENTILES = (50, 90, 99)
+PAIR_FIELDS = ('throughput_mbps', 'loss_pct', 'jitter_ms', 'rtt_min_ms',
+               'rtt_p50_ms', 'rtt_p90_ms', 'rtt_p99_ms', 'rtt_max_ms', 'error')
+
+_PING_RTT = re.compile(r'time=([\d.]+) ms')
+_PING_COUNT = re.compile(r'(\d+) packets transmitted, (\d+) received')
+
+
+def _add_hosts(hosts, switch, count):
+    for _ in range(count):
+        hosts['h%d' % (len(hosts) + 1)] = switch
+
+
+def linear(switches, hosts_per_switch):
+    names = ['s%d' % (i + 1) for i in range(switches)]
+    hosts = collections.OrderedDict()
+    for name in names:
+        _add_hosts(hosts, name, hosts_per_switch)
+    return Layout('linear', names, list(zip(names, names[1:])), hosts)
+
+
+def tree(switches, hosts_per_leaf, fanout=2):
+    names = ['s%d' % (i + 1) for i in range(switches)]
+    # Breadth first: the children of switch i are i*fanout+1 .. i*fanout+fanout.
+    links = [(names[(i - 1) // fanout], names[i]) for i in range(1, switches)]
+    parents = set(a for a, _ in links)
+    hosts = collections.OrderedDict()
+    for name in names:
+        if name not in parents:
+            _add_hosts(hosts, name, hosts_per_leaf)
+    return Layout('tree', names, links, hosts)
+
+
+def fat_tree(k, hosts_per_edge):
+    if k < 2 or k % 2:
+        raise ValueError("fat-tree k must be even and at least 2, not %d" % k)
+    half = k // 2
+    names = ['s%d' % (i + 1) for i in range(half * half + k * k)]
+    core = names[:half * half]
+    links = []
+    hosts = collections.OrderedDict()
+    for pod in range(k):
+        first = half * half + pod * k
+        aggregation = names[first:first + half]
+        edge = names[first + half:first + k]
+        for j, agg in enumerate(aggregation):
+            links.extend((c, agg) for c in core[j * half:(j + 1) * half])
+            links.extend((agg, e) for e in edge)
+        for e in edge:
+            _add_hosts(hosts, e, hosts_per_edge)
+    return Layout('fat-tree', names, links, hosts)
+
+
+def build_layout(args):
+    if args.kind == 'linear':
+        return linear(args.switches, args.hosts)
+    if args.kind == 'tree':
+        return tree(args.switches, args.hosts, args.fanout)
+    return fat_tree(args.k, args.hosts)
+
+
+class GeneratedTopo(Topo):
+    def build(self, layout):
+        stp = layout.kind == 'fat-tree'
+        for name in layout.switches:
+            self.addSwitch(name, protocols='OpenFlow13', stp=stp)
+        for a, b in layout.links:
+            self.addLink(a, b)
+        for host, switch in layout.hosts.items():
+            self.addHost(host)
+            self.addLink(host, switch)
+
+
+def pick_pairs(hosts, count, seed=7):
+    """`count` (src, dst) host pairs; the first len(hosts) use every host once each way."""
+    hosts = list(hosts)
+    rnd = random.Random(seed)
+    pairs = []
+    if len(hosts) < 2:
+        return pairs
+    while len(pairs) < count:
+        order = hosts[:]
+        rnd.shuffle(order)
+        pairs.extend(zip(order, order[1:] + order[:1]))
+    return pairs[:count]
+
+
+def shortest_paths(layout, source):
+    """Previous hop of every switch on a BFS tree from `source`."""
+    neighbours = collections.defaultdict(list)
+    for a, b in layout.links:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    previous = {source: None}
+    queue = collections.deque([source])
+    while queue:
+        sw = queue.popleft()
+        for other in neighbours[sw]:
+            if other not in previous:
+                previous[other] = sw
+                queue.append(other)
+    return previous
+
+
+def switch_loads(layout, pairs):
+    """Measured pairs whose shortest path crosses each switch."""
+    loads = dict((sw, 0) for sw in layout.switches)
+    trees = {}
+    for src, dst in pairs:
+        a, b = layout.hosts[src], layout.hosts[dst]
+        if a not in trees:
+            trees[a] = shortest_paths(layout, a)
+        sw = b
+        while sw is not None:
+            loads[sw] += 1
+            sw = trees[a].get(sw)
+    return loads
+
+
+def assign(switches, controllers, policy, loads=None, capacities=None):
+    """switch -> controller index by round-robin or by expected load."""
+    if policy == 'round-robin':
+        return dict((sw, i % controllers) for i, sw in enumerate(switches))
+    capacities = capacities or [1.0] * controllers
+    # Largest load first onto the least utilised controller; ties go to the
+    # controller with fewer switches, so idle switches are spread out too.
+    heap = [(0.0, 0, c) for c in range(controllers)]
+    total = [0.0] * controllers
+    assignment = {}
+    for sw in sorted(switches, key=lambda s: -loads[s]):
+        _, count, c = heapq.heappop(heap)
+        assignment[sw] = c
+        total[c] += loads[sw]
+        heapq.heappush(heap, (total[c] / capacities[c], count + 1, c))
+    return assignment
+
+
+def run(host, args, timeout):
+    proc = host.popen([str(a) for a in args], stdout=subprocess.PIPE,
+                      stderr=subprocess.STDOUT)
+    try:
+        return proc.communicate(timeout=timeout)[0].decode('utf-8', 'replace')
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise
+
+
+def measure(net, profile, src, dst, args):
+    """One record for `profile` from host `src` to `dst`."""
+    result = dict.fromkeys(PAIR_FIELDS)
+    result.update(profile=profile, src=src, dst=dst)
+    source, target = net.get(src), net.get(dst)
+    timeout = args.duration + args.ping_count + 30
+    try:
+        if profile == 'ping':
+            out = run(source, ['ping', '-c', args.ping_count, '-i', 0.2, target.IP()], timeout)
+            counts = _PING_COUNT.search(out)
+            if counts and int(counts.group(1)):
+                result['loss_pct'] = 100.0 * (1 - int(counts.group(2)) / float(counts.group(1)))
+            rtts = np.array([float(v) for v in _PING_RTT.findall(out)])
+            if len(rtts):
+                result['rtt_min_ms'] = float(rtts.min())
+                result['rtt_max_ms'] = float(rtts.max())
+                for p in RTT_PERCENTILES:
+                    result['rtt_p%d_ms' % p] = float(np.percentile(rtts, p))
+            return result
+        cmd = ['iperf', '-c', target.IP(), '-t', args.duration, '-y', 'C']
+        if profile == 'udp':
+            cmd += ['-u', '-b', args.udp_rate]
+        out = run(source, cmd, timeout)
+        # CSV reports; for UDP the server's report adds jitter, lost, total, %, out of order.
+        rows = [line.split(',') for line in out.splitlines() if line.count(',') >= 8]
+        if not rows:
+            result['error'] = out.strip()[-200:] or 'no iperf report'
+            return result
+        result['throughput_mbps'] = float(rows[-1][8]) / 1e6
+        if profile == 'udp':
+            report = [row for row in rows if len(row) >= 14]
+            if report:
+                result['jitter_ms'] = float(report[-1][9])
+                result['loss_pct'] = float(report[-1][12])
+    except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+        result['error'] = repr(e)
+    return result
+
+
+def dump_flows(net, name):
+    out = run(net.get(name), ['ovs-ofctl', '-O', 'OpenFlow13', 'dump-flows', name], 30)
+    table = flow_dump.parse(out)
+    return {
+        'flows': len(table),
+        'qos_flows': sum(1 for q in table.column('queue') if q >= 0),
+        'packets': sum(table.column('n_packets')),
+        'bytes': sum(table.column('n_bytes')),
+    }
+
+
+def run_profiles(net, layout, pairs, assignment, args):
+    """Pair records and switch records; each profile runs all pairs at once."""
+    dsts = sorted(set(dst for _, dst in pairs))
+    servers = []
+    if 'tcp' in args.profiles:
+        servers += [net.get(h).popen(['iperf', '-s']) for h in dsts]
+    if 'udp' in args.profiles:
+        servers += [net.get(h).popen(['iperf', '-s', '-u']) for h in dsts]
+    if servers:
+        time.sleep(1)  # let the servers bind
+    records = []
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            for profile in args.profiles:
+                print(f"Running {profile} between {len(pairs)} host pairs...")
+                start = time.time()
+                jobs = [pool.submit(measure, net, profile, src, dst, args) for src, dst in pairs]
+                for job in jobs:
+                    record = job.result()
+                    record.update(src_switch=layout.hosts[record['src']],
+                                  dst_switch=layout.hosts[record['dst']])
+                    records.append(record)
+                print(f"  done in {time.time() - start:.1f} s")
+            dumps = dict(zip(layout.switches,
+                             pool.map(lambda name: dump_flows(net, name), layout.switches)))
+    finally:
+        for server in servers:
+            server.terminate()
+    switches = [dict(switch=name, controller=assignment[name] + 1, **dumps[name])
+                for name in layout.switches]
+    return records, switches
+
+
+def summarize(records):
+    by_profile = collections.defaultdict(list)
+    for record in records:
+        by_profile[record['profile']].append(record)
+    for profile, rows in by_profile.items():
+        errors = sum(1 for r in rows if r['error'])
+        line = f"{profile}: {len(rows)} pairs, {errors} failed"
+        for field in ('throughput_mbps', 'loss_pct', 'rtt_p50_ms', 'rtt_p99_ms'):
+            values = [r[field] for r in rows if r[field] is not None]
+            if values:
+                line += f", {field} median {np.median(values):.2f}"
+        print(line)
+
+
+def write_results(path, meta, records, switches):
+    """JSON with everything, or Parquet: pair records in `path`, switches beside it."""
+    if path.endswith('.parquet'):
+        import pandas as pd
+        pd.DataFrame(records).to_parquet(path, index=False)
+        pd.DataFrame(switches).to_parquet(path[:-len('.parquet')] + '_switches.parquet',
+                                          index=False)
+        with open(path[:-len('.parquet')] + '_meta.json', 'w') as f:
+            json.dump(meta, f, indent=1)
+        return
+    with open(path, 'w') as f:
+        json.dump(dict(meta, pairs=records, switches=switches), f, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kind', choices=('linear', 'tree', 'fat-tree'), default='linear')
+    parser.add_argument('--switches', type=int, default=3, help="linear and tree")
+    parser.add_argument('--fanout', type=int, default=2, help="tree")
+    parser.add_argument('--k', type=int, default=4, help="fat-tree pods")
+    parser.add_argument('--hosts', type=int, default=1, help="hosts per access switch")
+    parser.add_argument('--controllers', type=int, default=2)
+    parser.add_argument('--controller-ip', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=6633)
+    parser.add_argument('--assign', choices=('round-robin', 'load'), default='round-robin')
+    parser.add_argument('--capacity', type=float, nargs='+',
+                        help="relative capacity of each controller, for --assign load")
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--pairs', type=int, help="host pairs to measure, default one per host")
+    parser.add_argument('--duration', type=int, default=10, help="iperf seconds")
+    parser.add_argument('--udp-rate', default='10M')
+    parser.add_argument('--ping-count', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help="seconds to wait after start; allow ~30 for STP in a fat tree")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--out', default='results.json')
+    parser.add_argument('--cli', action='store_true', help="open the Mininet CLI at the end")
+    args = parser.parse_args()
+    if args.capacity and len(args.capacity) != args.controllers:
+        parser.error("--capacity needs one value per controller")
+
+    layout = build_layout(args)
+    pairs = pick_pairs(layout.hosts, args.pairs or len(layout.hosts), args.seed)
+    loads = switch_loads(layout, pairs)
+    assignment = assign(layout.switches, args.controllers, args.assign, loads, args.capacity)
+    print(f"{layout.kind}: {len(layout.switches)} switches, {len(layout.hosts)} hosts, "
+          f"{args.controllers} controllers ({args.assign})")
+
+    setLogLevel('info')
+    net = Mininet(topo=GeneratedTopo(layout), controller=None, switch=OVSSwitch)
+    controllers = [net.addController('c%d' % (i + 1), controller=RemoteController,
+                                     ip=args.controller_ip, port=args.base_port + i)
+                   for i in range(args.controllers)]
+    net.start()
+    try:
+        for name in layout.switches:
+            net.get(name).start([controllers[assignment[name]]])
+        time.sleep(args.settle)
+        records, switches = run_profiles(net, layout, pairs, assignment, args)
+        summarize(records)
+        meta = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'args': vars(args),
+            'topology': {'kind': layout.kind, 'switches': layout.switches,
+                         'links': layout.links, 'hosts': layout.hosts},
+            'assignment': dict((sw, c + 1) for sw, c in assignment.items()),
+            'expected_load': loads,
+        }
+        write_results(args.out, meta, records, switches)
+        print(f"Wrote {len(records)} pair and {len(switches)} switch records to "
+              f"{os.path.abspath(args.out)}")
+        if args.cli:
+            CLI(net)
+    finally:
+        net.stop()
+
+
+if __name__ == '__main__':
+    main()